@@ -0,0 +1,109 @@
+"""
+Capacity-aware admission control for WebSocket sessions.
+
+Accepting every connection means that once the transcription workers are
+saturated, latency degrades for every client instead of only the new ones.
+AdmissionController admits a session only while the active session count
+and the measured real-time factor are within the configured limits. Other
+clients wait in a bounded FIFO queue or are turned away with a structured
+`server_busy` message carrying a retry-after hint.
+"""
+
+import asyncio
+import collections
+import time
+
+
+class AdmissionController:
+    """Decides whether a new session may start now, has to wait, or is rejected.
+
+    A limit of 0 disables that check. `load_probe` is a callable returning
+    the current real-time factor.
+    """
+
+    def __init__(self,
+                 max_sessions=0,
+                 max_rtf=0.0,
+                 max_queue=0,
+                 queue_timeout=30.0,
+                 retry_after=5.0,
+                 load_probe=None):
+        self.max_sessions = max_sessions
+        self.max_rtf = max_rtf
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.load_probe = load_probe
+        self.active = 0
+        self.rejected = 0
+        self._waiting = collections.deque()
+        self._changed = asyncio.Event()
+
+    def busy_reason(self):
+        """Why a new session cannot start right now, or None if it can."""
+        if self.max_sessions and self.active >= self.max_sessions:
+            return 'max_sessions'
+        if self.max_rtf and self.load_probe is not None and self.load_probe() > self.max_rtf:
+            return 'overloaded'
+        return None
+
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def _busy_message(self, reason, queued, position=None):
+        message = {
+            'type': 'server_busy',
+            'reason': reason,
+            'queued': queued,
+            'active_sessions': self.active,
+            # Rough hint: one retry interval per client ahead in the queue
+            'retry_after': self.retry_after * (position or len(self._waiting) + 1),
+        }
+        if position is not None:
+            message['position'] = position
+        return message
+
+    async def acquire(self, notify):
+        """Admit a session, queueing it if allowed. Returns False if it was rejected.
+
+        `notify` is an async callable used to send server_busy messages to the client.
+        """
+        reason = self.busy_reason()
+        if reason is None and not self._waiting:
+            self.active += 1
+            return True
+
+        if len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            await notify(self._busy_message(reason or 'queue_full', queued=False))
+            return False
+
+        token = object()
+        self._waiting.append(token)
+        await notify(self._busy_message(reason or 'queued', queued=True,
+                                        position=len(self._waiting)))
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                if self._waiting[0] is token and self.busy_reason() is None:
+                    self.active += 1
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    await notify(self._busy_message(
+                        self.busy_reason() or 'queue_timeout', queued=False))
+                    return False
+                self._changed.clear()
+                try:
+                    # Load changes without any release, so poll at least every second
+                    await asyncio.wait_for(self._changed.wait(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiting.remove(token)
+            self._changed.set()
+
+    def release(self):
+        self.active = max(0, self.active - 1)
+        self._changed.set()
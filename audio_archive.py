@@ -0,0 +1,183 @@
+"""
+Background archive writer for incoming session audio.
+
+Sessions hand their raw PCM chunks to AudioArchive.write(), which only puts
+them on a queue and never touches the disk, so archiving adds no latency to
+the ingest path. A single writer thread collects the chunks per session and
+writes them in large buffered blocks to one file per session, WAV or
+(with soundfile installed) FLAC. Files rotate once they reach a maximum
+duration or size, and whenever a session's sample rate changes, so every
+file has a correct header. Files are named
+
+    <base>_<session_id>_<part>.wav   (or .flac)
+"""
+
+import os
+import queue
+import threading
+import wave
+
+import numpy as np
+
+ARCHIVE_FORMATS = ('wav', 'flac')
+
+
+class _SessionFile:
+    """The file currently being written for one session, plus its unwritten buffer."""
+
+    __slots__ = ('session_id', 'sample_rate', 'handle', 'frames', 'buffer')
+
+    def __init__(self, session_id, sample_rate):
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.handle = None
+        self.frames = 0
+        self.buffer = bytearray()
+
+
+class AudioArchive:
+    """Writes 16-bit mono session audio to rotating per-session files on a background thread.
+
+    `max_seconds` and `max_bytes` (uncompressed audio bytes) limit a single
+    file, 0 disables the limit. Chunks are buffered until `buffer_seconds`
+    of audio is collected or `flush_interval` passes without new audio.
+    """
+
+    def __init__(self, base_path, fmt='wav', max_seconds=0.0, max_bytes=0,
+                 buffer_seconds=2.0, flush_interval=1.0, max_pending=4096):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format {fmt}")
+        if fmt == 'flac':
+            try:
+                import soundfile
+                self._soundfile = soundfile
+            except ImportError:
+                print("soundfile is not installed, archiving as WAV instead of FLAC")
+                fmt = 'wav'
+        root, ext = os.path.splitext(base_path)
+        self.root = root if ext.lower() in ('.wav', '.flac') else base_path
+        self.fmt = fmt
+        self.max_seconds = max(0.0, max_seconds)
+        self.max_bytes = max(0, max_bytes)
+        self.buffer_seconds = max(0.0, buffer_seconds)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.bytes_written = 0
+        self.files_written = 0
+        self._files = {}
+        self._parts = {}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='audio-archive', daemon=True)
+        self._thread.start()
+
+    def write(self, session_id, pcm, sample_rate):
+        """Queue a chunk of int16 mono PCM. Never blocks; drops the chunk if the writer is far behind."""
+        try:
+            self._queue.put_nowait(('write', session_id, pcm, sample_rate))
+        except queue.Full:
+            self.dropped += 1
+
+    def close_session(self, session_id):
+        """Flush and close the session's file once its queued audio is written."""
+        self._queue.put(('close', session_id, None, None))
+
+    def stop(self, timeout=10):
+        """Write everything still queued, close all files and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def path_for(self, session_id, part):
+        return f"{self.root}_{session_id}_{part:03d}.{self.fmt}"
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle, write out whatever the sessions have buffered
+                for state in list(self._files.values()):
+                    self._flush(state)
+                continue
+            if item is None:
+                break
+            op, session_id, pcm, sample_rate = item
+            try:
+                if op == 'close':
+                    self._close(session_id)
+                else:
+                    self._append(session_id, pcm, sample_rate)
+            except Exception as e:
+                print(f"Error archiving audio for {session_id}: {e}")
+        for session_id in list(self._files):
+            try:
+                self._close(session_id)
+            except Exception as e:
+                print(f"Error closing audio archive for {session_id}: {e}")
+
+    def _append(self, session_id, pcm, sample_rate):
+        state = self._files.get(session_id)
+        if state is not None and state.sample_rate != sample_rate:
+            # A file has exactly one sample rate, start a new one
+            self._close(session_id)
+            state = None
+        if state is None:
+            state = self._files[session_id] = _SessionFile(session_id, sample_rate)
+        state.buffer += pcm
+        if len(state.buffer) >= self.buffer_seconds * sample_rate * 2:
+            self._flush(state)
+
+    def _frame_limit(self, state):
+        limits = []
+        if self.max_seconds:
+            limits.append(int(self.max_seconds * state.sample_rate))
+        if self.max_bytes:
+            limits.append(self.max_bytes // 2)
+        return max(1, min(limits)) if limits else None
+
+    def _flush(self, state):
+        limit = self._frame_limit(state)
+        while len(state.buffer) >= 2:
+            frames = len(state.buffer) // 2
+            if limit is not None:
+                frames = min(frames, limit - state.frames)
+            block = bytes(state.buffer[:frames * 2])
+            del state.buffer[:frames * 2]
+            self._write_block(state, block)
+            if limit is not None and state.frames >= limit:
+                self._rotate(state)
+
+    def _write_block(self, state, block):
+        if state.handle is None:
+            # Parts are numbered when opened, so rotation never leaves a gap
+            part = self._parts[state.session_id] = self._parts.get(state.session_id, 0) + 1
+            state.handle = self._open(self.path_for(state.session_id, part), state.sample_rate)
+            self.files_written += 1
+        if self.fmt == 'flac':
+            state.handle.write(np.frombuffer(block, dtype=np.int16))
+        else:
+            state.handle.writeframes(block)
+        state.frames += len(block) // 2
+        self.bytes_written += len(block)
+
+    def _open(self, path, sample_rate):
+        if self.fmt == 'flac':
+            return self._soundfile.SoundFile(path, 'w', samplerate=sample_rate, channels=1,
+                                             format='FLAC', subtype='PCM_16')
+        handle = wave.open(path, 'wb')
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(sample_rate)
+        return handle
+
+    def _rotate(self, state):
+        state.handle.close()
+        state.handle = None
+        state.frames = 0
+
+    def _close(self, session_id):
+        state = self._files.pop(session_id, None)
+        if state is None:
+            return
+        self._flush(state)
+        if state.handle is not None:
+            state.handle.close()
@@ -0,0 +1,106 @@
+"""
+Per-session audio ingest stage that runs off the asyncio event loop.
+
+The WebSocket coroutine only receives bytes and hands them to an
+AudioIngestWorker. Decoding, resampling and recorder.feed_audio run on the
+worker's own thread, so one busy client cannot delay the sockets of every
+other client. The buffer between the two is bounded; when it is full the
+configured overflow policy decides what happens:
+
+- "drop_oldest": discard the oldest queued frame (keeps latency bounded)
+- "drop_newest": discard the incoming frame
+- "block": stop reading from the socket until there is room, which pushes
+  back on the client through TCP flow control
+"""
+
+import asyncio
+import queue
+import threading
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class AudioIngestWorker:
+    """Bounded queue plus worker thread that runs `handler(message)` for each frame.
+
+    `on_drop()` is called for every frame the overflow policy discards.
+    """
+
+    def __init__(self, handler, maxsize=64, overflow='drop_oldest', name='ingest', on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        self.handler = handler
+        self.overflow = overflow
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.processed = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def depth(self):
+        return self._queue.qsize()
+
+    async def put(self, message):
+        """Enqueue a frame from the event loop, applying the overflow policy if full."""
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow == 'drop_newest':
+            self._drop()
+            return False
+        if self.overflow == 'drop_oldest':
+            try:
+                self._queue.get_nowait()
+                self._drop()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(message)
+                return True
+            except queue.Full:
+                self._drop()
+                return False
+
+        # Backpressure: wait in an executor thread so the loop keeps serving others
+        await asyncio.get_running_loop().run_in_executor(None, self._queue.put, message)
+        return True
+
+    def _drop(self):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop()
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self.handler(message)
+                self.processed += 1
+            except Exception as e:
+                print(f"Error in {self._thread.name}: {e}")
+
+    def stop(self, wait=False, timeout=2):
+        """Stop the worker once the frames already queued are processed."""
+        if not self._running:
+            return
+        self._running = False
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                break
+            except queue.Full:
+                # Make room for the sentinel, the session is going away anyway
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+        if wait and threading.current_thread() is not self._thread:
+            self._thread.join(timeout=timeout)
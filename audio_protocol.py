@@ -0,0 +1,226 @@
+"""
+Audio framing for the data WebSocket.
+
+Protocol v1 (legacy, default): every binary message is a 4-byte little-endian
+metadata length, a JSON metadata object such as {"sampleRate": 16000}, and
+the 16-bit mono PCM payload. The metadata may also carry the capture
+"timestamp" in milliseconds and a frame "sequence" number, as in the v2
+frame header.
+
+Protocol v2: the client opens with a JSON text message
+
+    {"type": "audio_config", "protocol": 2, "sampleRate": 48000,
+     "format": "s16le", "channels": 1, "frameHeader": true}
+
+and the server answers with {"type": "audio_config_ack", ...} describing the
+accepted stream. After that every binary message is raw PCM in the agreed
+format. With "frameHeader" each frame starts with a fixed 12-byte header:
+uint32 sequence number and float64 capture timestamp in milliseconds, both
+little-endian. Frames are parsed through memoryview, so a v2 s16le mono frame
+reaches the resampler without being copied.
+
+With "format": "opus" every frame (after the optional header) is one raw
+Opus packet, which takes about a tenth of the bandwidth of 16 kHz PCM. Each
+connection keeps its own Opus decoder, as packets depend on the ones before
+them, and decodes straight to 16 kHz mono so the resampler has nothing left
+to do. Opus needs the opuslib package and libopus; servers without them
+reject the handshake and the client can fall back to PCM.
+
+Clients with a silence gate (silence_gate.py) skip frames during sustained
+silence. FrameGapTracker spots the skipped audio from the jump in capture
+timestamps, so the server can put a short stretch of silence in its place.
+"""
+
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+PROTOCOL_LEGACY = 1
+PROTOCOL_V2 = 2
+
+FRAME_HEADER = struct.Struct('<Id')
+
+SAMPLE_FORMATS = {
+    's16le': np.dtype('<i2'),
+    'f32le': np.dtype('<f4'),
+}
+
+OPUS_FORMAT = 'opus'
+# Opus decodes to any of its internal rates; 16 kHz is what the recorders consume
+OPUS_DECODE_RATE = 16000
+# Longest Opus packet is 120 ms
+OPUS_MAX_FRAME_SAMPLES = OPUS_DECODE_RATE * 120 // 1000
+
+AudioFrame = namedtuple('AudioFrame', ['pcm', 'sample_rate', 'sequence', 'timestamp'])
+
+
+class AudioProtocolError(ValueError):
+    """Raised for malformed frames or an unacceptable audio_config handshake."""
+
+
+def create_opus_decoder():
+    """Return a 16 kHz mono Opus decoder, or raise AudioProtocolError if Opus is unavailable."""
+    try:
+        import opuslib
+    except ImportError:
+        raise AudioProtocolError("Opus is not supported by this server (opuslib is not installed)")
+    except Exception as e:
+        # opuslib raises a plain Exception when libopus itself is missing
+        raise AudioProtocolError(f"Opus is not supported by this server ({e})")
+    return opuslib.Decoder(OPUS_DECODE_RATE, 1)
+
+
+def _int_field(config, key, default):
+    """Read an integer handshake field, raising AudioProtocolError if it is not one."""
+    value = config.get(key, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise AudioProtocolError(f"{key} must be an integer, got {value!r}")
+
+
+def is_handshake(message):
+    """True if a text message is a v2 audio_config handshake."""
+    if not isinstance(message, str):
+        return False
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and data.get('type') == 'audio_config'
+
+
+class AudioFrameDecoder:
+    """Per-connection decoder that turns data messages into 16-bit mono PCM frames."""
+
+    def __init__(self):
+        self.protocol = PROTOCOL_LEGACY
+        self.sample_rate = None
+        self.sample_format = 's16le'
+        self.channels = 1
+        self.frame_header = False
+        self._dtype = SAMPLE_FORMATS['s16le']
+        self._opus = None
+
+    def negotiate(self, message):
+        """Apply an audio_config handshake (JSON string or dict) and return the ack message."""
+        try:
+            config = json.loads(message) if isinstance(message, str) else message
+        except ValueError as e:
+            raise AudioProtocolError(f"Invalid audio_config: {e}")
+        if not isinstance(config, dict):
+            raise AudioProtocolError("audio_config must be a JSON object")
+        protocol = _int_field(config, 'protocol', PROTOCOL_V2)
+        if protocol != PROTOCOL_V2:
+            raise AudioProtocolError(f"Unsupported protocol version {protocol}")
+        sample_format = config.get('format', 's16le')
+        if sample_format not in SAMPLE_FORMATS and sample_format != OPUS_FORMAT:
+            raise AudioProtocolError(f"Unsupported sample format {sample_format}")
+        sample_rate = _int_field(config, 'sampleRate', 0)
+        channels = _int_field(config, 'channels', 1)
+        if sample_rate <= 0 or channels <= 0:
+            raise AudioProtocolError("sampleRate and channels must be positive")
+        opus = None
+        if sample_format == OPUS_FORMAT:
+            # A new decoder per handshake, a renegotiated stream starts over
+            opus = create_opus_decoder()
+
+        self.protocol = PROTOCOL_V2
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.channels = channels
+        self.frame_header = bool(config.get('frameHeader', False))
+        self._dtype = SAMPLE_FORMATS.get(sample_format)
+        self._opus = opus
+        return {
+            'type': 'audio_config_ack',
+            'protocol': self.protocol,
+            'sampleRate': self.sample_rate,
+            'format': self.sample_format,
+            'channels': self.channels,
+            'frameHeader': self.frame_header,
+        }
+
+    def decode(self, message):
+        """Decode one binary data message into an AudioFrame with int16 mono PCM."""
+        if self.protocol == PROTOCOL_LEGACY:
+            return self._decode_legacy(message)
+        return self._decode_v2(message)
+
+    @staticmethod
+    def _decode_legacy(message):
+        metadata_length = int.from_bytes(message[:4], byteorder='little')
+        try:
+            metadata = json.loads(message[4:4 + metadata_length].decode('utf-8'))
+            sample_rate = metadata['sampleRate']
+        except (ValueError, KeyError, TypeError) as e:
+            raise AudioProtocolError(f"Invalid legacy frame metadata: {e!r}")
+        return AudioFrame(memoryview(message)[4 + metadata_length:],
+                          sample_rate, metadata.get('sequence'), metadata.get('timestamp'))
+
+    def _decode_v2(self, message):
+        view = memoryview(message)
+        sequence = timestamp = None
+        if self.frame_header:
+            if len(view) < FRAME_HEADER.size:
+                raise AudioProtocolError("Frame shorter than its header")
+            sequence, timestamp = FRAME_HEADER.unpack_from(view)
+            view = view[FRAME_HEADER.size:]
+        if self._opus is not None:
+            return AudioFrame(self._decode_opus(view), OPUS_DECODE_RATE, sequence, timestamp)
+        return AudioFrame(self._to_pcm16_mono(view), self.sample_rate, sequence, timestamp)
+
+    def _decode_opus(self, view):
+        try:
+            return self._opus.decode(bytes(view), OPUS_MAX_FRAME_SAMPLES)
+        except Exception as e:
+            raise AudioProtocolError(f"Invalid Opus packet: {e}")
+
+    def _to_pcm16_mono(self, view):
+        if self.sample_format == 's16le' and self.channels == 1:
+            return view
+        samples = np.frombuffer(view, dtype=self._dtype)
+        if self.channels > 1:
+            usable = len(samples) - len(samples) % self.channels
+            samples = samples[:usable].reshape(-1, self.channels).mean(axis=1)
+        if self.sample_format == 'f32le':
+            samples = np.clip(samples, -1.0, 1.0) * 32767
+        return samples.astype(np.int16).tobytes()
+
+
+class FrameGapTracker:
+    """Per-connection detection of audio a client held back, from frame capture timestamps.
+
+    Capture timestamps mark the end of a frame. Gaps up to `tolerance`
+    seconds are timestamp jitter and ignored. Only the first `max_fill`
+    seconds of a gap are synthesized: enough for the recorder's VAD and
+    pre-recording buffer to see a pause, while an idle client costs nothing.
+    """
+
+    def __init__(self, max_fill=1.0, tolerance=0.25):
+        self.max_fill = max_fill
+        self.tolerance = tolerance
+        self.gaps = 0
+        self.gap_seconds = 0.0
+        self._last_end = None
+
+    def gap(self, frame):
+        """Seconds of audio missing before `frame`, 0.0 if it follows the previous one."""
+        if frame.timestamp is None or not frame.sample_rate:
+            return 0.0
+        duration_ms = len(frame.pcm) / 2 / frame.sample_rate * 1000
+        previous_end, self._last_end = self._last_end, frame.timestamp
+        if previous_end is None:
+            return 0.0
+        missing = (frame.timestamp - duration_ms - previous_end) / 1000
+        if missing <= self.tolerance:
+            return 0.0
+        self.gaps += 1
+        self.gap_seconds += missing
+        return missing
+
+    def silence(self, frame, seconds):
+        """Zero 16-bit PCM at the frame's rate standing in for `seconds` of a gap, capped at max_fill."""
+        return bytes(int(min(seconds, self.max_fill) * frame.sample_rate) * 2)
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: per-chunk FFT resampling vs. the streaming polyphase resampler.
+
+Each clip in test-audio/ is first converted offline to a typical browser
+capture rate, then cut into 1024-sample frames (what index.html sends) and
+resampled back to 16 kHz frame by frame with both implementations. Reports
+time per frame, real-time factor and the error against resampling the whole
+clip at once, which shows the chunk boundary artifacts.
+
+Usage:
+    python benchmarks/resampler_benchmark.py [--rates 48000 44100] [--chunk 1024]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+from scipy.signal import resample, resample_poly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_resampler import StreamingResampler  # noqa: E402
+
+TARGET_RATE = 16000
+
+
+def legacy_decode_and_resample(audio_data, original_sample_rate, target_sample_rate):
+    """The per-chunk FFT implementation previously used by the servers."""
+    audio_np = np.frombuffer(audio_data, dtype=np.int16)
+    num_target_samples = int(len(audio_np) * target_sample_rate / original_sample_rate)
+    return resample(audio_np, num_target_samples).astype(np.int16).tobytes()
+
+
+def load_clip(path):
+    with wave.open(path, 'rb') as wav_file:
+        rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        frames = wav_file.readframes(wav_file.getnframes())
+    audio = np.frombuffer(frames, dtype=np.int16)
+    if channels > 1:
+        audio = audio[:len(audio) - len(audio) % channels].reshape(-1, channels)[:, 0]
+    return audio, rate
+
+
+def to_rate(audio, source_rate, target_rate):
+    if source_rate == target_rate:
+        return audio
+    converted = resample_poly(audio.astype(np.float64), target_rate, source_rate)
+    return np.clip(np.rint(converted), -32768, 32767).astype(np.int16)
+
+
+def snr_db(reference, signal):
+    length = min(len(reference), len(signal))
+    reference = reference[:length].astype(np.float64)
+    noise = reference - signal[:length].astype(np.float64)
+    return 10 * np.log10(np.sum(reference ** 2) / max(np.sum(noise ** 2), 1e-9))
+
+
+def run(audio, rate, chunk_size):
+    chunks = [audio[i:i + chunk_size].tobytes() for i in range(0, len(audio), chunk_size)]
+    reference = to_rate(audio, rate, TARGET_RATE)
+    clip_seconds = len(audio) / rate
+
+    start = time.perf_counter()
+    legacy = b''.join(legacy_decode_and_resample(c, rate, TARGET_RATE) for c in chunks)
+    legacy_time = time.perf_counter() - start
+
+    resampler = StreamingResampler(rate, TARGET_RATE)
+    start = time.perf_counter()
+    streamed = b''.join(resampler.process(c) for c in chunks)
+    streaming_time = time.perf_counter() - start
+
+    legacy = np.frombuffer(legacy, dtype=np.int16)
+    streamed = np.frombuffer(streamed, dtype=np.int16)
+    # The streaming filter is causal, line it up with the zero-phase reference
+    delay = 10 * max(resampler.up, resampler.down) // resampler.down
+    for name, elapsed, output, offset in (
+            ('fft-per-chunk', legacy_time, legacy, 0),
+            ('streaming', streaming_time, streamed, delay)):
+        print(f"    {name:<14} {elapsed / len(chunks) * 1e6:8.1f} us/chunk  "
+              f"RTF {elapsed / clip_seconds:.5f}  "
+              f"samples {len(output):>8} (expected {len(reference)})  "
+              f"SNR {snr_db(reference, output[offset:]):6.1f} dB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rates', type=int, nargs='+', default=[48000, 44100, 24000],
+                        help='Source capture rates to simulate (default: 48000 44100 24000)')
+    parser.add_argument('--chunk', type=int, default=1024,
+                        help='Frame size in source samples (default: 1024)')
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='Only use the first N seconds of each clip (default: 60)')
+    args = parser.parse_args()
+
+    audio_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test-audio')
+    for path in sorted(glob.glob(os.path.join(audio_dir, '*.wav'))):
+        audio, rate = load_clip(path)
+        audio = audio[:int(args.max_seconds * rate)]
+        print(f"{os.path.basename(path)} ({len(audio) / rate:.1f} s at {rate} Hz)")
+        for source_rate in args.rates:
+            print(f"  {source_rate} Hz -> {TARGET_RATE} Hz")
+            run(to_rate(audio, rate, source_rate), source_rate, args.chunk)
+
+
+if __name__ == '__main__':
+    main()
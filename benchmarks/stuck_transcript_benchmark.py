@@ -0,0 +1,117 @@
+"""
+Micro-benchmark: SequenceMatcher hard-break check vs. StuckTranscriptDetector.
+
+Simulates realtime transcript updates of growing utterances (new words
+appended on every update) and of stuck utterances (the same text with an
+occasional one-word flicker) at several transcript lengths. Runs both the
+previous check, SequenceMatcher(None, first, last).ratio() over a deque of
+timestamped texts, and the detector with the same thresholds. Reports time
+per update and how often the two disagree on forcing a stop.
+
+Usage:
+    python benchmarks/stuck_transcript_benchmark.py [--lengths 100 1000 5000] [--updates 200]
+"""
+
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stuck_transcript import (  # noqa: E402
+    DEFAULT_MIN_CHARS, DEFAULT_MIN_SIMILARITY, DEFAULT_MIN_TEXTS, DEFAULT_WINDOW,
+    StuckTranscriptDetector)
+
+WORDS = ("the quick brown fox jumps over a lazy dog while we keep talking about "
+         "transcription latency background noise and other things").split()
+# Simulated seconds between realtime updates
+UPDATE_INTERVAL = 0.2
+
+
+class SequenceMatcherCheck:
+    """The hard-break check previously inlined in the servers and the CLI client."""
+
+    def __init__(self):
+        self.text_time_deque = collections.deque()
+
+    def update(self, text, now):
+        text_time_deque = self.text_time_deque
+        text_time_deque.append((now, text))
+        while text_time_deque and text_time_deque[0][0] < now - DEFAULT_WINDOW:
+            text_time_deque.popleft()
+        if len(text_time_deque) >= DEFAULT_MIN_TEXTS:
+            first_text = text_time_deque[0][1]
+            last_text = text_time_deque[-1][1]
+            similarity = SequenceMatcher(None, first_text, last_text).ratio()
+            return similarity > DEFAULT_MIN_SIMILARITY and len(first_text) > DEFAULT_MIN_CHARS
+        return False
+
+
+def random_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return words
+
+
+def growing_updates(rng, length, count):
+    """An utterance that keeps growing, ending at about `length` characters."""
+    words = random_text(rng, length)
+    return [' '.join(words[:max(1, len(words) * (i + 1) // count)]) for i in range(count)]
+
+
+def stuck_updates(rng, length, count):
+    """The same text over and over, with a one-word flicker on every tenth update."""
+    words = random_text(rng, length)
+    updates = []
+    for i in range(count):
+        current = list(words)
+        if i % 10 == 9:
+            current[rng.randrange(len(current))] = rng.choice(WORDS)
+        updates.append(' '.join(current))
+    return updates
+
+
+def run(name, updates):
+    results = {}
+    for label, check in (('SequenceMatcher', SequenceMatcherCheck()),
+                         ('detector', StuckTranscriptDetector())):
+        decisions = []
+        start = time.perf_counter()
+        for i, text in enumerate(updates):
+            decisions.append(check.update(text, i * UPDATE_INTERVAL))
+        elapsed = time.perf_counter() - start
+        results[label] = decisions
+        print(f"    {label:<16} {elapsed / len(updates) * 1e6:10.1f} us/update  "
+              f"stops {sum(decisions):>4}/{len(updates)}")
+    disagreements = sum(a != b for a, b in zip(results['SequenceMatcher'], results['detector']))
+    print(f"    {name} disagreements: {disagreements}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[100, 500, 2000, 5000],
+                        help='Transcript lengths in characters (default: 100 500 2000 5000)')
+    parser.add_argument('--updates', type=int, default=200,
+                        help='Realtime updates per scenario (default: 200)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for length in args.lengths:
+        print(f"{length} characters")
+        print("  growing utterance")
+        run('growing', growing_updates(rng, length, args.updates))
+        print("  stuck utterance")
+        run('stuck', stuck_updates(rng, length, args.updates))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,5 +13,6 @@ class ClientSession:
         self.is_running = True
         self.recorder_ready = threading.Event()
         self.last_vad_stop = None
+        self.resampler = None
         self.preferred_voice_gender = "female"  # Default to female voice
         self.language = "en-us"  # Default to English language 
\ No newline at end of file
@@ -13,7 +13,7 @@ from RealtimeSTT import AudioToTextRecorder
 
 # Local imports
 from config import parse_args
-from utils import decode_and_resample, preprocess_realtime_text
+from utils import StreamingResampler, preprocess_realtime_text
 from models import ClientSession
 from services.translation import TranslationService
 from services.tts import TTSService
@@ -205,8 +205,9 @@ class AudioServer:
                     metadata = json.loads(metadata_json)
                     sample_rate = metadata['sampleRate']
                     chunk = message[4+metadata_length:]
-                    resampled_chunk = decode_and_resample(chunk, sample_rate, 16000)
-                    client.recorder.feed_audio(resampled_chunk)
+                    if client.resampler is None or client.resampler.source_rate != sample_rate:
+                        client.resampler = StreamingResampler(sample_rate, 16000)
+                    client.recorder.feed_audio(client.resampler.process(chunk))
                 except Exception as e:
                     print(f"Error processing message for client {client_id}: {e}")
                     continue
@@ -0,0 +1,215 @@
+"""
+Per-client outbound queues and concurrent fan-out of server messages.
+
+Messages used to be sent to one connection after another, so a single slow
+or stalled client delayed delivery to everyone behind it. FanOut serializes
+each payload once and appends it to a bounded outbound queue per client;
+every client has its own writer task, so publishing never waits on a
+socket and costs the same no matter how slow the subscribers are.
+
+Realtime updates are superseded by the next one, so a newer update replaces
+a queued older one (last value wins) instead of piling up behind a poor
+link. All other messages (fullSentence, recording_start/stop and the other
+lifecycle events) are never dropped. A burst may take a queue past its
+limit; a client whose queue stays over it for longer than the per-recipient
+timeout, or that does not accept a message within that timeout, is
+detached: removed from its subscriber sets and closed in the background.
+Messages are only queued for connections attached to the FanOut, so a
+detached or forgotten connection never gets a new outbox.
+
+Clients that opted in to realtime deltas (see realtime_delta) get their
+realtime updates delta-encoded by their writer, against the last update
+actually sent on that connection.
+"""
+
+import asyncio
+import collections
+import json
+import time
+
+from websockets.exceptions import ConnectionClosed
+
+from realtime_delta import RealtimeDeltaEncoder
+
+# Close code for "try again later", sent to detached slow consumers
+CLOSE_SLOW_CONSUMER = 1013
+COALESCED_TYPES = ('realtime',)
+
+
+class ClientOutbox:
+    """Bounded outbound queue and writer task of one connection."""
+
+    def __init__(self, fanout, connection, name=None):
+        self.fanout = fanout
+        self.connection = connection
+        self.name = name or str(connection.remote_address)
+        self.sent = 0
+        self.coalesced = 0
+        self.realtime_delta = None
+        # When the queue went over max_queue, None while it is below
+        self._full_since = None
+        self._closed = False
+        self._queue = collections.deque()
+        self._ready = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def depth(self):
+        return len(self._queue)
+
+    def set_realtime_delta(self, enabled, full_sync_every=20):
+        self.realtime_delta = RealtimeDeltaEncoder(full_sync_every) if enabled else None
+
+    def put(self, kind, payload, message=None):
+        """Queue a payload. Returns False if the queue has been over its limit for too long.
+
+        `message` is the unserialized message, kept for realtime delta encoding.
+        """
+        if kind in self.fanout.coalesce and self._queue and self._queue[-1][0] == kind:
+            # Nothing newer is queued behind the old update, replace it in place
+            self._queue[-1] = (kind, payload, message)
+            self.coalesced += 1
+            return True
+        if len(self._queue) < self.fanout.max_queue:
+            self._full_since = None
+        elif self._full_since is None:
+            # A burst within one loop tick, the writer has not had a chance yet
+            self._full_since = time.monotonic()
+        elif time.monotonic() - self._full_since > self.fanout.timeout:
+            return False
+        self._queue.append((kind, payload, message))
+        self._ready.set()
+        return True
+
+    def _encode_delta(self, kind, payload, message):
+        if kind == 'realtime' and isinstance(message, dict):
+            encoded = self.realtime_delta.encode(message)
+            if encoded is not message:
+                return FanOut.encode(encoded)
+        elif kind == 'fullSentence':
+            self.realtime_delta.reset()
+        return payload
+
+    async def _run(self):
+        while not self._closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            kind, payload, message = self._queue.popleft()
+            if self.realtime_delta is not None:
+                payload = self._encode_delta(kind, payload, message)
+            try:
+                await asyncio.wait_for(
+                    self.connection.send(payload, text=True), self.fanout.timeout)
+            except asyncio.TimeoutError:
+                self.fanout.detach(self.connection, 'timeout')
+                return
+            except ConnectionClosed:
+                self.fanout.detach(self.connection, 'closed')
+                return
+            self.sent += 1
+
+    def stats(self):
+        return {'client': self.name, 'depth': self.depth(),
+                'sent': self.sent, 'coalesced': self.coalesced,
+                'realtime_delta': self.realtime_delta is not None}
+
+    def close(self):
+        # asyncio.wait_for can swallow a cancel that races a finished send, so
+        # the writer also checks the flag, and is woken if idle
+        self._closed = True
+        self._ready.set()
+        self._task.cancel()
+
+
+class FanOut:
+    """Publishes messages to sets of connections through their per-client outboxes."""
+
+    def __init__(self, timeout=2.0, max_queue=256, coalesce=COALESCED_TYPES,
+                 on_detach=None, on_coalesce=None):
+        self.timeout = timeout
+        self.max_queue = max(1, max_queue)
+        self.coalesce = tuple(coalesce)
+        # Called as on_detach(connection, reason) for every detached recipient
+        self.on_detach = on_detach
+        # Called as on_coalesce(outbox) whenever a queued update is replaced
+        self.on_coalesce = on_coalesce
+        self.outboxes = {}
+        # connection -> {id(recipient set): recipient set} it was published through
+        self._subscriptions = collections.defaultdict(dict)
+        self.detached = 0
+
+    @staticmethod
+    def encode(message):
+        """Serialize a message once: dicts become JSON, text becomes UTF-8 bytes."""
+        if isinstance(message, dict):
+            message = json.dumps(message)
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        return message
+
+    def attach(self, connection, name=None):
+        outbox = self.outboxes.get(connection)
+        if outbox is None:
+            outbox = self.outboxes[connection] = ClientOutbox(self, connection, name)
+        return outbox
+
+    def publish(self, message, recipients, kind=None):
+        """Queue `message` for every connection in the `recipients` set without waiting.
+
+        `kind` is the message type used for coalescing, taken from a dict's
+        'type' if not given. Returns the number of recipients it was queued for.
+        """
+        if not recipients:
+            return 0
+        if kind is None and isinstance(message, dict):
+            kind = message.get('type')
+        payload = self.encode(message)
+        queued = 0
+        for connection in list(recipients):
+            if connection in self.outboxes:
+                self._subscriptions[connection][id(recipients)] = recipients
+            queued += self._enqueue(connection, kind, payload, message)
+        return queued
+
+    def send_to(self, connection, message):
+        """Queue a message dict for a single connection."""
+        return bool(self._enqueue(connection, message.get('type'), self.encode(message), message))
+
+    def _enqueue(self, connection, kind, payload, message):
+        outbox = self.outboxes.get(connection)
+        if outbox is None:
+            # Detached or forgotten, or never attached
+            return 0
+        coalesced = outbox.coalesced
+        if not outbox.put(kind, payload, message if isinstance(message, dict) else None):
+            self.detach(connection, 'overflow')
+            return 0
+        if outbox.coalesced != coalesced and self.on_coalesce is not None:
+            self.on_coalesce(outbox)
+        return 1
+
+    def detach(self, connection, reason):
+        """Stop delivering to `connection` and close it unless it is already gone."""
+        outbox = self.outboxes.pop(connection, None)
+        for recipients in self._subscriptions.pop(connection, {}).values():
+            recipients.discard(connection)
+        if outbox is None:
+            return
+        outbox.close()
+        self.detached += 1
+        if self.on_detach is not None:
+            self.on_detach(connection, reason)
+        if reason != 'closed':
+            # Never wait on a stalled client, close it in the background
+            asyncio.ensure_future(connection.close(CLOSE_SLOW_CONSUMER, 'slow consumer'))
+
+    def forget(self, connection):
+        """Drop a connection that disconnected normally."""
+        outbox = self.outboxes.pop(connection, None)
+        self._subscriptions.pop(connection, None)
+        if outbox is not None:
+            outbox.close()
+
+    def depth(self):
+        return sum(outbox.depth() for outbox in list(self.outboxes.values()))
@@ -0,0 +1,324 @@
+"""
+Minimal Prometheus-style metrics for the STT servers.
+
+Implements counters, gauges and histograms with labels and renders them in
+the Prometheus text exposition format, without extra dependencies.
+Observations are cheap and thread-safe, so they can be recorded from
+recorder callback threads, transcription workers and the event loop alike.
+
+ServerMetrics bundles the metrics both servers export on `/metrics`.
+"""
+
+import asyncio
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        return []
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def values(self):
+        """Return {label values tuple: value} for every label set seen so far."""
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Compute the (label-less) value at scrape time instead of storing it."""
+        self._function = function
+
+    def value(self, **labels):
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self, **labels):
+        """Return (count, sum) for one label set."""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return 0, 0.0
+        return state[-1], state[-2]
+
+    def snapshots(self):
+        """Return {label values tuple: (count, sum)} for every label set seen so far."""
+        with self._lock:
+            return {key: (state[-1], state[-2]) for key, state in self._values.items()}
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{plain} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class ServerMetrics:
+    """The hot-path metrics exported by server.py and stt_server.py."""
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.sentence_latency = self.registry.histogram(
+            'stt_vad_stop_to_sentence_seconds',
+            'Time from the end of speech (VAD stop, else recording stop) to the fullSentence message being sent')
+        self.inference_seconds = self.registry.histogram(
+            'stt_inference_seconds',
+            'Model inference time per transcription call', ('model',))
+        self.real_time_factor = self.registry.histogram(
+            'stt_real_time_factor',
+            'Inference time divided by transcribed audio duration', ('model',),
+            buckets=RTF_BUCKETS)
+        self.active_sessions = self.registry.gauge(
+            'stt_active_sessions', 'Connected client sessions')
+        self.ingest_queue_depth = self.registry.gauge(
+            'stt_ingest_queue_depth', 'Audio frames waiting in ingest buffers across all sessions')
+        self.resampling_sessions = self.registry.gauge(
+            'stt_resampling_sessions',
+            'Sessions whose audio the server resamples, i.e. not delivered at 16 kHz')
+        self.outbound_queue_depth = self.registry.gauge(
+            'stt_outbound_queue_depth', 'Messages waiting in client outbound queues across all clients')
+        self.ingest_dropped = self.registry.counter(
+            'stt_ingest_dropped_frames_total', 'Audio frames discarded because a session\'s ingest buffer was full')
+        self.ingress_bytes = self.registry.counter(
+            'stt_ingress_bytes_total', 'Audio bytes received from clients, by stream format', ('format',))
+        self.client_gated_seconds = self.registry.counter(
+            'stt_client_gated_seconds_total',
+            'Seconds of silence clients held back, detected from gaps in frame capture timestamps')
+        self.outbound_coalesced = self.registry.counter(
+            'stt_outbound_coalesced_total', 'Queued realtime updates replaced by a newer one before sending')
+        self.detached_clients = self.registry.counter(
+            'stt_detached_clients_total',
+            'Clients dropped from message fan-out, by reason (timeout, overflow or closed)', ('reason',))
+        self.utterance_stage = self.registry.histogram(
+            'stt_utterance_stage_seconds',
+            'Time an utterance spent reaching each stage from the stage before it, see utterance_trace',
+            ('stage',))
+        self.mouth_to_text = self.registry.histogram(
+            'stt_mouth_to_text_seconds',
+            'Time from the end of speech on the client\'s clock to the final sentence being sent',
+            buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+        self.frames_lost = self.registry.counter(
+            'stt_frames_lost_total',
+            'Audio frames skipped in the sequence numbers clients sent, including ones that arrived late')
+        self.frames_reordered = self.registry.counter(
+            'stt_frames_reordered_total', 'Audio frames that arrived after a later one')
+        self.transport_delay = self.registry.histogram(
+            'stt_transport_delay_seconds',
+            'Time from a frame\'s capture on the client to its arrival, including any clock offset')
+        self.event_loop_lag = self.registry.histogram(
+            'stt_event_loop_lag_seconds',
+            'How late the asyncio event loop wakes up for a scheduled timer',
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+    def observe_inference(self, model, seconds, audio_seconds):
+        self.inference_seconds.observe(seconds, model=model)
+        if audio_seconds > 0:
+            self.real_time_factor.observe(seconds / audio_seconds, model=model)
+
+    def observe_trace(self, breakdown):
+        """Record the stage durations of an utterance trace breakdown."""
+        for stage, milliseconds in breakdown['stages_ms'].items():
+            self.utterance_stage.observe(milliseconds / 1000, stage=stage)
+        if breakdown.get('latency_ms') is not None:
+            self.sentence_latency.observe(breakdown['latency_ms'] / 1000)
+        if breakdown.get('mouth_to_text_ms') is not None:
+            self.mouth_to_text.observe(max(0.0, breakdown['mouth_to_text_ms'] / 1000))
+
+    def observe_frame(self, lost, reordered, delay):
+        """Record the StreamTiming.observe() result of one audio frame."""
+        if lost:
+            self.frames_lost.inc(lost)
+        if reordered:
+            self.frames_reordered.inc()
+        if delay is not None:
+            self.transport_delay.observe(max(0.0, delay))
+
+    async def monitor_event_loop(self, interval=0.5):
+        """Measure event loop lag until cancelled."""
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.event_loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+    def stats(self):
+        """Current values as a JSON-friendly dict, for control-channel introspection."""
+        def summary(histogram):
+            result = {}
+            for key, (count, total) in histogram.snapshots().items():
+                name = ','.join(key) or 'all'
+                result[name] = {'count': count, 'mean': total / count if count else None}
+            return result
+
+        return {
+            'active_sessions': self.active_sessions.value(),
+            'ingest_queue_depth': self.ingest_queue_depth.value(),
+            'ingest_dropped': self.ingest_dropped.value(),
+            'resampling_sessions': self.resampling_sessions.value(),
+            'outbound_queue_depth': self.outbound_queue_depth.value(),
+            'ingress_bytes': {key[0]: value for key, value in self.ingress_bytes.values().items()},
+            'client_gated_seconds': self.client_gated_seconds.value(),
+            'outbound_coalesced': sum(self.outbound_coalesced.values().values()),
+            'detached_clients': {key[0]: value for key, value in self.detached_clients.values().items()},
+            'inference_seconds': summary(self.inference_seconds),
+            'real_time_factor': summary(self.real_time_factor),
+            'sentence_latency_seconds': summary(self.sentence_latency).get('all'),
+            'utterance_stage_seconds': summary(self.utterance_stage),
+            'mouth_to_text_seconds': summary(self.mouth_to_text).get('all'),
+            'frames_lost': self.frames_lost.value(),
+            'frames_reordered': self.frames_reordered.value(),
+            'transport_delay_seconds': summary(self.transport_delay).get('all'),
+            'event_loop_lag_seconds': summary(self.event_loop_lag).get('all'),
+        }
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,97 @@
+"""
+Delta encoding of realtime transcript updates.
+
+Realtime updates resend the whole partial transcript, which grows through a
+long utterance and mostly repeats the previous update. A client can opt in
+to deltas on its data connection:
+
+    -> {"type": "realtime_mode", "delta": true}
+    <- {"type": "realtime_mode_ack", "delta": true, "fullSyncEvery": 20}
+
+From then on realtime updates are sent as
+
+    {"type": "realtime_delta", "keep": 42, "text": "changed suffix"}
+
+meaning: keep the first `keep` characters of the last realtime text and
+append `text`. Deltas are computed when the update is actually sent, against
+the last text sent on that connection, so coalesced or dropped updates never
+break the chain. The first update after a fullSentence, every
+`full_sync_every`-th update and any update where a delta would not be
+smaller go out as a regular full `realtime` message, which doubles as the
+sync frame. Offsets count UTF-16 code units, like JavaScript strings; texts
+with characters outside the BMP are always sent in full.
+"""
+
+import json
+import os
+
+
+def _is_bmp(text):
+    return text.isascii() or all(ord(char) <= 0xFFFF for char in text)
+
+
+def parse_realtime_mode(message):
+    """Return the requested delta flag if `message` is a realtime_mode request, else None."""
+    if not isinstance(message, str) or '"realtime_mode"' not in message:
+        return None
+    try:
+        request = json.loads(message)
+    except ValueError:
+        return None
+    if not isinstance(request, dict) or request.get('type') != 'realtime_mode':
+        return None
+    return bool(request.get('delta', False))
+
+
+class RealtimeDeltaEncoder:
+    """Turns one connection's realtime messages into deltas against the last one sent."""
+
+    def __init__(self, full_sync_every=20):
+        self.full_sync_every = max(1, full_sync_every)
+        self.reset()
+
+    def reset(self):
+        """Forget the last text, e.g. after a fullSentence; the next update is a full sync."""
+        self.last_text = ""
+        self.since_sync = 0
+
+    def encode(self, message):
+        """Return the message to send in place of the realtime `message` dict."""
+        text = message.get('text', '')
+        keep = len(os.path.commonprefix([self.last_text, text]))
+        suffix = text[keep:]
+        full = (not self.last_text
+                or self.since_sync >= self.full_sync_every
+                or len(suffix) >= len(text) - 8
+                or not _is_bmp(text))
+        self.last_text = text
+        if full:
+            self.since_sync = 0
+            return message
+        self.since_sync += 1
+        delta = dict(message)
+        delta['type'] = 'realtime_delta'
+        delta['keep'] = keep
+        delta['text'] = suffix
+        return delta
+
+
+class RealtimeDeltaDecoder:
+    """Client side: rebuilds the full realtime text from realtime and realtime_delta messages."""
+
+    def __init__(self):
+        self.text = ""
+
+    def apply(self, message):
+        """Return the full realtime text after `message`, or None if it is not a realtime update."""
+        kind = message.get('type')
+        if kind == 'realtime':
+            self.text = message.get('text', '')
+        elif kind == 'realtime_delta':
+            self.text = self.text[:message.get('keep', 0)] + message.get('text', '')
+        elif kind == 'fullSentence':
+            self.text = ""
+            return None
+        else:
+            return None
+        return self.text
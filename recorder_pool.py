@@ -0,0 +1,99 @@
+"""
+Pool of pre-warmed session recorders.
+
+Constructing an AudioToTextRecorder takes seconds (worker process start,
+VAD and model loading), which a connecting client used to wait through
+before receiving `init_complete`. WarmRecorderPool keeps a few recorders
+constructed ahead of time and refills itself on a background thread, so a
+new session normally just takes one.
+
+Recorders are created before the client they will serve is known, so their
+callbacks are bound late through a RecorderBinding: the callbacks read
+`binding.client_id` and ignore events while it is still None.
+"""
+
+import collections
+import threading
+
+
+class RecorderBinding:
+    """Late-bound link between a pre-built recorder and the session using it."""
+
+    __slots__ = ('client_id', 'recorder')
+
+    def __init__(self):
+        self.client_id = None
+        self.recorder = None
+
+
+class WarmRecorderPool:
+    """Keeps `size` recorders ready and hands them out to new sessions."""
+
+    def __init__(self, create_recorder, size=2):
+        self.create_recorder = create_recorder
+        self.size = max(0, size)
+        self._ready = collections.deque()
+        self._lock = threading.Lock()
+        self._refill = threading.Event()
+        self._available = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._fill, name='recorder-pool', daemon=True)
+        self._thread.start()
+        self._refill.set()
+
+    def wait_ready(self, timeout=None):
+        """Block until at least one warm recorder exists (or the pool is disabled)."""
+        if self.size == 0:
+            return True
+        return self._available.wait(timeout)
+
+    def available(self):
+        return len(self._ready)
+
+    def _build(self):
+        binding = RecorderBinding()
+        binding.recorder = self.create_recorder(binding)
+        return binding
+
+    def _fill(self):
+        while self._running:
+            self._refill.wait()
+            self._refill.clear()
+            while self._running and len(self._ready) < self.size:
+                try:
+                    binding = self._build()
+                except Exception as e:
+                    print(f"Error pre-warming recorder: {e}")
+                    break
+                with self._lock:
+                    self._ready.append(binding)
+                self._available.set()
+
+    def acquire(self, client_id):
+        """Take a warm recorder for `client_id`, building one inline if the pool is empty."""
+        with self._lock:
+            binding = self._ready.popleft() if self._ready else None
+            if not self._ready:
+                self._available.clear()
+        if binding is None:
+            print(f"No warm recorder available, building one for client {client_id}")
+            binding = self._build()
+        binding.client_id = client_id
+        self._refill.set()
+        return binding
+
+    def shutdown(self):
+        self._running = False
+        self._refill.set()
+        with self._lock:
+            ready = list(self._ready)
+            self._ready.clear()
+        for binding in ready:
+            try:
+                binding.recorder.shutdown()
+            except Exception as e:
+                print(f"Error shutting down pooled recorder: {e}")
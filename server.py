@@ -10,7 +10,7 @@ if __name__ == '__main__':
     parser.add_argument('--silero-sensitivity', type=float, default=0.4,
                         help='Silero VAD sensitivity (default: 0.4)')
     parser.add_argument('--language', type=str, default="",
-                        help='Language of transcript (default: auto)')
+                        help='Language of transcript (default: auto, detected per utterance before batching)')
     parser.add_argument('--webrtc-sensitivity', type=int, default=2,
                         help='WebRTC VAD sensitivity (default: 2)')
     parser.add_argument('--post-speech-silence', type=float, default=0.4,
@@ -29,22 +29,97 @@ if __name__ == '__main__':
                         help='Beam size for realtime transcription (default: 5)')
     parser.add_argument('--enable-realtime', action='store_true',
                         help='Enable realtime transcription')
+    parser.add_argument('--hard-break', type=float, default=3.0,
+                        help='Stop an utterance whose realtime transcript stays the same for this many seconds (background noise), 0 to disable (default: 3)')
+    parser.add_argument('--session-model', type=str, default='tiny',
+                        help='Small model each per-client recorder loads on the CPU (int8); the recorder only does VAD and buffering (default: tiny)')
+    parser.add_argument('--pool-workers', type=int, default=2,
+                        help='Number of shared final transcription workers (default: 2)')
+    parser.add_argument('--realtime-pool-workers', type=int, default=1,
+                        help='Number of shared realtime transcription workers (default: 1)')
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help='Max utterances per batched final transcription call (default: 16)')
+    parser.add_argument('--realtime-batch-size', type=int, default=16,
+                        help='Max utterances per batched realtime transcription call (default: 16)')
+    parser.add_argument('--batch-max-wait', type=float, default=0.05,
+                        help='Max seconds an utterance waits for others to join its batch (default: 0.05)')
+    parser.add_argument('--warm-recorders', type=int, default=2,
+                        help='Number of pre-warmed session recorders kept ready for new clients (default: 2)')
+    parser.add_argument('--max-sessions', type=int, default=0,
+                        help='Max concurrent client sessions, 0 for unlimited (default: 0)')
+    parser.add_argument('--max-rtf', type=float, default=0.0,
+                        help='Stop admitting clients while the measured real-time factor of the shared model is above this, 0 to disable (default: 0)')
+    parser.add_argument('--admission-queue', type=int, default=0,
+                        help='Clients allowed to wait for a free slot instead of being rejected (default: 0)')
+    parser.add_argument('--admission-timeout', type=float, default=30.0,
+                        help='Max seconds a queued client waits for a slot (default: 30)')
+    parser.add_argument('--retry-after', type=float, default=5.0,
+                        help='Base retry-after hint in seconds sent with server_busy (default: 5)')
+    parser.add_argument('--ingest-queue-size', type=int, default=64,
+                        help='Max audio frames buffered per client before the overflow policy applies (default: 64)')
+    parser.add_argument('--ingest-overflow', type=str, default='drop_oldest',
+                        choices=['drop_oldest', 'drop_newest', 'block'],
+                        help='What to do when a client\'s ingest buffer is full (default: drop_oldest)')
+    parser.add_argument('--gap-fill-max', type=float, default=1.0,
+                        help='Seconds of silence fed in place of audio a silence-gated client held back, 0 to disable (default: 1.0)')
+    parser.add_argument('--device', type=str, default='cuda',
+                        help='Device for the shared models, "cuda" or "cpu" (default: cuda)')
+    parser.add_argument('--compute-type', type=str, default='default',
+                        help='CTranslate2 compute type for the shared models (default: default)')
+    parser.add_argument('--send-timeout', type=float, default=2.0,
+                        help='Seconds a client gets to accept a message before it is disconnected as a slow consumer (default: 2)')
+    parser.add_argument('--send-queue-size', type=int, default=256,
+                        help='Messages queued per client; newer realtime updates replace queued ones, a client that stays over it '
+                             'for longer than --send-timeout is disconnected (default: 256)')
+    parser.add_argument('--realtime-delta-sync', type=int, default=20,
+                        help='For clients using delta-encoded realtime updates, send the full text every N updates (default: 20)')
+    parser.add_argument('--backend', type=str, default='whisper', choices=['whisper', 'stub'],
+                        help='Transcription backend for the shared models, "stub" needs no model or GPU (default: whisper)')
+    parser.add_argument('--stub-delay', type=float, default=0.05,
+                        help='Stub backend: fixed seconds per transcription call (default: 0.05)')
+    parser.add_argument('--stub-delay-per-second', type=float, default=0.0,
+                        help='Stub backend: extra seconds per second of audio (default: 0)')
+    parser.add_argument('--stub-jitter', type=float, default=0.0,
+                        help='Stub backend: up to this many seconds of seeded random delay (default: 0)')
+    parser.add_argument('--stub-text', type=str, action='append',
+                        help='Stub backend: canned sentence, repeat to give several, picked per utterance by its audio')
+    parser.add_argument('--admin-port', type=int, default=8003,
+                        help='Port of the admin HTTP endpoints (/clients, /model), bound to localhost and not tunneled (default: 8003)')
+    parser.add_argument('--log-format', type=str, default='text', choices=['text', 'json'],
+                        help='Output of the realtime and sentence logs, written by a background thread (default: text)')
+    parser.add_argument('--log-sample', type=str, action='append', metavar='CATEGORY=FRACTION',
+                        help='Keep only this fraction of a log category (realtime, sentence), 0 turns it off; repeatable')
+    parser.add_argument('--log-rate-limit', type=str, action='append', metavar='CATEGORY=PER_SECOND',
+                        help='Log at most this many records per second of a category, 0 for no limit (default: realtime=5)')
 
     args = parser.parse_args()
 
     print("Starting server, please wait...")
     from RealtimeSTT import AudioToTextRecorder
     import asyncio
+    import functools
     import websockets
     import threading
-    import numpy as np
-    from scipy.signal import resample
     import json
     import logging
     import sys
-    from dataclasses import dataclass
+    from dataclasses import dataclass, field
     from typing import Optional
     from dotenv import load_dotenv
+    from transcription_pool import TranscriptionPool, PooledRealtimeLoop, load_warmup_audio
+    from transcription_backends import StubBackend
+    from audio_resampler import StreamingResampler
+    from audio_protocol import AudioFrameDecoder, AudioProtocolError, FrameGapTracker, is_handshake
+    from audio_ingest import AudioIngestWorker
+    from recorder_pool import WarmRecorderPool
+    from admission import AdmissionController
+    from metrics import ServerMetrics
+    from fanout import FanOut
+    from realtime_delta import parse_realtime_mode
+    from stuck_transcript import StuckTranscriptDetector
+    from utterance_trace import UtteranceTracer
+    from stream_timing import StreamTiming
+    from server_logging import get_logger, parse_category_values, setup_logging
     load_dotenv()
 
     logging.basicConfig(
@@ -55,44 +130,115 @@ if __name__ == '__main__':
     logging.getLogger('websockets').setLevel(logging.WARNING)
     logging.getLogger('faster_whisper').setLevel(logging.WARNING)
 
+    # Realtime updates and sentences are logged off the hot path, see server_logging
+    try:
+        setup_logging(args.log_format, logging.INFO,
+                      sample=parse_category_values(args.log_sample, '--log-sample'),
+                      rate_limit={'realtime': 5.0,
+                                  **parse_category_values(args.log_rate_limit, '--log-rate-limit')})
+    except ValueError as e:
+        parser.error(str(e))
+    realtime_log = get_logger('realtime')
+    sentence_log = get_logger('sentence')
+
     @dataclass
     class ClientSession:
         websocket: websockets.ServerConnection
         recorder: Optional[AudioToTextRecorder] = None
         recorder_thread: Optional[threading.Thread] = None
+        realtime_loop: Optional[PooledRealtimeLoop] = None
+        resampler: Optional[StreamingResampler] = None
+        decoder: AudioFrameDecoder = field(default_factory=AudioFrameDecoder)
+        gaps: FrameGapTracker = field(default_factory=lambda: FrameGapTracker(args.gap_fill_max))
+        # Frame loss, jitter and transport delay, from the frames' sequence numbers and timestamps
+        timing: StreamTiming = field(default_factory=StreamTiming)
+        ingest: Optional[AudioIngestWorker] = None
+        # Connections receiving this client's messages, see FanOut
+        subscribers: set = field(default_factory=set)
         is_running: bool = True
-        recorder_ready: threading.Event = threading.Event()
-        # Track when VAD detects speech end
-        last_vad_stop: Optional[float] = None
+        recorder_ready: threading.Event = field(default_factory=threading.Event)
+        # Stage timestamps of every utterance, for the fullSentence latency breakdown
+        tracer: Optional[UtteranceTracer] = None
+        stuck_detector: StuckTranscriptDetector = field(
+            default_factory=lambda: StuckTranscriptDetector(window=args.hard_break))
 
     class AudioServer:
         def __init__(self, args):
             self.clients = {}
             self.main_loop = None
             self.app = web.Application()
+            # Client inspection and model swaps, kept off the public (tunneled) app
+            self.admin_app = web.Application()
             self.setup_routes()
             self.ws_url = None
             self.args = args
-
-            # Start the server with a dummy recorder to initialize whisper properly
-            recorder = AudioToTextRecorder(**{
-            'faster_whisper_vad_filter': False,
-            'spinner': False,
-            'use_microphone': False,
-            'model': self.args.model,
-            'enable_realtime_transcription': self.args.enable_realtime,
-            'realtime_model_type': self.args.realtime_model,
-        })
-            recorder.start()
-            recorder.stop()
-            recorder.shutdown()
-            del recorder
+            self.metrics = ServerMetrics()
+            self.metrics.active_sessions.set_function(lambda: len(self.clients))
+            self.metrics.resampling_sessions.set_function(
+                lambda: sum(1 for c in list(self.clients.values()) if c.resampler and not c.resampler.passthrough))
+            self.metrics.ingest_queue_depth.set_function(
+                lambda: sum(c.ingest.depth() for c in list(self.clients.values()) if c.ingest))
+
+            # Every client gets a bounded outbound queue where newer realtime
+            # updates replace queued ones, so a slow link cannot build a backlog
+            self.fanout = FanOut(
+                timeout=self.args.send_timeout,
+                max_queue=self.args.send_queue_size,
+                on_detach=lambda connection, reason: self.metrics.detached_clients.inc(reason=reason),
+                on_coalesce=lambda outbox: self.metrics.outbound_coalesced.inc())
+            self.metrics.outbound_queue_depth.set_function(self.fanout.depth)
+
+            backend = None
+            if self.args.backend == 'stub':
+                backend = StubBackend(
+                    delay=self.args.stub_delay,
+                    delay_per_second=self.args.stub_delay_per_second,
+                    jitter=self.args.stub_jitter,
+                    texts=self.args.stub_text)
+
+            # Large models are loaded once and shared by every client session
+            self.pool = TranscriptionPool(
+                model=self.args.model,
+                realtime_model=self.args.realtime_model if self.args.enable_realtime else None,
+                workers=self.args.pool_workers,
+                realtime_workers=self.args.realtime_pool_workers,
+                batch_size=self.args.batch_size,
+                realtime_batch_size=self.args.realtime_batch_size,
+                max_batch_wait=self.args.batch_max_wait,
+                device=self.args.device,
+                compute_type=self.args.compute_type,
+                language=self.args.language,
+                beam_size=self.args.beam_size,
+                beam_size_realtime=self.args.beam_size_realtime,
+                on_batch=self.metrics.observe_inference,
+                backend=backend,
+            )
+            self.pool.start()
+
+            # Session recorders are built ahead of time so clients start instantly
+            self.recorder_pool = WarmRecorderPool(
+                lambda binding: AudioToTextRecorder(**self.get_recorder_config(binding)),
+                size=self.args.warm_recorders)
+            self.recorder_pool.start()
+            self.recorder_pool.wait_ready()
+
+            self.admission = AdmissionController(
+                max_sessions=self.args.max_sessions,
+                max_rtf=self.args.max_rtf,
+                max_queue=self.args.admission_queue,
+                queue_timeout=self.args.admission_timeout,
+                retry_after=self.args.retry_after,
+                load_probe=self.pool.real_time_factor)
             print("Server initialized")
 
         def setup_routes(self):
             self.app.router.add_get('/', self.handle_client_page)
             # Add endpoint to get WebSocket URL
             self.app.router.add_get('/ws-url', self.handle_ws_url)
+            self.app.router.add_get('/metrics', self.handle_metrics)
+            self.admin_app.router.add_get('/clients', self.handle_clients)
+            self.admin_app.router.add_get('/model', self.handle_get_model)
+            self.admin_app.router.add_post('/model', self.handle_swap_model)
 
         async def handle_client_page(self, request):
             current_dir = pathlib.Path(__file__).parent
@@ -103,32 +249,111 @@ if __name__ == '__main__':
             # Endpoint to get the WebSocket URL
             return web.json_response({'url': self.ws_url})
 
-        def get_recorder_config(self, client_id):
+        async def handle_metrics(self, request):
+            return web.Response(body=self.metrics.render().encode('utf-8'),
+                                headers={'Content-Type': ServerMetrics.content_type})
+
+        async def handle_clients(self, request):
+            # Per-client outbound queue depth and drop counts
+            clients = []
+            for client_id, client in list(self.clients.items()):
+                outbox = self.fanout.outboxes.get(client.websocket)
+                clients.append({
+                    'client_id': client_id,
+                    'outbound': outbox.stats() if outbox else None,
+                    'ingest_depth': client.ingest.depth() if client.ingest else 0,
+                    'ingest_dropped': client.ingest.dropped if client.ingest else 0,
+                    # 16 kHz clients skip resampling entirely
+                    'sample_rate': client.resampler.source_rate if client.resampler else None,
+                    'fast_path': client.resampler.passthrough if client.resampler else None,
+                    'timing': client.timing.stats(),
+                })
+            return web.json_response({'clients': clients})
+
+        async def handle_get_model(self, request):
+            return web.json_response(self.pool.models.describe())
+
+        async def handle_swap_model(self, request):
+            # Loads and warms up the new models in the background; connected clients keep
+            # streaming, utterances transcribed after the switch use the new models
+            try:
+                body = await request.json()
+            except ValueError:
+                return web.json_response({'error': 'Expected a JSON body'}, status=400)
+            options = {}
+            for key, kind in (('model', str), ('realtime_model', str), ('beam_size', int),
+                              ('beam_size_realtime', int), ('compute_type', str)):
+                if body.get(key) is None:
+                    continue
+                try:
+                    options[key] = kind(body[key])
+                except (TypeError, ValueError):
+                    return web.json_response({'error': f'Invalid value for {key}'}, status=400)
+            if not options:
+                return web.json_response({'error': 'Nothing to change'}, status=400)
+            if 'realtime_model' in options and not self.args.enable_realtime:
+                return web.json_response({'error': 'Realtime transcription is not enabled'}, status=400)
+            try:
+                self.pool.check_swap(**options)
+            except ValueError as e:
+                return web.json_response({'error': str(e)}, status=400)
+
+            loop = asyncio.get_running_loop()
+            try:
+                warmup_audio = await loop.run_in_executor(None, load_warmup_audio)
+                models = await loop.run_in_executor(None, functools.partial(
+                    self.pool.swap, warmup_audio=warmup_audio, **options))
+            except RuntimeError as e:
+                return web.json_response({'error': str(e)}, status=409)
+            except Exception as e:
+                print(f"Model swap failed: {e}")
+                return web.json_response({'error': f'Model swap failed: {e}'}, status=500)
+            return web.json_response(models)
+
+        @staticmethod
+        def preprocess_text(text):
+            text = text.lstrip()
+            if text.startswith("..."):
+                text = text[3:]
+            if text.endswith("...'."):
+                text = text[:-1]
+            if text.endswith("...'"):
+                text = text[:-1]
+            text = text.lstrip()
+            if text:
+                text = text[0].upper() + text[1:]
+            return text
+
+        def check_stuck_transcript(self, client_id, text):
+            """Feed one realtime pass, repeats included, to the client's stuck-transcript detector"""
+            client = self.clients.get(client_id)
+            if (self.args.hard_break > 0 and client is not None
+                    and client.stuck_detector.update(self.preprocess_text(text))):
+                # Realtime text stuck on background noise, end the utterance
+                client.stuck_detector.reset()
+                client.recorder.stop()
+                client.recorder.clear_audio_queue()
+
+        def get_text_detected_callback(self, client_id):
             def text_detected_callback(text):
                 if self.main_loop is not None:
-                    def preprocess_text(text):
-                        text = text.lstrip()
-                        if text.startswith("..."):
-                            text = text[3:]
-                        if text.endswith("...'."):
-                            text = text[:-1]
-                        if text.endswith("...'"):
-                            text = text[:-1]
-                        text = text.lstrip()
-                        if text:
-                            text = text[0].upper() + text[1:]
-                        return text
-                    text = preprocess_text(text)
+                    text = self.preprocess_text(text)
                     asyncio.run_coroutine_threadsafe(
                         self.send_to_client(client_id, {
                             'type': 'realtime',
                             'text': text
                         }), self.main_loop)
-                    print(f"\rClient {client_id}: {text}", flush=True, end='')
+                    realtime_log.info("%s", text, client=client_id)
+
+            return text_detected_callback
 
+        def get_recorder_config(self, binding):
+            # Recorders may be built before their client connects, so every
+            # callback looks up the session through the late-bound binding
             def recording_start():
                 """Called when VAD detects speech start"""
-                logging.debug(f"Recording started for client {client_id}")
+                client_id = binding.client_id
+                logging.debug("Recording started for client %s", client_id)
                 client = self.clients.get(client_id)
                 message = {'type': 'recording_start'}
                 if client:
@@ -137,28 +362,32 @@ if __name__ == '__main__':
 
             def recording_stop():
                 """Called when VAD detects speech end"""
-                logging.debug(f"Recording stopped for client {client_id}")
+                client_id = binding.client_id
+                logging.debug("Recording stopped for client %s", client_id)
                 client = self.clients.get(client_id)
                 message = {'type': 'recording_stop'}
                 if client:
+                    client.tracer.close()
                     asyncio.run_coroutine_threadsafe(
                         self.send_to_client(client_id, message), self.main_loop)
 
             def on_vad_start():
-                logging.debug(f"VAD detect start for client {client_id}")
+                client_id = binding.client_id
+                logging.debug("VAD detect start for client %s", client_id)
                 client = self.clients.get(client_id)
                 message = {'type': 'vad_detect_start'}
                 if client:
-                    client.last_vad_stop = None
+                    client.tracer.mark('vad_start')
                     asyncio.run_coroutine_threadsafe(
                         self.send_to_client(client_id, message), self.main_loop)
 
             def on_vad_stop():
-                logging.debug(f"VAD detect stopped for client {client_id}")
+                client_id = binding.client_id
+                logging.debug("VAD detect stopped for client %s", client_id)
                 client = self.clients.get(client_id)
                 message = {'type': 'vad_detect_stop'}
                 if client:
-                    client.last_vad_stop = time.time()
+                    client.tracer.mark('vad_stop', captured_at=client.timing.captured_at)
                     asyncio.run_coroutine_threadsafe(
                         self.send_to_client(client_id, message), self.main_loop)
 
@@ -169,28 +398,29 @@ if __name__ == '__main__':
                 'faster_whisper_vad_filter': False,
                 'spinner': False,
                 'use_microphone': False,
-                'model': self.args.model,
+                # The recorder always loads a model although the shared pool
+                # transcribes, keep it small and on the CPU: no CUDA context per session
+                'model': self.args.session_model,
+                'device': 'cpu',
+                'compute_type': 'int8',
                 'language': self.args.language,
                 'silero_sensitivity': self.args.silero_sensitivity,
                 'webrtc_sensitivity': self.args.webrtc_sensitivity,
                 'post_speech_silence_duration': self.args.post_speech_silence,
                 'min_length_of_recording': 1.1,
                 'min_gap_between_recordings': 0,
-                'enable_realtime_transcription': self.args.enable_realtime,
-                'realtime_processing_pause': 0,
-                'realtime_model_type': self.args.realtime_model,
-                'on_realtime_transcription_stabilized': text_detected_callback,
+                # Realtime transcription runs on the shared pool, see run_recorder
+                'enable_realtime_transcription': False,
                 'on_recording_start': recording_start,
                 'on_recording_stop': recording_stop,
                 'on_vad_start': on_vad_start,
                 'on_vad_stop': on_vad_stop,
-                'beam_size': self.args.beam_size,
-                'beam_size_realtime': self.args.beam_size_realtime,
             }
 
         async def initialize_client(self, client_id):
             """Initialize recorder for a client and wait until it's ready"""
             client = self.clients[client_id]
+            started = time.time()
 
             # Create and start recorder thread
             client.recorder_thread = threading.Thread(
@@ -207,6 +437,9 @@ if __name__ == '__main__':
             await self.send_to_client(client_id, {
                 'type': 'init_complete'
             })
+            print(
+                f"Client {client_id} initialized in {int((time.time() - started) * 1000)}ms "
+                f"({self.recorder_pool.available()} warm recorders left)")
 
             return client
 
@@ -214,72 +447,123 @@ if __name__ == '__main__':
             print(f"Client {client_id} connected")
 
             # Create new client session
-            client = ClientSession(websocket=websocket)
+            client = ClientSession(websocket=websocket, subscribers={websocket},
+                                   tracer=UtteranceTracer(client_id))
             self.clients[client_id] = client
+            self.fanout.attach(websocket, name=client_id)
 
             try:
                 # Initialize recorder and wait until it's ready
                 client = await self.initialize_client(client_id)
+                client.ingest = AudioIngestWorker(
+                    lambda item: self.ingest_frame(client_id, *item),
+                    maxsize=self.args.ingest_queue_size,
+                    overflow=self.args.ingest_overflow,
+                    name=f"ingest-{client_id}",
+                    on_drop=self.metrics.ingest_dropped.inc)
 
                 async for message in websocket:
                     if not client.recorder:
                         print(f"Recorder not ready for client {client_id}")
                         continue
 
-                    try:
-                        # Read the metadata length (first 4 bytes)
-                        metadata_length = int.from_bytes(
-                            message[:4], byteorder='little')
-                        # Get the metadata JSON string
-                        metadata_json = message[4:4 +
-                                                metadata_length].decode('utf-8')
-                        metadata = json.loads(metadata_json)
-                        sample_rate = metadata['sampleRate']
-                        # Get the audio chunk following the metadata
-                        chunk = message[4+metadata_length:]
-                        resampled_chunk = self.decode_and_resample(
-                            chunk, sample_rate, 16000)
-                        client.recorder.feed_audio(resampled_chunk)
-                    except Exception as e:
-                        print(
-                            f"Error processing message for client {client_id}: {e}")
+                    if isinstance(message, str):
+                        # v2 clients negotiate the audio format once
+                        if is_handshake(message):
+                            try:
+                                ack = client.decoder.negotiate(message)
+                                client.timing.restart()
+                            except AudioProtocolError as e:
+                                ack = {'type': 'error', 'message': str(e)}
+                            await self.send_to_client(client_id, ack)
+                        elif parse_realtime_mode(message) is not None:
+                            # Opt in to delta-encoded realtime updates
+                            enabled = parse_realtime_mode(message)
+                            outbox = self.fanout.outboxes.get(websocket)
+                            if outbox is None:
+                                # Already detached as a slow consumer
+                                continue
+                            outbox.set_realtime_delta(enabled, self.args.realtime_delta_sync)
+                            await self.send_to_client(client_id, {
+                                'type': 'realtime_mode_ack',
+                                'delta': enabled,
+                                'fullSyncEvery': self.args.realtime_delta_sync,
+                            })
                         continue
 
+                    self.metrics.ingress_bytes.inc(len(message), format=client.decoder.sample_format)
+                    # Decoding, resampling and feeding happen on the ingest thread
+                    await client.ingest.put((message, time.time()))
+
             except websockets.exceptions.ConnectionClosed:
                 print(f"Client {client_id} disconnected")
             finally:
                 await self.cleanup_client(client_id)
 
+        def ingest_frame(self, client_id, message, arrival):
+            """Decode, resample and feed one audio frame that arrived at `arrival` (runs on the client's ingest thread)"""
+            client = self.clients.get(client_id)
+            if not client or not client.is_running:
+                return
+            try:
+                frame = client.decoder.decode(message)
+            except AudioProtocolError as e:
+                if self.main_loop is not None:
+                    asyncio.run_coroutine_threadsafe(
+                        self.send_to_client(client_id, {
+                            'type': 'error',
+                            'message': str(e)
+                        }), self.main_loop)
+                return
+            self.metrics.observe_frame(*client.timing.observe(frame, arrival))
+            pcm = frame.pcm
+            gap = client.gaps.gap(frame)
+            if gap:
+                # The client's silence gate held audio back
+                self.metrics.client_gated_seconds.inc(gap)
+                if self.args.gap_fill_max > 0:
+                    pcm = client.gaps.silence(frame, gap) + pcm
+            if client.resampler is None or client.resampler.source_rate != frame.sample_rate:
+                client.resampler = StreamingResampler(frame.sample_rate, 16000)
+                print(f"Client {client_id} streams {frame.sample_rate} Hz audio, "
+                      f"{'16 kHz fast path' if client.resampler.passthrough else 'resampling to 16 kHz'}")
+            client.tracer.audio(arrival)
+            client.recorder.feed_audio(client.resampler.process(pcm))
+            client.timing.fed(frame)
+
         def run_recorder(self, client_id):
             """Initialize and run recorder for a client"""
             client = self.clients[client_id]
             try:
-                print(f"Initializing RealtimeSTT for client {client_id}...")
-                client.recorder = AudioToTextRecorder(
-                    **self.get_recorder_config(client_id))
-                print(f"RealtimeSTT initialized for client {client_id}")
+                client.recorder = self.recorder_pool.acquire(client_id).recorder
+                print(f"RealtimeSTT ready for client {client_id}")
+                if self.args.enable_realtime:
+                    client.realtime_loop = PooledRealtimeLoop(
+                        client.recorder, self.pool,
+                        self.get_text_detected_callback(client_id),
+                        on_pass=lambda text: self.check_stuck_transcript(client_id, text))
+                    client.realtime_loop.start()
                 client.recorder_ready.set()
 
                 while client.is_running:
                     try:
-                        full_sentence = client.recorder.text()
-                        if full_sentence:
-                            # Calculate latency if we have a VAD stop time
-                            latency_ms = None
-                            if client.last_vad_stop is not None:
-                                latency_ms = int(
-                                    (time.time() - client.last_vad_stop) * 1000)
-                                client.last_vad_stop = None  # Reset for next sentence
-
-                            if self.main_loop is not None:
-                                asyncio.run_coroutine_threadsafe(
-                                    self.send_to_client(client_id, {
-                                        'type': 'fullSentence',
-                                        'text': full_sentence,
-                                        'latency_ms': latency_ms
-                                    }), self.main_loop)
-                                print(
-                                    f"\rClient {client_id} Sentence: {full_sentence} (Latency: {latency_ms}ms)")
+                        # The session recorder only detects and buffers the
+                        # utterance, the shared pool transcribes it
+                        client.recorder.wait_audio()
+                        if not client.is_running or client.recorder.is_shut_down:
+                            break
+                        trace = client.tracer.begin_transcription()
+                        full_sentence = self.pool.transcribe(client.recorder.audio)
+                        trace.mark('inference_done')
+                        client.stuck_detector.reset()
+                        if full_sentence and self.main_loop is not None:
+                            # latency_ms and the breakdown are added when the message is sent
+                            asyncio.run_coroutine_threadsafe(
+                                self.send_to_client(client_id, {
+                                    'type': 'fullSentence',
+                                    'text': full_sentence,
+                                    'trace_id': trace.trace_id,
+                                }, trace), self.main_loop)
                     except Exception as e:
                         print(
                             f"Error in recorder thread for client {client_id}: {e}")
@@ -290,31 +574,29 @@ if __name__ == '__main__':
                 client.is_running = False
                 client.recorder_ready.set()  # Prevent deadlock
 
-        async def send_to_client(self, client_id, message):
+        async def send_to_client(self, client_id, message, trace=None):
+            if trace is not None:
+                # Completed here, on the event loop, right before the message is queued
+                trace.mark('message_sent')
+                message['trace'] = trace.breakdown()
+                message['latency_ms'] = message['trace']['latency_ms']
+                message['mouth_to_text_ms'] = message['trace']['mouth_to_text_ms']
+                self.metrics.observe_trace(message['trace'])
+                sentence_log.info("%s", message['text'], client=client_id,
+                                  trace_id=trace.trace_id, latency_ms=message['latency_ms'])
             if client_id in self.clients:
-                client = self.clients[client_id]
-                try:
-                    await client.websocket.send(json.dumps(message))
-                except websockets.exceptions.ConnectionClosed:
-                    await self.cleanup_client(client_id)
-
-        @staticmethod
-        def decode_and_resample(audio_data, original_sample_rate, target_sample_rate):
-            try:
-                audio_np = np.frombuffer(audio_data, dtype=np.int16)
-                num_original_samples = len(audio_np)
-                num_target_samples = int(
-                    num_original_samples * target_sample_rate / original_sample_rate)
-                resampled_audio = resample(audio_np, num_target_samples)
-                return resampled_audio.astype(np.int16).tobytes()
-            except Exception as e:
-                print(f"Error in resampling: {e}")
-                return audio_data
+                # Queued on the client's outbox, its writer task does the sending
+                self.fanout.publish(message, self.clients[client_id].subscribers)
 
         async def cleanup_client(self, client_id):
             if client_id in self.clients:
                 client = self.clients[client_id]
                 client.is_running = False
+                self.fanout.forget(client.websocket)
+                if client.ingest:
+                    client.ingest.stop()
+                if client.realtime_loop:
+                    client.realtime_loop.stop()
                 if client.recorder:
                     client.recorder.stop()
                     client.recorder.shutdown()
@@ -325,11 +607,28 @@ if __name__ == '__main__':
         async def main(self):
             self.main_loop = asyncio.get_running_loop()
             client_counter = 0
+            loop_monitor = asyncio.create_task(self.metrics.monitor_event_loop())
 
             async def client_handler(websocket):
                 nonlocal client_counter
                 client_counter += 1
-                await self.handle_client(websocket, f"client_{client_counter}")
+                client_id = f"client_{client_counter}"
+
+                async def notify(message):
+                    await websocket.send(json.dumps(message))
+
+                try:
+                    admitted = await self.admission.acquire(notify)
+                except websockets.exceptions.ConnectionClosed:
+                    return
+                if not admitted:
+                    print(f"Server busy, rejected {client_id}")
+                    await websocket.close(1013, 'server busy')
+                    return
+                try:
+                    await self.handle_client(websocket, client_id)
+                finally:
+                    self.admission.release()
 
             print("Server started. Press Ctrl+C to stop the server.")
 
@@ -355,6 +654,13 @@ if __name__ == '__main__':
             site = web.TCPSite(runner, 'localhost', 8001)
             await site.start()
 
+            # Admin endpoints, only reachable from this host
+            admin_runner = web.AppRunner(self.admin_app)
+            await admin_runner.setup()
+            admin_site = web.TCPSite(admin_runner, 'localhost', self.args.admin_port)
+            await admin_site.start()
+            print(f"Admin endpoints on http://localhost:{self.args.admin_port} (/clients, /model)")
+
             # Start WebSocket server
             ws_server = await websockets.serve(client_handler, "localhost", 8002)
 
@@ -364,11 +670,15 @@ if __name__ == '__main__':
                 await asyncio.Future()  # run forever
             except asyncio.CancelledError:
                 print("\nShutting down server...")
+                loop_monitor.cancel()
                 await runner.cleanup()
+                await admin_runner.cleanup()
                 ws_server.close()
                 await ws_server.wait_closed()
                 for client_id in list(self.clients.keys()):
                     await self.cleanup_client(client_id)
+                self.recorder_pool.shutdown()
+                self.pool.shutdown()
 
     # Start the server with command line arguments
     server = AudioServer(args)
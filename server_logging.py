@@ -0,0 +1,188 @@
+"""
+Queue-backed, sampled logging for the servers' hot paths.
+
+Realtime updates, outgoing messages and other per-utterance events used to
+be printed with ANSI colors and an explicit flush on the recorder callback
+threads and the event loop, so a slow terminal or pipe added latency to
+transcription. Hot paths now log through a CategoryLogger instead:
+
+- The calling thread only builds a LogRecord and puts it on a queue; a
+  QueueListener thread formats and writes it. Message arguments are
+  formatted there too, so pass them as %-style args.
+- Every category ('realtime', 'sentence', 'message', 'audio', ...) can be
+  sampled (keep 1 in N) and rate limited (at most N per second). Skipped
+  records are counted and reported as `suppressed` on the next one kept.
+- A disabled category or level costs one attribute check.
+- Output is either plain text lines or one JSON object per line.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOGGER_PREFIX = 'stt'
+LOG_FORMATS = ('text', 'json')
+
+
+class CategoryPolicy:
+    """Sampling and rate limit of one category. Approximate under contention, never blocking."""
+
+    __slots__ = ('every', 'rate', 'seen', 'suppressed', 'tokens', 'refilled_at')
+
+    def __init__(self, sample=1.0, rate=0.0):
+        # Keep 1 in `every` records; 0 turns the category off
+        self.every = 0 if sample <= 0 else max(1, round(1 / min(sample, 1.0)))
+        self.rate = max(0.0, rate)
+        self.seen = 0
+        self.suppressed = 0
+        self.tokens = self.rate
+        self.refilled_at = time.monotonic()
+
+    def allow(self):
+        self.seen += 1
+        if self.every != 1 and (self.every == 0 or self.seen % self.every):
+            self.suppressed += 1
+            return False
+        if self.rate:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1
+        return True
+
+
+class CategoryLogger:
+    """Logger for one hot-path category, e.g. get_logger('realtime')."""
+
+    def __init__(self, category):
+        self.category = category
+        self.logger = logging.getLogger(f"{LOGGER_PREFIX}.{category}")
+        self.policy = CategoryPolicy()
+
+    def enabled(self, level=logging.INFO):
+        return self.policy.every != 0 and self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **fields):
+        """Log `msg % args` with optional structured `fields`, subject to the category's policy."""
+        if self.policy.every == 0 or not self.logger.isEnabledFor(level):
+            return
+        policy = self.policy
+        if not policy.allow():
+            return
+        if policy.suppressed:
+            fields['suppressed'] = policy.suppressed
+            policy.suppressed = 0
+        self.logger.log(level, msg, *args, extra={'category': self.category, 'fields': fields})
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+_listener = None
+
+
+def get_logger(category):
+    with _loggers_lock:
+        logger = _loggers.get(category)
+        if logger is None:
+            logger = _loggers[category] = CategoryLogger(category)
+        return logger
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s.%(msecs)03d %(levelname)s [%(category)s] %(message)s',
+                         datefmt='%H:%M:%S')
+
+    def format(self, record):
+        record.category = getattr(record, 'category', record.name)
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'category': getattr(record, 'category', record.name),
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_category_values(items, option):
+    """Turn ['realtime=0.1', ...] into {'realtime': 0.1, ...}."""
+    values = {}
+    for item in items or []:
+        category, _, value = item.partition('=')
+        try:
+            values[category.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"{option} expects CATEGORY=NUMBER, got {item!r}")
+    return values
+
+
+def setup_logging(fmt='text', level=logging.INFO, sample=None, rate_limit=None, stream=None):
+    """Route all category loggers through a background queue listener.
+
+    `sample` maps categories to the fraction of records kept, `rate_limit`
+    to the max records per second. Safe to call once per process.
+    """
+    global _listener
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {fmt}")
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    root = logging.getLogger(LOGGER_PREFIX)
+    root.handlers[:] = [_DeferredQueueHandler(queue.SimpleQueue())]
+    root.setLevel(level)
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(root.handlers[0].queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    sample = sample or {}
+    rate_limit = rate_limit or {}
+    for category in set(sample) | set(rate_limit):
+        get_logger(category).policy = CategoryPolicy(sample.get(category, 1.0),
+                                                     rate_limit.get(category, 0.0))
+
+
+def shutdown_logging():
+    """Write out everything still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
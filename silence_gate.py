@@ -0,0 +1,82 @@
+"""
+Client-side silence gate.
+
+Streaming clients send audio continuously, so the server resamples and runs
+its VADs on long stretches of silence. A SilenceGate lets a client hold
+frames back while the input stays below an energy threshold:
+
+- After the last frame above the threshold, `hangover` seconds are still
+  sent, so the server's VAD hears the end of speech and closes the
+  utterance on real audio. It should be longer than the server's post
+  speech silence.
+- While gated, the last `preroll` seconds are kept and sent ahead of the
+  frame that opens the gate again, so the start of speech is not clipped.
+
+Frames keep their capture timestamps. The server sees the jump between two
+timestamps and feeds its recorder a short stretch of silence in place of
+the held-back audio, see FrameGapTracker in audio_protocol.py. index.html
+implements the same gate in its capture worklet.
+"""
+
+import collections
+import math
+
+import numpy as np
+
+DEFAULT_THRESHOLD_DB = -50.0
+DEFAULT_HANGOVER = 1.5
+DEFAULT_PREROLL = 0.3
+
+
+def frame_level_db(pcm):
+    """RMS level of 16-bit PCM in dBFS."""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return -math.inf
+    rms = math.sqrt(float(np.dot(samples, samples)) / len(samples))
+    return 20 * math.log10(rms / 32768) if rms > 0 else -math.inf
+
+
+class SilenceGate:
+    """Decides which captured frames a client sends. Not thread-safe, use one per capture loop."""
+
+    def __init__(self, threshold_db=DEFAULT_THRESHOLD_DB, hangover=DEFAULT_HANGOVER,
+                 preroll=DEFAULT_PREROLL):
+        self.threshold_db = threshold_db
+        self.hangover = hangover
+        self.preroll = preroll
+        self.frames_sent = 0
+        self.frames_gated = 0
+        # Seconds of hangover left
+        self._open_for = 0.0
+        # (pcm, timestamp, seconds) of the most recent gated frames
+        self._held = collections.deque()
+        self._held_seconds = 0.0
+
+    @property
+    def is_open(self):
+        return self._open_for > 0
+
+    def process(self, pcm, sample_rate, timestamp):
+        """Feed one captured frame; returns the (pcm, timestamp) pairs to send now, oldest first."""
+        seconds = len(pcm) / 2 / sample_rate
+        if frame_level_db(pcm) >= self.threshold_db:
+            self._open_for = self.hangover
+            frames = [(held_pcm, held_timestamp) for held_pcm, held_timestamp, _ in self._held]
+            self._held.clear()
+            self._held_seconds = 0.0
+            frames.append((pcm, timestamp))
+            self.frames_sent += len(frames)
+            self.frames_gated -= len(frames) - 1
+            return frames
+        if self._open_for > 0:
+            self._open_for -= seconds
+            self.frames_sent += 1
+            return [(pcm, timestamp)]
+
+        self.frames_gated += 1
+        self._held.append((pcm, timestamp, seconds))
+        self._held_seconds += seconds
+        while self._held and self._held_seconds - self._held[0][2] >= self.preroll:
+            self._held_seconds -= self._held.popleft()[2]
+        return []
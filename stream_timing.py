@@ -0,0 +1,104 @@
+"""
+Per-session accounting of audio frame delivery.
+
+Protocol v2 frames (and legacy frames whose metadata carries them) hold a
+sequence number and the client's capture timestamp, see audio_protocol.py.
+StreamTiming compares them with the server's arrival time of each frame:
+
+- lost: frames skipped in the sequence. This includes frames the server's
+  own ingest buffer dropped on overflow (reported separately as
+  ingest_dropped).
+- reordered: frames arriving after a later one.
+- jitter: RFC 3550 interarrival jitter, how much the spacing of arrivals
+  deviates from the spacing of captures, smoothed over ~16 frames.
+- transport delay: arrival minus capture time. It includes any offset
+  between the client's and the server's clocks; the delay above the
+  session's minimum (queueing delay) does not.
+
+It also remembers the capture time of the newest audio handed to the
+recorder, so an utterance's VAD stop can be placed on the client's clock.
+Measuring from there to the fullSentence gives the mouth-to-text latency,
+exact when both clocks agree (same host or NTP-synced).
+"""
+
+SEQUENCE_MODULO = 1 << 32
+JITTER_GAIN = 1 / 16
+
+
+class StreamTiming:
+    """Delivery statistics of one session's audio stream. Updated from its ingest thread."""
+
+    def __init__(self):
+        self.frames = 0
+        self.lost = 0
+        self.reordered = 0
+        self.jitter_ms = 0.0
+        self.delay_ms = None
+        self.min_delay_ms = None
+        # Client capture time (seconds) of the newest audio fed to the recorder
+        self.captured_at = None
+        self._next_sequence = None
+        self._previous = None
+
+    def restart(self):
+        """Forget the sequence position, e.g. after the client renegotiated its stream."""
+        self._next_sequence = None
+        self._previous = None
+
+    def observe(self, frame, arrival):
+        """Account for a frame that arrived at `arrival` (server time in seconds).
+
+        Returns (frames lost before it, whether it came out of order, transport
+        delay in seconds or None) for the server-wide metrics.
+        """
+        self.frames += 1
+        lost, reordered = 0, False
+        if frame.sequence is not None:
+            if self._next_sequence is not None and frame.sequence != self._next_sequence:
+                ahead = (frame.sequence - self._next_sequence) % SEQUENCE_MODULO
+                if ahead < SEQUENCE_MODULO // 2:
+                    lost = ahead
+                else:
+                    # A frame counted as lost showed up late
+                    reordered = True
+                    self.reordered += 1
+                    self.lost = max(0, self.lost - 1)
+            if not reordered:
+                self._next_sequence = (frame.sequence + 1) % SEQUENCE_MODULO
+                self.lost += lost
+
+        if frame.timestamp is None:
+            return lost, reordered, None
+        arrival_ms = arrival * 1000
+        delay_ms = arrival_ms - frame.timestamp
+        if self._previous is not None and not reordered:
+            previous_arrival, previous_capture = self._previous
+            transit_change = (arrival_ms - previous_arrival) - (frame.timestamp - previous_capture)
+            self.jitter_ms += (abs(transit_change) - self.jitter_ms) * JITTER_GAIN
+        if not reordered:
+            self._previous = (arrival_ms, frame.timestamp)
+        if self.delay_ms is None:
+            self.delay_ms = self.min_delay_ms = delay_ms
+        else:
+            self.delay_ms += (delay_ms - self.delay_ms) * JITTER_GAIN
+            self.min_delay_ms = min(self.min_delay_ms, delay_ms)
+        return lost, reordered, delay_ms / 1000
+
+    def fed(self, frame):
+        """Note that `frame` was handed to the recorder."""
+        if frame.timestamp is not None:
+            self.captured_at = frame.timestamp / 1000
+
+    def stats(self):
+        def rounded(value):
+            return round(value, 1) if value is not None else None
+
+        return {
+            'frames': self.frames,
+            'lost': self.lost,
+            'reordered': self.reordered,
+            'jitter_ms': round(self.jitter_ms, 1),
+            'transport_delay_ms': rounded(self.delay_ms),
+            'min_transport_delay_ms': rounded(self.min_delay_ms),
+            'queueing_delay_ms': rounded(self.delay_ms - self.min_delay_ms) if self.delay_ms is not None else None,
+        }
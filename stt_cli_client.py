@@ -1,16 +1,23 @@
 # stt_cli_client.py
 
-from difflib import SequenceMatcher
-from collections import deque
 import argparse
+import json
 import string
 import shutil
 import time
 import sys
+import wave
 import os
+import threading
+import struct
 
 from RealtimeSTT import AudioToTextRecorderClient
 from RealtimeSTT import AudioInput
+from realtime_delta import RealtimeDeltaDecoder
+from stuck_transcript import StuckTranscriptDetector
+from silence_gate import SilenceGate, DEFAULT_THRESHOLD_DB, DEFAULT_PREROLL
+from audio_resampler import StreamingResampler
+from websocket import ABNF
 
 from colorama import init, Fore, Style
 init()
@@ -20,6 +27,9 @@ DEFAULT_DATA_URL = "ws://127.0.0.1:8012"
 
 recording_indicator = "🔴"
 
+# The server transcribes 16 kHz audio and skips resampling when it receives it
+TARGET_SAMPLE_RATE = 16000
+
 console_width = shutil.get_terminal_size().columns
 
 post_speech_silence_duration = 1.0  # Will be overridden by CLI arg
@@ -31,7 +41,175 @@ hard_break_even_on_background_noise_min_texts = 3
 hard_break_even_on_background_noise_min_similarity = 0.99
 hard_break_even_on_background_noise_min_chars = 15
 prev_text = ""
-text_time_deque = deque()
+
+
+class DeltaRecorderClient(AudioToTextRecorderClient):
+    """Client that rebuilds delta-encoded realtime updates and sends batched control commands.
+
+    Control commands carry the session_id the server announced on the data
+    connection, so they reach this client's session even when other clients
+    are connected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.realtime_decoder = RealtimeDeltaDecoder()
+        self.session_id = None
+        self.session_started = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def set_realtime_delta(self, enabled=True):
+        """Opt in to delta-encoded realtime updates on this client's own data connection."""
+        self.data_ws.send(json.dumps({"type": "realtime_mode", "delta": enabled}))
+
+    def send_control(self, command, timeout=5):
+        """Send a control command addressed to this client's session."""
+        if self.session_id is None and not self.session_started.wait(timeout=timeout):
+            print("No session_start from the server, sending the command without a session_id")
+        if self.session_id is not None:
+            command = {**command, "session_id": self.session_id}
+        self.control_ws.send(json.dumps(command))
+
+    def request(self, command, timeout=5):
+        """Send a control command and wait for the reply with its request_id; returns the reply or None."""
+        request_id = self.request_counter
+        self.request_counter += 1
+        event = threading.Event()
+        self.pending_requests[request_id] = {'event': event, 'value': None, 'reply': None}
+        self.send_control({**command, "request_id": request_id}, timeout)
+        event.wait(timeout=timeout)
+        return self.pending_requests.pop(request_id)['reply']
+
+    def set_parameter(self, parameter, value):
+        self.send_control({"command": "set_parameter", "parameter": parameter, "value": value})
+
+    def get_parameter(self, parameter):
+        reply = self.request({"command": "get_parameter", "parameter": parameter})
+        if reply is None:
+            print(f"Timeout waiting for get_parameter {parameter}")
+            return None
+        return reply.get('value')
+
+    def call_method(self, method, args=None, kwargs=None):
+        self.send_control({"command": "call_method", "method": method,
+                           "args": args or [], "kwargs": kwargs or {}})
+
+    def batch(self, commands, timeout=5):
+        """Send set_parameter / get_parameter commands as one all-or-nothing batch.
+
+        Returns the list of results, or None if the server rejected the batch or did not answer.
+        """
+        reply = self.request({"command": "batch", "commands": commands}, timeout)
+        if reply is None:
+            print(f"Timeout waiting for batch of {len(commands)} commands")
+            return None
+        return reply.get('results')
+
+    def on_control_message(self, ws, message):
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return super().on_control_message(ws, message)
+        request = self.pending_requests.get(data.get('request_id')) if isinstance(data, dict) else None
+        if request is not None:
+            if data.get('status') == 'error':
+                print(f"Server Error: {data.get('message', '')}")
+                for error in data.get('errors', []):
+                    print(f"  command {error.get('index')}: {error.get('message')}")
+            request['reply'] = data
+            request['event'].set()
+            return
+        return super().on_control_message(ws, message)
+
+    def on_data_message(self, ws, message):
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return super().on_data_message(ws, message)
+        if data.get('type') == 'session_start':
+            self.session_id = data.get('session_id')
+            self.session_started.set()
+            return
+        text = self.realtime_decoder.apply(data)
+        if data.get('type') == 'realtime_delta':
+            message = json.dumps({'type': 'realtime', 'text': text})
+        return super().on_data_message(ws, message)
+
+class StreamingRecorderClient(DeltaRecorderClient):
+    """Client that prepares audio before sending it.
+
+    Audio is downsampled to 16 kHz on the client (unless `resample` is off),
+    which the server then passes to its recorder without resampling. With a
+    `gate` (see silence_gate.py) sustained silence is not sent at all. Frames
+    carry their capture timestamp, so the server can tell how much audio was
+    held back, and a sequence number counting the frames sent, so it can
+    tell lost frames from gated ones.
+    """
+
+    def __init__(self, *args, gate=None, resample=True, **kwargs):
+        self.gate = gate
+        self.resample = resample
+        self.resampler = None
+        self.sequence = 0
+        super().__init__(*args, **kwargs)
+
+    def record_and_send_audio(self):
+        # Same loop as AudioToTextRecorderClient, with resampling and the gate between capture and send
+        self._recording = True
+        try:
+            if not self.setup_audio():
+                raise Exception("Failed to set up audio recording.")
+
+            if self.output_wav_file and not self.wav_file:
+                self.wav_file = wave.open(self.output_wav_file, 'wb')
+                self.wav_file.setnchannels(1)
+                self.wav_file.setsampwidth(2)
+                self.wav_file.setframerate(self.audio_input.device_sample_rate)
+
+            while self.is_running:
+                if self.muted:
+                    time.sleep(0.01)
+                    continue
+                try:
+                    audio_data = self.audio_input.read_chunk()
+                    captured_at = time.time() * 1000
+
+                    if self.wav_file:
+                        self.wav_file.writeframes(audio_data)
+                    if self.on_recorded_chunk:
+                        self.on_recorded_chunk(audio_data)
+                    if self.muted or not self.recording_start.is_set():
+                        continue
+
+                    sample_rate = self.audio_input.device_sample_rate
+                    pcm = audio_data
+                    if self.resample and sample_rate != TARGET_SAMPLE_RATE:
+                        if self.resampler is None or self.resampler.source_rate != sample_rate:
+                            self.resampler = StreamingResampler(sample_rate, TARGET_SAMPLE_RATE)
+                        pcm = self.resampler.process(audio_data)
+                        sample_rate = TARGET_SAMPLE_RATE
+                    frames = [(pcm, captured_at)]
+                    if self.gate is not None:
+                        frames = self.gate.process(pcm, sample_rate, captured_at)
+                    for pcm, timestamp in frames:
+                        metadata = json.dumps({"sampleRate": sample_rate, "timestamp": timestamp,
+                                               "sequence": self.sequence}).encode('utf-8')
+                        self.sequence = (self.sequence + 1) % (1 << 32)
+                        if self.is_running:
+                            self.data_ws.send(struct.pack('<I', len(metadata)) + metadata + pcm,
+                                              opcode=ABNF.OPCODE_BINARY)
+                except KeyboardInterrupt:
+                    break
+                except Exception as e:
+                    print(f"Error sending audio data: {e}")
+                    break
+        except Exception as e:
+            print(f"Error in record_and_send_audio: {e}", file=sys.stderr)
+        finally:
+            self.cleanup_audio()
+            self.final_text_ready.set()
+            self.is_running = False
+            self._recording = False
+
 
 def main():
     global prev_text, post_speech_silence_duration, unknown_sentence_detection_pause
@@ -68,6 +246,17 @@ def main():
                         help="STT Control WebSocket URL")
     parser.add_argument("--data", "--data_url", default=DEFAULT_DATA_URL,
                         help="STT Data WebSocket URL")
+    parser.add_argument("--delta", action="store_true",
+                        help="Receive delta-encoded real-time updates (less bandwidth on long utterances)")
+    parser.add_argument("--server-resample", action="store_true",
+                        help="Send audio at the device rate and let the server resample it to 16 kHz")
+    parser.add_argument("--silence-gate", action="store_true",
+                        help="Stop sending audio during sustained silence")
+    parser.add_argument("--gate-threshold", type=float, default=DEFAULT_THRESHOLD_DB,
+                        help=f"Level in dBFS below which audio counts as silence (default: {DEFAULT_THRESHOLD_DB})")
+    parser.add_argument("--gate-hangover", type=float,
+                        help="Seconds still sent after speech, must exceed the server's post speech silence "
+                             "(default: the longest detection pause plus 0.5)")
     parser.add_argument("--post-silence", type=float, default=1.0,
                       help="Post speech silence duration in seconds (default: 1.0)")
     parser.add_argument("--unknown-pause", type=float, default=1.3,
@@ -102,6 +291,11 @@ def main():
     hard_break_even_on_background_noise_min_texts = args.min_texts
     hard_break_even_on_background_noise_min_similarity = args.min_similarity
     hard_break_even_on_background_noise_min_chars = args.min_chars
+    stuck_detector = StuckTranscriptDetector(
+        window=hard_break_even_on_background_noise,
+        min_texts=hard_break_even_on_background_noise_min_texts,
+        min_similarity=hard_break_even_on_background_noise_min_similarity,
+        min_chars=hard_break_even_on_background_noise_min_chars)
 
     # Check if output is being redirected
     if not os.isatty(sys.stdout.fileno()):
@@ -123,7 +317,7 @@ def main():
             print(text, end="", flush=True)
 
     def on_realtime_transcription_update(text):
-        global post_speech_silence_duration, prev_text, text_time_deque
+        global post_speech_silence_duration, prev_text
     
         def set_post_speech_silence_duration(duration: float):
             global post_speech_silence_duration
@@ -173,25 +367,10 @@ def main():
 
                 # transtext = text.translate(str.maketrans('', '', string.punctuation))
                 
-                # Append the new text with its timestamp
-                current_time = time.time()
-                text_time_deque.append((current_time, text))
-
-                # Remove texts older than hard_break_even_on_background_noise seconds
-                while text_time_deque and text_time_deque[0][0] < current_time - hard_break_even_on_background_noise:
-                    text_time_deque.popleft()
-
-                # Check if at least hard_break_even_on_background_noise_min_texts texts have arrived within the last hard_break_even_on_background_noise seconds
-                if len(text_time_deque) >= hard_break_even_on_background_noise_min_texts:
-                    texts = [t[1] for t in text_time_deque]
-                    first_text = texts[0]
-                    last_text = texts[-1]
-
-                    # Compute the similarity ratio between the first and last texts
-                    similarity = SequenceMatcher(None, first_text, last_text).ratio()
-
-                    if similarity > hard_break_even_on_background_noise_min_similarity and len(first_text) > hard_break_even_on_background_noise_min_chars:
-                        client.call_method("stop")
+                # Force the end of an utterance stuck on background noise
+                if stuck_detector.update(text):
+                    stuck_detector.reset()
+                    client.call_method("stop")
 
             clear_line()
 
@@ -207,7 +386,18 @@ def main():
             colored_text = f"{Fore.YELLOW}{last_chars}{Style.RESET_ALL}{recording_indicator}\b\b"
             write(colored_text)
 
-    client = AudioToTextRecorderClient(
+    client_kwargs = {'resample': not args.server_resample}
+    if args.silence_gate:
+        # The server only ends an utterance after hearing the whole pause
+        hangover = args.gate_hangover
+        if hangover is None:
+            pauses = [post_speech_silence_duration, unknown_sentence_detection_pause]
+            if args.speech_end_detection:
+                pauses.append(mid_sentence_detection_pause)
+            hangover = max(pauses) + 0.5
+        client_kwargs['gate'] = SilenceGate(args.gate_threshold, hangover, DEFAULT_PREROLL)
+    client = StreamingRecorderClient(
+        **client_kwargs,
         language=args.language,
         control_url=args.control,
         data_url=args.data,
@@ -218,7 +408,11 @@ def main():
         output_wav_file = args.write or None,
     )
 
-    # Process command-line parameters
+    if args.delta:
+        client.set_realtime_delta()
+
+    # Process command-line parameters, all sets and gets in a single batch
+    commands = []
     if args.set:
         for param, value in args.set:
             try:
@@ -228,14 +422,16 @@ def main():
                     value = int(value)
             except ValueError:
                 pass  # Keep as string if not a number
-            client.set_parameter(param, value)
+            commands.append({"command": "set_parameter", "parameter": param, "value": value})
 
     if args.get:
         for param_list in args.get:
-            param = param_list[0]
-            value = client.get_parameter(param)
-            if value is not None:
-                print(f"Parameter {param} = {value}")
+            commands.append({"command": "get_parameter", "parameter": param_list[0]})
+
+    if commands:
+        for result in client.batch(commands) or []:
+            if result.get("command") == "get_parameter":
+                print(f"Parameter {result['parameter']} = {result['value']}")
 
     if args.method:
         for method_call in args.method:
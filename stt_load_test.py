@@ -0,0 +1,376 @@
+# stt_load_test.py
+"""
+Multi-client load generator for server.py and stt_server.py.
+
+Opens N simulated clients against the data WebSocket. Each client streams
+the clips in test-audio/*.wav at real-time or accelerated pace, framed
+exactly like index.html (protocol v2 handshake and 12-byte frame header, or
+the legacy length + JSON metadata framing with --legacy-framing), followed
+by trailing silence so the server's VAD closes the last utterance. With
+--codec opus the frames are Opus packets instead of PCM (needs opuslib),
+with --silence-gate frames are held back during silence like a gated client.
+
+For every concurrency level it reports p50/p95/p99 of the server's
+`latency_ms` and of the mouth-to-text latency (`mouth_to_text_ms`, end of
+speech to fullSentence; frames are stamped with the local clock, so run it on
+the server's host or an NTP-synced one), time to the first realtime update,
+late frames, rejected or dropped sessions, overall throughput and the
+ingress bandwidth per client. With --metrics-url it also scrapes the server's
+/metrics before and after every level and reports what the server saw in
+between: audio frames dropped from full ingest buffers, gaps in the frame
+sequence numbers (lost in transit, plus ingest drops after a session's first
+frame), realtime updates coalesced and clients detached for slow sends, event
+loop lag and transport delay. That tells server backpressure apart from
+network effects.
+
+Examples:
+    python stt_load_test.py --url ws://localhost:8002 --clients 1 5 10 20
+    python stt_load_test.py --url ws://localhost:8012 --no-init --speed 2
+    python stt_load_test.py --url ws://localhost:8002 --codec opus --clients 50
+    python stt_load_test.py --url ws://localhost:8002 --metrics-url http://localhost:8001/metrics
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import struct
+import time
+import urllib.request
+import wave
+
+import numpy as np
+import websockets
+
+from audio_resampler import StreamingResampler
+from silence_gate import SilenceGate
+
+# Imported in main() when --codec opus is used
+opuslib = None
+
+FRAME_HEADER = struct.Struct('<Id')
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+DEFAULT_AUDIO_GLOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test-audio', '*.wav')
+
+
+def scrape_metrics(url):
+    """Fetch a /metrics page as {series: value}, e.g. {'stt_detached_clients_total{reason="timeout"}': 2.0}."""
+    with urllib.request.urlopen(url, timeout=5) as response:
+        text = response.read().decode('utf-8')
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            series, _, value = line.rpartition(' ')
+            values[series] = float(value)
+    return values
+
+
+def metric_delta(before, after, name, label=None):
+    """Increase of a metric between two scrapes, summed over its label sets (or only those matching `label`)."""
+    total = 0.0
+    for series, value in after.items():
+        if series.split('{', 1)[0] == name and (label is None or label in series):
+            total += value - before.get(series, 0.0)
+    return total
+
+
+def print_server_metrics(before, after):
+    def mean_ms(name):
+        count = metric_delta(before, after, f"{name}_count")
+        return f"{metric_delta(before, after, f'{name}_sum') / count * 1000:.1f} ms" if count else "-"
+
+    def count(name, label=None):
+        return f"{metric_delta(before, after, name, label):.0f}"
+
+    print(f"        server: ingest dropped {count('stt_ingest_dropped_frames_total')}, "
+          f"sequence gaps {count('stt_frames_lost_total')}, "
+          f"coalesced {count('stt_outbound_coalesced_total')}, "
+          f"detached {count('stt_detached_clients_total')} "
+          f"(timeout {count('stt_detached_clients_total', 'timeout')}, "
+          f"overflow {count('stt_detached_clients_total', 'overflow')}), "
+          f"loop lag {mean_ms('stt_event_loop_lag_seconds')}, "
+          f"transport delay {mean_ms('stt_transport_delay_seconds')}")
+
+
+def load_clips(pattern, max_seconds):
+    clips = []
+    for path in sorted(glob.glob(pattern)):
+        with wave.open(path, 'rb') as wav_file:
+            rate = wav_file.getframerate()
+            channels = wav_file.getnchannels()
+            frames = wav_file.readframes(min(wav_file.getnframes(), int(max_seconds * rate)))
+        audio = np.frombuffer(frames, dtype=np.int16)
+        if channels > 1:
+            audio = audio[:len(audio) - len(audio) % channels].reshape(-1, channels)[:, 0]
+        audio = audio[:int(max_seconds * rate)]
+        clips.append((os.path.basename(path), rate, audio))
+    return clips
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return float(np.percentile(values, q))
+
+
+class ClientStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.mouth_to_text_ms = []
+        self.first_realtime_s = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.late_frames = 0
+        self.audio_seconds = 0.0
+        self.sentences = 0
+        self.realtime_updates = 0
+        self.rejected = False
+        self.dropped = False
+        self.error = None
+
+
+class SimulatedClient:
+    def __init__(self, index, args, clips):
+        self.index = index
+        self.args = args
+        self.clips = clips
+        self.stats = ClientStats()
+        self.initialized = asyncio.Event()
+        self.sequence = 0
+        self.sample_rate = None
+        self.stream_started = None
+        self.encoder = None
+        self.gate = SilenceGate(hangover=args.gate_hangover) if args.silence_gate else None
+
+    async def negotiate(self, websocket, sample_rate):
+        # v2 frames carry no sample rate, so announce every rate change up front
+        if self.args.legacy_framing or sample_rate == self.sample_rate:
+            return
+        self.sample_rate = sample_rate
+        if self.args.codec == 'opus':
+            self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+            self.encoder.bitrate = self.args.opus_bitrate
+        await websocket.send(json.dumps({
+            'type': 'audio_config',
+            'protocol': 2,
+            'sampleRate': sample_rate,
+            'format': self.args.codec if self.args.codec == 'opus' else 's16le',
+            'channels': 1,
+            'frameHeader': True,
+        }))
+
+    def frame(self, pcm, sample_rate, captured_at):
+        sequence = self.sequence & 0xFFFFFFFF
+        self.sequence += 1
+        if self.args.legacy_framing:
+            metadata = json.dumps({'sampleRate': sample_rate, 'timestamp': captured_at,
+                                   'sequence': sequence}).encode('utf-8')
+            return len(metadata).to_bytes(4, byteorder='little') + metadata + pcm
+        if self.encoder is not None:
+            pcm = self.encoder.encode(pcm, len(pcm) // 2)
+        return FRAME_HEADER.pack(sequence, captured_at) + pcm
+
+    async def receive(self, websocket):
+        async for raw in websocket:
+            try:
+                message = json.loads(raw)
+            except (TypeError, json.JSONDecodeError):
+                continue
+            kind = message.get('type')
+            if kind == 'init_complete':
+                self.initialized.set()
+            elif kind == 'server_busy' and not message.get('queued'):
+                self.stats.rejected = True
+                self.initialized.set()
+            elif kind == 'realtime':
+                self.stats.realtime_updates += 1
+                if self.stats.first_realtime_s is None and self.stream_started is not None:
+                    self.stats.first_realtime_s = time.perf_counter() - self.stream_started
+            elif kind == 'fullSentence':
+                self.stats.sentences += 1
+                if message.get('latency_ms') is not None:
+                    self.stats.latencies_ms.append(message['latency_ms'])
+                if message.get('mouth_to_text_ms') is not None:
+                    self.stats.mouth_to_text_ms.append(message['mouth_to_text_ms'])
+
+    async def stream(self, websocket, sample_rate, audio):
+        chunk = self.args.chunk
+        if self.encoder is not None:
+            # Opus packets hold a fixed duration, pad the last one
+            chunk = sample_rate * self.args.opus_frame_ms // 1000
+            audio = np.concatenate([audio, np.zeros(-len(audio) % chunk, dtype=np.int16)])
+        frame_seconds = chunk / sample_rate / self.args.speed
+        next_send = time.perf_counter()
+        for start in range(0, len(audio), chunk):
+            pcm = audio[start:start + chunk].tobytes()
+            frames = [(pcm, time.time() * 1000)]
+            if self.gate is not None:
+                frames = self.gate.process(pcm, sample_rate, frames[0][1])
+            for frame_pcm, captured_at in frames:
+                frame = self.frame(frame_pcm, sample_rate, captured_at)
+                await websocket.send(frame)
+                self.stats.frames_sent += 1
+                self.stats.bytes_sent += len(frame)
+            self.stats.audio_seconds += len(pcm) / 2 / sample_rate
+            next_send += frame_seconds
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > frame_seconds:
+                self.stats.late_frames += 1
+
+    async def run(self):
+        try:
+            async with websockets.connect(self.args.url, max_size=None) as websocket:
+                receiver = asyncio.create_task(self.receive(websocket))
+                await self.negotiate(websocket, self.clips[0][1])
+                if not self.args.no_init:
+                    await asyncio.wait_for(self.initialized.wait(), self.args.init_timeout)
+                if self.stats.rejected:
+                    receiver.cancel()
+                    return self.stats
+
+                self.stream_started = time.perf_counter()
+                for name, rate, audio in self.clips:
+                    await self.negotiate(websocket, rate)
+                    await self.stream(websocket, rate, audio)
+                    silence = np.zeros(int(rate * self.args.trailing_silence), dtype=np.int16)
+                    await self.stream(websocket, rate, silence)
+
+                await asyncio.sleep(self.args.drain)
+                receiver.cancel()
+        except (websockets.exceptions.ConnectionClosed, OSError, asyncio.TimeoutError) as e:
+            self.stats.dropped = True
+            self.stats.error = str(e) or type(e).__name__
+        return self.stats
+
+
+async def run_level(args, clips, clients):
+    server_before = None
+    if args.metrics_url:
+        try:
+            server_before = await asyncio.to_thread(scrape_metrics, args.metrics_url)
+        except OSError as e:
+            print(f"        could not scrape {args.metrics_url}: {e}")
+    started = time.perf_counter()
+    tasks = []
+    for index in range(clients):
+        tasks.append(asyncio.create_task(SimulatedClient(index, args, clips).run()))
+        if args.ramp:
+            await asyncio.sleep(args.ramp)
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for stats in results for latency in stats.latencies_ms]
+    mouth_to_text = [latency for stats in results for latency in stats.mouth_to_text_ms]
+    first_realtime = [stats.first_realtime_s for stats in results if stats.first_realtime_s is not None]
+    audio_seconds = sum(stats.audio_seconds for stats in results)
+    sentences = sum(stats.sentences for stats in results)
+    frames = sum(stats.frames_sent for stats in results)
+    late = sum(stats.late_frames for stats in results)
+    # Ingress per client while streaming, independent of --speed
+    kbits = sum(stats.bytes_sent for stats in results) * 8 / 1000 / audio_seconds if audio_seconds else 0.0
+
+    def ms(value):
+        return f"{value:7.0f}" if value is not None else "      -"
+
+    def seconds(value):
+        return f"{value:6.2f}" if value is not None else "     -"
+
+    print(f"{clients:>7} | {ms(percentile(latencies, 50))} {ms(percentile(latencies, 95))} "
+          f"{ms(percentile(latencies, 99))} | {ms(percentile(mouth_to_text, 50))} "
+          f"{ms(percentile(mouth_to_text, 95))} | {seconds(percentile(first_realtime, 50))} "
+          f"{seconds(percentile(first_realtime, 95))} | {late:>6}/{frames:<7} "
+          f"| {sum(s.rejected for s in results):>4} {sum(s.dropped for s in results):>4} "
+          f"| {audio_seconds / elapsed:8.1f} {sentences / elapsed:7.2f} | {kbits:7.1f}")
+    if server_before is not None:
+        try:
+            print_server_metrics(server_before, await asyncio.to_thread(scrape_metrics, args.metrics_url))
+        except OSError as e:
+            print(f"        could not scrape {args.metrics_url}: {e}")
+    for stats in results:
+        if stats.error:
+            print(f"        error: {stats.error}")
+
+
+async def main_async(args):
+    clips = load_clips(args.audio, args.max_seconds)
+    if not clips:
+        print(f"No audio clips found for {args.audio}")
+        return
+    if args.client_resample:
+        # Like index.html's worklet, so the server takes its 16 kHz fast path
+        clips = [(name, 16000, StreamingResampler(rate, 16000).process_array(audio))
+                 for name, rate, audio in clips]
+    print(f"Streaming {', '.join(name for name, _, _ in clips)} at {args.speed}x to {args.url}")
+    print("clients |  latency_ms p50     p95     p99 | m2t p50     p95 | 1st rt p50    p95 |   late/frames   "
+          "| rej drop | audio s/s  sent/s |  kbit/s")
+    for clients in args.clients:
+        await run_level(args, clips, clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-client load generator for the STT servers")
+    parser.add_argument("--url", default="ws://localhost:8002",
+                        help="Data WebSocket URL (server.py: ws://localhost:8002, stt_server.py: ws://localhost:8012)")
+    parser.add_argument("-n", "--clients", type=int, nargs='+', default=[1, 5, 10],
+                        help="Concurrency levels to run, one after another (default: 1 5 10)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Playback speed, 1.0 is real time (default: 1.0)")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO_GLOB,
+                        help="Glob of WAV files to stream (default: test-audio/*.wav)")
+    parser.add_argument("--max-seconds", type=float, default=30.0,
+                        help="Only stream the first N seconds of each clip (default: 30)")
+    parser.add_argument("--chunk", type=int, default=1024,
+                        help="Samples per frame, index.html uses 1024 (default: 1024)")
+    parser.add_argument("--trailing-silence", type=float, default=1.5,
+                        help="Seconds of silence after each clip (default: 1.5)")
+    parser.add_argument("--drain", type=float, default=5.0,
+                        help="Seconds to wait for final sentences after streaming (default: 5)")
+    parser.add_argument("--ramp", type=float, default=0.0,
+                        help="Delay in seconds between client connects (default: 0)")
+    parser.add_argument("--metrics-url",
+                        help="Server /metrics URL to report server-side drops and lag per level "
+                             "(server.py: http://localhost:8001/metrics, stt_server.py: http://localhost:8013/metrics)")
+    parser.add_argument("--legacy-framing", action="store_true",
+                        help="Use the length + JSON metadata framing instead of protocol v2")
+    parser.add_argument("--no-init", action="store_true",
+                        help="Do not wait for init_complete (stt_server.py does not send it)")
+    parser.add_argument("--init-timeout", type=float, default=60.0,
+                        help="Seconds to wait for init_complete (default: 60)")
+    parser.add_argument("--client-resample", action="store_true",
+                        help="Resample clips to 16 kHz before streaming, so the server never resamples")
+    parser.add_argument("--silence-gate", action="store_true",
+                        help="Hold frames back during silence, see silence_gate.py")
+    parser.add_argument("--gate-hangover", type=float, default=1.5,
+                        help="Seconds still sent after speech with --silence-gate (default: 1.5)")
+    parser.add_argument("--codec", choices=['pcm', 'opus'], default='pcm',
+                        help="Send 16-bit PCM or Opus packets (protocol v2 only, default: pcm)")
+    parser.add_argument("--opus-bitrate", type=int, default=24000,
+                        help="Opus bitrate in bit/s (default: 24000)")
+    parser.add_argument("--opus-frame-ms", type=int, default=20, choices=[10, 20, 40, 60],
+                        help="Audio per Opus packet in ms (default: 20)")
+    args = parser.parse_args()
+    if args.codec == 'opus':
+        if args.legacy_framing:
+            parser.error("--codec opus needs protocol v2, drop --legacy-framing")
+        global opuslib
+        try:
+            import opuslib
+        except Exception as e:
+            # opuslib raises a plain Exception when libopus itself is missing
+            parser.error(f"--codec opus needs opuslib and libopus ({e})")
+        rates = {16000} if args.client_resample else {rate for _, rate, _ in load_clips(args.audio, 0)}
+        unsupported = rates - set(OPUS_SAMPLE_RATES)
+        if unsupported:
+            parser.error(f"Opus encodes {', '.join(map(str, OPUS_SAMPLE_RATES))} Hz audio, "
+                         f"resample the clips at {', '.join(map(str, sorted(unsupported)))} Hz first")
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,10 @@ stt-server [OPTIONS]
     - `-d, --data, --data_port`: WebSocket data port; default 8012.
     - `-w, --wake_words`: Wake word(s) to trigger listening; default "".
     - `-D, --debug`: Enable debug logging.
-    - `-W, --write`: Save audio to WAV file.
+    - `-W, --write`: Archive received audio, one file per session (FILE_<session_id>_<part>.wav), written on a background thread.
+    - `--write_format`: Archive format, 'wav' or 'flac' (needs soundfile); default 'wav'.
+    - `--write_max_seconds`: Start a new archive file after this many seconds of audio; default 0 (no limit).
+    - `--write_max_mb`: Start a new archive file after this many MB of uncompressed audio; default 0 (no limit).
     - `-s, --silence_timing`: Enable dynamic silence duration for sentence detection; default True. 
     - `-b, --batch, --batch_size`: Batch size for inference; default 16.
     - `--root, --download_root`: Specifies the root path were the Whisper models are downloaded to.
@@ -55,8 +58,11 @@ stt-server [OPTIONS]
     - `--openwakeword_inference_framework`: OpenWakeWord inference framework; default 'tensorflow'.
     - `--wake_word_buffer_duration`: Wake word buffer duration in seconds; default 1.0.
     - `--use_main_model_for_realtime`: Use main model for real-time transcription.
-    - `--use_extended_logging`: Enable extensive log messages.
+    - `--use_extended_logging`: Enable extensive log messages, including every message sent to clients.
     - `--logchunks`: Log incoming audio chunks.
+    - `--log_format`: Hot-path log output, 'text' or 'json' (one object per line); default 'text'.
+    - `--log_sample`: CATEGORY=FRACTION of a log category (realtime, sentence, message, audio, debug) to keep; repeatable.
+    - `--log_rate_limit`: CATEGORY=PER_SECOND cap of a log category; default realtime=5.
     - `--compute_type`: Type of computation to use.
     - `--input_device_index`: Index of the audio input device.
     - `--gpu_device_index`: Index of the GPU device.
@@ -64,6 +70,18 @@ stt-server [OPTIONS]
     - `--handle_buffer_overflow`: Handle buffer overflow during transcription.
     - `--suppress_tokens`: Suppress tokens during transcription.
     - `--allowed_latency_limit`: Allowed latency limit for real-time transcription.
+    - `--metrics_port`: HTTP port for Prometheus metrics on /metrics, 0 to disable; default 8013.
+    - `--ingest_queue_size`: Audio chunks buffered per data connection; default 64.
+    - `--ingest_overflow`: Policy when that buffer is full (drop_oldest, drop_newest, block); default drop_oldest.
+    - `--gap_fill_max`: Seconds of silence fed in place of audio a silence-gated client held back; default 1.0.
+    - `--send_timeout`: Seconds a data client gets to accept a message before it is detached; default 2.0.
+    - `--send_queue_size`: Messages queued per data client; one that stays over it for --send_timeout is detached; default 256.
+    - `--realtime_delta_sync`: Full realtime text every N delta-encoded updates; default 20.
+    - `--warm_recorders`: Recorders kept constructed ahead of time for new data connections; default 1.
+    - `--backend`: Who transcribes, "whisper" (models loaded once and shared by every session), "recorder" (each session recorder loads its own models) or "stub" (canned text, no model or GPU); default whisper.
+    - `--pool_workers`, `--realtime_pool_workers`: Final and realtime transcription threads of the shared pool; default 2 and 1.
+    - `--session_model`: Model of the VAD-only session recorders of the shared pool, loaded on the CPU; default 'tiny'.
+    - `--stub_delay`, `--stub_delay_per_second`, `--stub_jitter`, `--stub_text`: Timing and text of the stub backend.
 
 
 ### WebSocket Interface:
@@ -71,7 +89,48 @@ The server supports two WebSocket connections:
 1. **Control WebSocket**: Used to send and receive commands, such as setting parameters or calling recorder methods.
 2. **Data WebSocket**: Used to send audio data for transcription and receive real-time transcription updates.
 
-The server will broadcast real-time transcription updates to all connected clients on the data WebSocket.
+Every data connection is its own session, with its own recorder (VAD and audio buffers) and outbound
+queue, and only receives the transcription of its own audio. The Whisper models are loaded once in a
+shared transcription pool that batches utterances across sessions, so a session costs a small CPU
+recorder rather than a copy of the models (unless `--backend recorder`). The first message on a data connection is
+`{"type": "session_start", "session_id": ...}`. Control commands carry a `session_id` to address a
+session. Without one they apply to the only connected session, so single-client setups keep working
+unchanged; while several sessions are connected such commands are rejected. `{"command": "list_sessions"}` lists the active sessions. A data connection can also follow another
+session by sending `{"type": "subscribe", "session_id": ...}`. Messages are serialized once and queued
+for every subscriber; each client has its own bounded queue and writer, so a slow client never delays
+the others. A newer realtime update replaces one still queued for the client, all other messages are
+kept. A client that overflows its queue or does not accept a message within `--send_timeout` is
+detached. `list_sessions` reports every client's queue depth and coalesced update count.
+
+Clients can opt in to delta-encoded realtime updates with `{"type": "realtime_mode", "delta": true}` on
+the data connection (or `set_parameter realtime_delta true` with the session's `session_id` on the control
+connection); see realtime_delta.py for the message format.
+
+Several parameter sets and gets can be sent in one control message, applied all or nothing:
+`{"command": "batch", "commands": [{"command": "set_parameter", "parameter": ..., "value": ...},
+{"command": "get_parameter", "parameter": ...}]}` answers with one result per command in `results`,
+or with `errors` and nothing applied if any command is invalid. `{"command": "get_stats"}` returns
+live counters: sessions, ingest and outbound queue depths, inference timings, latencies and uptime.
+
+`{"command": "swap_model", "model": ..., "realtime_model": ..., "beam_size": ..., "beam_size_realtime": ...,
+"compute_type": ...}` (any subset) loads a new model configuration in the background, warms it up with
+test-audio/warmup_audio.wav and switches to it without dropping sessions. It is answered with "Model swap
+started" and, once the switch happened, "Model swap complete" and the new configuration. With
+the shared pool (`--backend whisper` or `stub`) the models switch for every new utterance, and running transcriptions finish on
+the old models, which are then freed; a compute_type the backend does not have is rejected. With the
+recorder backend each session's recorder owns its models, so every new recorder transcribes the warmup
+audio once: sessions that connect after the switch use the new ones, connected sessions between
+utterances switch at once and the others when their current utterance ends, shutting down their old
+recorder. The "Model swap complete" message reports how many are still in an utterance in
+`sessions_pending`.
+
+Every fullSentence carries a `trace_id` and a `trace` with the timestamps of the utterance's stages
+(arrival of the audio that set off the VAD, VAD start/stop, recording stop, transcription start,
+inference done, message sent) and the milliseconds spent reaching each one; see utterance_trace.py. The same stage durations are exported
+as `stt_utterance_stage_seconds{stage}` on /metrics. `latency_ms` is the time from the end of speech (VAD
+stop, else recording stop) to the message being sent, as in server.py. `mouth_to_text_ms` measures from the end of speech on
+the client's clock (from frame capture timestamps) to the message being sent. Per-session frame loss,
+reordering, jitter and transport delay are listed by list_sessions and get_stats; see stream_timing.py.
 """
 
 # !python stt_server.py \
@@ -89,16 +148,13 @@ The server will broadcast real-time transcription updates to all connected clien
 
 import time
 import json
-import wave
+import itertools
+import functools
 import threading
 import websockets
-import numpy as np
-from scipy.signal import resample
 from RealtimeSTT import AudioToTextRecorder
-from colorama import init, Fore, Style
+from colorama import init
 # from install_packages import check_and_install_packages
-from difflib import SequenceMatcher
-from collections import deque
 from datetime import datetime
 import logging
 import asyncio
@@ -107,13 +163,28 @@ import sys
 import ngrok
 import os
 
+from audio_resampler import StreamingResampler
+from audio_protocol import AudioFrameDecoder, AudioProtocolError, FrameGapTracker, is_handshake
+from audio_ingest import AudioIngestWorker
+from audio_archive import AudioArchive, ARCHIVE_FORMATS
+from metrics import ServerMetrics
+from transcription_backends import StubBackend
+from transcription_pool import TranscriptionPool, PooledRealtimeLoop, load_warmup_audio
+from recorder_pool import WarmRecorderPool
+from fanout import FanOut
+from realtime_delta import parse_realtime_mode
+from stuck_transcript import StuckTranscriptDetector
+from utterance_trace import UtteranceTracer
+from stream_timing import StreamTiming
+from server_logging import LOG_FORMATS, get_logger, parse_category_values, setup_logging
+from aiohttp import web
+
 debug_logging = False
 extended_logging = False
 send_recorded_chunk = False
 log_incoming_chunks = False
 silence_timing = False
 writechunks = False
-wav_file = None
 
 hard_break_even_on_background_noise = 3.0
 hard_break_even_on_background_noise_min_texts = 3
@@ -121,9 +192,17 @@ hard_break_even_on_background_noise_min_similarity = 0.99
 hard_break_even_on_background_noise_min_chars = 15
 
 
-text_time_deque = deque()
 loglevel = logging.WARNING
 
+# Hot-path log categories, see server_logging and --log_format / --log_sample / --log_rate_limit
+realtime_log = get_logger('realtime')
+sentence_log = get_logger('sentence')
+message_log = get_logger('message')
+audio_log = get_logger('audio')
+debug_log = get_logger('debug')
+# Realtime updates arrive many times per second per session
+DEFAULT_LOG_RATE_LIMITS = {'realtime': 5.0}
+
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 
@@ -148,7 +227,7 @@ if sys.platform == 'win32':
 #     },
 #     {
 #         'module_name': 'scipy.signal',                # Submodule of scipy
-#         'attribute': 'resample',                      # Specific function to check
+#         'attribute': 'firwin',                        # Specific function to check
 #         'install_name': 'scipy',                      # Package name for pip install
 #     }
 # ])
@@ -175,12 +254,12 @@ init()
 
 
 global_args = None
-recorder = None
 recorder_config = {}
-recorder_ready = threading.Event()
-recorder_thread = None
-stop_recorder = False
-prev_text = ""
+recorder_pool = None
+# Bumped by every recorder model swap; sessions on an older generation switch recorders
+recorder_generation = 0
+# Recorder states between utterances, in which a session can switch recorders at once
+IDLE_RECORDER_STATES = ('inactive', 'listening', 'wakeword')
 
 # Define allowed methods and parameters for security
 allowed_methods = [
@@ -203,11 +282,118 @@ allowed_parameters = [
     'last_transcription_bytes_b64',
 ]
 
-# Queues and connections for control and data
+# Connections and the per-connection sessions, in connection order
 control_connections = set()
 data_connections = set()
-control_queue = asyncio.Queue()
-audio_queue = asyncio.Queue()
+sessions = {}
+session_counter = itertools.count(1)
+
+# Hot-path metrics, served on --metrics_port
+metrics = ServerMetrics()
+metrics.active_sessions.set_function(lambda: len(sessions))
+metrics.resampling_sessions.set_function(
+    lambda: sum(1 for session in list(sessions.values())
+                if session.resampler and not session.resampler.passthrough))
+metrics.ingest_queue_depth.set_function(
+    lambda: sum(session.ingest.depth() for session in list(sessions.values()) if session.ingest))
+metrics.outbound_queue_depth.set_function(lambda: fanout.depth() if fanout else 0)
+# Shared pool used instead of the recorder's own models, unless --backend recorder
+transcription_pool = None
+# Per-client outbound queues, see --send_timeout and --send_queue_size
+fanout = None
+# Background writer for --write
+audio_archive = None
+server_started_at = None
+# Background task of the running swap_model command, if any
+model_swap_task = None
+
+
+class SttSession:
+    """One data connection: its own recorder (VAD and audio buffers), text state and subscribers."""
+
+    def __init__(self, session_id, websocket, loop):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.loop = loop
+        self.connected_at = time.time()
+        # Connections receiving this session's messages, and sessions this connection follows
+        self.subscribers = {websocket}
+        self.subscriptions = set()
+        self.is_running = True
+        self.recorder = None
+        self.recorder_binding = None
+        self.recorder_generation = 0
+        self.recorder_lock = threading.Lock()
+        self.recorder_ready = threading.Event()
+        self.thread = None
+        self.realtime_loop = None
+        self.ingest = None
+        self.decoder = AudioFrameDecoder()
+        self.gaps = FrameGapTracker(global_args.gap_fill_max)
+        self.timing = StreamTiming()
+        self.resampler = None
+        self.prev_text = ""
+        self.stuck_detector = StuckTranscriptDetector(
+            window=hard_break_even_on_background_noise,
+            min_texts=hard_break_even_on_background_noise_min_texts,
+            min_similarity=hard_break_even_on_background_noise_min_similarity,
+            min_chars=hard_break_even_on_background_noise_min_chars)
+        # Stage timestamps of every utterance, for the fullSentence latency breakdown
+        self.tracer = UtteranceTracer(session_id)
+        self.active_trace = None
+
+    def send(self, message, trace=None):
+        """Queue a message for this session's subscribers. Safe to call from any thread."""
+        self.loop.call_soon_threadsafe(broadcast_audio_messages, self, message, trace)
+
+    def describe(self):
+        outbox = fanout.outboxes.get(self.websocket)
+        return {
+            'session_id': self.session_id,
+            'remote_address': str(self.websocket.remote_address),
+            'connected_at': self.connected_at,
+            'ready': self.recorder_ready.is_set(),
+            'subscribers': len(self.subscribers),
+            'outbound': outbox.stats() if outbox else None,
+            'ingest_dropped': self.ingest.dropped if self.ingest else 0,
+            **self.audio_path(),
+            'timing': self.timing.stats(),
+        }
+
+    def audio_path(self):
+        """Incoming sample rate and whether it skips resampling (16 kHz fast path)."""
+        if self.resampler is None:
+            return {'sample_rate': None, 'fast_path': None}
+        return {'sample_rate': self.resampler.source_rate, 'fast_path': self.resampler.passthrough}
+
+    def close(self):
+        """Stop the session's threads and release its recorder. Blocking."""
+        self.is_running = False
+        if self.ingest:
+            self.ingest.stop()
+        if self.realtime_loop:
+            self.realtime_loop.stop()
+        if self.recorder:
+            self.recorder.abort()
+            self.recorder.stop()
+            self.recorder.shutdown()
+        if self.thread:
+            self.thread.join(timeout=5)
+        if audio_archive is not None:
+            audio_archive.close_session(self.session_id)
+
+
+def resolve_session(session_id=None):
+    """Session addressed by a control command, or None.
+
+    Without an ID a command can only address the one connected session; with
+    several connected it is ambiguous and addresses none.
+    """
+    if session_id is not None:
+        return sessions.get(str(session_id))
+    if len(sessions) == 1:
+        return next(iter(sessions.values()))
+    return None
 
 
 def preprocess_text(text):
@@ -234,17 +420,25 @@ def preprocess_text(text):
     return text
 
 
-def debug_print(message):
-    if debug_logging:
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        thread_name = threading.current_thread().name
-        print(
-            f"{Fore.CYAN}[DEBUG][{timestamp}][{thread_name}] {message}{Style.RESET_ALL}", file=sys.stderr)
+def debug_print(message, *args):
+    debug_log.debug(message, *args)
+
 
+def check_stuck_transcript(session, text):
+    """Feed one realtime pass, repeats included, to the session's stuck-transcript detector."""
+    if silence_timing and session.stuck_detector.update(preprocess_text(text)):
+        # Force the end of an utterance stuck on background noise
+        session.stuck_detector.reset()
+        session.recorder.stop()
+        session.recorder.clear_audio_queue()
+        session.prev_text = ""
 
-def text_detected(text, loop):
-    global prev_text
 
+def text_detected(session, text, check_stuck=True):
+    # With the pooled realtime loop, check_stuck_transcript already saw this pass
+    if check_stuck:
+        check_stuck_transcript(session, text)
+    recorder = session.recorder
     text = preprocess_text(text)
 
     if silence_timing:
@@ -263,113 +457,85 @@ def text_detected(text, loop):
 
         if ends_with_ellipsis(text):
             recorder.post_speech_silence_duration = global_args.mid_sentence_detection_pause
-        elif sentence_end(text) and sentence_end(prev_text) and not ends_with_ellipsis(prev_text):
+        elif sentence_end(text) and sentence_end(session.prev_text) and not ends_with_ellipsis(session.prev_text):
             recorder.post_speech_silence_duration = global_args.end_of_sentence_detection_pause
         else:
             recorder.post_speech_silence_duration = global_args.unknown_sentence_detection_pause
 
-        # Append the new text with its timestamp
-        current_time = time.time()
-        text_time_deque.append((current_time, text))
-
-        # Remove texts older than hard_break_even_on_background_noise seconds
-        while text_time_deque and text_time_deque[0][0] < current_time - hard_break_even_on_background_noise:
-            text_time_deque.popleft()
+    session.prev_text = text
 
-        # Check if at least hard_break_even_on_background_noise_min_texts texts have arrived within the last hard_break_even_on_background_noise seconds
-        if len(text_time_deque) >= hard_break_even_on_background_noise_min_texts:
-            texts = [t[1] for t in text_time_deque]
-            first_text = texts[0]
-            last_text = texts[-1]
-
-            # Compute the similarity ratio between the first and last texts
-            similarity = SequenceMatcher(None, first_text, last_text).ratio()
-
-            if similarity > hard_break_even_on_background_noise_min_similarity and len(first_text) > hard_break_even_on_background_noise_min_chars:
-                recorder.stop()
-                recorder.clear_audio_queue()
-                prev_text = ""
-
-    prev_text = text
-
-    # Put the message in the audio queue to be sent to clients
-    message = json.dumps({
+    # Queue the message for this session's client
+    session.send({
         'type': 'realtime',
         'text': text
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
-    # Get current timestamp in HH:MM:SS.nnn format
-    timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-
-    if extended_logging:
-        print(
-            f"  [{timestamp}] Realtime text: {bcolors.OKCYAN}{text}{bcolors.ENDC}\n", flush=True, end="")
-    else:
-        print(f"\r[{timestamp}] {bcolors.OKCYAN}{text}{bcolors.ENDC}",
-              flush=True, end='')
+    realtime_log.info("%s", text, session=session.session_id)
 
 
-def on_recording_start(loop):
+def on_recording_start(session):
     # Send a message to the client indicating recording has started
-    message = json.dumps({
+    session.send({
         'type': 'recording_start'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_recording_stop(loop):
+def on_recording_stop(session):
+    session.tracer.close()
     # Send a message to the client indicating recording has stopped
-    message = json.dumps({
+    session.send({
         'type': 'recording_stop'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_vad_detect_start(loop):
-    message = json.dumps({
+def on_vad_start(session):
+    session.tracer.mark('vad_start')
+
+
+def on_vad_stop(session):
+    # Also on the client's clock, for the mouth-to-text latency
+    session.tracer.mark('vad_stop', captured_at=session.timing.captured_at)
+
+
+def on_vad_detect_start(session):
+    session.send({
         'type': 'vad_detect_start'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_vad_detect_stop(loop):
-    message = json.dumps({
+def on_vad_detect_stop(session):
+    session.send({
         'type': 'vad_detect_stop'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_wakeword_detected(loop):
+def on_wakeword_detected(session):
     # Send a message to the client when wake word detection starts
-    message = json.dumps({
+    session.send({
         'type': 'wakeword_detected'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_wakeword_detection_start(loop):
+def on_wakeword_detection_start(session):
     # Send a message to the client when wake word detection starts
-    message = json.dumps({
+    session.send({
         'type': 'wakeword_detection_start'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_wakeword_detection_end(loop):
+def on_wakeword_detection_end(session):
     # Send a message to the client when wake word detection ends
-    message = json.dumps({
+    session.send({
         'type': 'wakeword_detection_end'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 
-def on_transcription_start(loop):
+def on_transcription_start(session):
+    session.active_trace = session.tracer.begin_transcription()
     # Send a message to the client when transcription starts
-    message = json.dumps({
+    session.send({
         'type': 'transcription_start'
     })
-    asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
 
 # def on_realtime_transcription_update(text, loop):
 #     # Send real-time transcription updates to the client
@@ -393,7 +559,7 @@ def on_transcription_start(loop):
 
 
 def parse_arguments():
-    global debug_logging, extended_logging, loglevel, writechunks, log_incoming_chunks, dynamic_silence_timing
+    global debug_logging, extended_logging, loglevel, writechunks, log_incoming_chunks, silence_timing
 
     import argparse
     parser = argparse.ArgumentParser(
@@ -424,7 +590,16 @@ def parse_arguments():
                         help='Enable debug logging for detailed server operations')
 
     parser.add_argument('-W', '--write', metavar='FILE',
-                        help='Save received audio to a WAV file')
+                        help='Archive received audio, one file per session (FILE_<session_id>_<part>.wav). Written on a background thread.')
+
+    parser.add_argument('--write_format', type=str, default='wav', choices=ARCHIVE_FORMATS,
+                        help="Archive file format. 'flac' needs the soundfile package and falls back to WAV without it. Default is 'wav'.")
+
+    parser.add_argument('--write_max_seconds', type=float, default=0,
+                        help='Start a new archive file for a session after this many seconds of audio. 0 disables rotation by duration. Default is 0.')
+
+    parser.add_argument('--write_max_mb', type=float, default=0,
+                        help='Start a new archive file for a session after this many megabytes of uncompressed audio. 0 disables rotation by size. Default is 0.')
 
     parser.add_argument('-b', '--batch', '--batch_size', type=int, default=16,
                         help='Batch size for inference. This parameter controls the number of audio chunks processed in parallel during transcription. Default is 16.')
@@ -536,7 +711,64 @@ def parse_arguments():
                         help='Maximal amount of chunks that can be unprocessed in queue before discarding chunks.. Default is 100.')
 
     parser.add_argument('--logchunks', action='store_true',
-                        help='Enable logging of incoming audio chunks (periods)')
+                        help='Enable logging of incoming audio chunks (the "audio" log category)')
+
+    parser.add_argument('--log_format', type=str, default='text', choices=LOG_FORMATS,
+                        help="Output of the realtime, sentence, message, audio and debug logs: 'text' lines or one 'json' object per line. Written by a background thread. Default is 'text'.")
+
+    parser.add_argument('--log_sample', type=str, action='append', metavar='CATEGORY=FRACTION',
+                        help='Keep only this fraction of a log category, e.g. realtime=0.1; 0 turns the category off. Repeat for several categories.')
+
+    parser.add_argument('--log_rate_limit', type=str, action='append', metavar='CATEGORY=PER_SECOND',
+                        help='Log at most this many records per second of a category, 0 for no limit. Default is realtime=5.')
+
+    parser.add_argument('--metrics_port', type=int, default=8013,
+                        help='Port of the HTTP server exposing Prometheus metrics on /metrics. Set to 0 to disable. Default is 8013.')
+
+    parser.add_argument('--ingest_queue_size', type=int, default=64,
+                        help='Maximum number of audio chunks buffered per data connection before the overflow policy applies. Default is 64.')
+
+    parser.add_argument('--ingest_overflow', type=str, default='drop_oldest', choices=['drop_oldest', 'drop_newest', 'block'],
+                        help='What to do when a data connection sends audio faster than it can be processed: drop the oldest buffered chunk, drop the incoming chunk, or stop reading from the connection until there is room. Default is drop_oldest.')
+
+    parser.add_argument('--gap_fill_max', type=float, default=1.0,
+                        help='Clients with a silence gate stop sending during sustained silence. When they resume, the jump in frame timestamps is filled with up to this many seconds of silence, so the VAD sees a pause instead of a splice. 0 disables filling. Default is 1.0.')
+
+    parser.add_argument('--send_timeout', type=float, default=2.0,
+                        help='Seconds a data client gets to accept a message before it is detached as a slow consumer, so it cannot hold up the others. Default is 2.0.')
+
+    parser.add_argument('--send_queue_size', type=int, default=256,
+                        help='Messages queued per data client. Realtime updates replace older queued ones, other messages are never dropped, so a client whose queue stays full for longer than --send_timeout is detached. Default is 256.')
+
+    parser.add_argument('--realtime_delta_sync', type=int, default=20,
+                        help='For clients that opted in to delta-encoded realtime updates, send the full text every N updates. Default is 20.')
+
+    parser.add_argument('--warm_recorders', type=int, default=1,
+                        help='Number of recorders kept constructed ahead of time, so a new data connection does not wait for one. Every data connection gets its own recorder. Default is 1.')
+
+    parser.add_argument('--backend', type=str, default='whisper', choices=['whisper', 'recorder', 'stub'],
+                        help='Transcription backend. "whisper" loads the models once in a shared pool used by every session, whose recorder only does VAD and buffering. "recorder" has every session recorder load models of its own (one copy per connection and warm recorder). "stub" returns canned text after a configurable delay so networking, VAD and fan-out can be benchmarked without a model or GPU. Default is whisper.')
+
+    parser.add_argument('--pool_workers', type=int, default=2,
+                        help='Shared pool: threads running final transcriptions on one model copy. Default is 2.')
+
+    parser.add_argument('--realtime_pool_workers', type=int, default=1,
+                        help='Shared pool: threads running realtime transcriptions. Default is 1.')
+
+    parser.add_argument('--session_model', type=str, default='tiny',
+                        help='Shared pool: model the VAD-only session recorders load on the CPU (int8), as the recorder always loads one. Default is tiny.')
+
+    parser.add_argument('--stub_delay', type=float, default=0.05,
+                        help='Stub backend: fixed seconds per transcription call. Default is 0.05.')
+
+    parser.add_argument('--stub_delay_per_second', type=float, default=0.0,
+                        help='Stub backend: extra seconds per second of transcribed audio. Default is 0.')
+
+    parser.add_argument('--stub_jitter', type=float, default=0.0,
+                        help='Stub backend: up to this many seconds of seeded random delay per call. Default is 0.')
+
+    parser.add_argument('--stub_text', type=str, action='append',
+                        help='Stub backend: canned sentence returned per utterance. Repeat to give several, picked per utterance by its audio.')
 
     # Parse arguments
     args = parser.parse_args()
@@ -545,7 +777,7 @@ def parse_arguments():
     extended_logging = args.use_extended_logging
     writechunks = args.write
     log_incoming_chunks = args.logchunks
-    dynamic_silence_timing = args.silence_timing
+    silence_timing = args.silence_timing
 
     if debug_logging:
         loglevel = logging.DEBUG
@@ -554,6 +786,21 @@ def parse_arguments():
     else:
         loglevel = logging.WARNING
 
+    try:
+        log_sample = parse_category_values(args.log_sample, '--log_sample')
+        log_rate_limit = {**DEFAULT_LOG_RATE_LIMITS,
+                          **parse_category_values(args.log_rate_limit, '--log_rate_limit')}
+    except ValueError as e:
+        parser.error(str(e))
+    setup_logging(args.log_format, logging.INFO, sample=log_sample, rate_limit=log_rate_limit)
+    # Debug-level categories stay disabled, and nearly free, unless asked for
+    if debug_logging or extended_logging:
+        message_log.logger.setLevel(logging.DEBUG)
+    if debug_logging or log_incoming_chunks:
+        audio_log.logger.setLevel(logging.DEBUG)
+    if debug_logging:
+        debug_log.logger.setLevel(logging.DEBUG)
+
     # Replace escaped newlines with actual newlines in initial_prompt
     if args.initial_prompt:
         args.initial_prompt = args.initial_prompt.replace("\\n", "\n")
@@ -565,111 +812,180 @@ def parse_arguments():
     return args
 
 
-def _recorder_thread(loop):
-    global recorder, stop_recorder
-    print(f"{bcolors.OKGREEN}Initializing RealtimeSTT server with parameters:{bcolors.ENDC}")
-    
-    # Dictionary to store recording stop timestamps
-    recording_stop_times = {}
-    recording_id = 0
-    
-    # Define the custom handler for recording stop events
-    def on_recording_stop_with_timestamp(loop):
-        nonlocal recording_id
-        # Store the timestamp when recording stops
-        recording_stop_times[recording_id] = time.time()
-        # Call the original handler
-        on_recording_stop(loop)
-    
-    # Replace the original handler in the config BEFORE initializing the recorder
-    recorder_config['on_recording_stop'] = make_callback(loop, on_recording_stop_with_timestamp)
-    
-    # for key, value in recorder_config.items():
-    #     print(f"    {bcolors.OKBLUE}{key}{bcolors.ENDC}: {value}")
-    
-    recorder = AudioToTextRecorder(**recorder_config)
-    print(f"{bcolors.OKGREEN}{bcolors.BOLD}RealtimeSTT initialized{bcolors.ENDC}")
-    recorder_ready.set()
+def create_session_recorder(binding, config=None, warmup_audio=None):
+    """Build a recorder whose callbacks report to whichever session it is later bound to.
+
+    With `warmup_audio` the recorder transcribes it once before it is handed
+    out, as each recorder loads models of its own.
+    """
+    config = dict(recorder_config if config is None else config)
+    config.update({
+        'on_realtime_transcription_update': make_session_callback(binding, text_detected),
+        'on_recording_start': make_session_callback(binding, on_recording_start),
+        'on_recording_stop': make_session_callback(binding, on_recording_stop),
+        'on_vad_start': make_session_callback(binding, on_vad_start),
+        'on_vad_stop': make_session_callback(binding, on_vad_stop),
+        'on_vad_detect_start': make_session_callback(binding, on_vad_detect_start),
+        'on_vad_detect_stop': make_session_callback(binding, on_vad_detect_stop),
+        'on_wakeword_detected': make_session_callback(binding, on_wakeword_detected),
+        'on_wakeword_detection_start': make_session_callback(binding, on_wakeword_detection_start),
+        'on_wakeword_detection_end': make_session_callback(binding, on_wakeword_detection_end),
+        'on_transcription_start': make_session_callback(binding, on_transcription_start),
+        # 'on_recorded_chunk': make_session_callback(binding, on_recorded_chunk),
+    })
+    recorder = AudioToTextRecorder(**config)
+    if warmup_audio is not None:
+        # Unbound, so the warmup's on_transcription_start is ignored
+        recorder.audio = warmup_audio
+        recorder.transcribe()
+    return recorder
+
+
+def acquire_session_recorder(session):
+    """Take a warm recorder from the current pool for the session."""
+    session.recorder_generation = recorder_generation
+    session.recorder_binding = recorder_pool.acquire(session.session_id)
+    session.recorder = session.recorder_binding.recorder
+
+
+def switch_session_recorder(session, idle_only=False):
+    """Move the session to a recorder with the swapped models, if it is still on older ones.
+
+    Called by swap_models() for sessions between utterances (idle_only) and
+    by the session's recorder thread when an utterance is done. The ingest
+    thread feeds the new recorder from its next chunk on. The old recorder is
+    unbound, so its late callbacks are ignored, and shut down in the
+    background, which also ends a text() call still waiting on it.
+    Returns whether the session switched.
+    """
+    with session.recorder_lock:
+        if (not session.is_running or session.recorder_binding is None
+                or session.recorder_generation == recorder_generation):
+            return False
+        if idle_only and getattr(session.recorder, 'state', None) not in IDLE_RECORDER_STATES:
+            return False
+        old = session.recorder_binding
+        acquire_session_recorder(session)
+    old.client_id = None
+    threading.Thread(target=old.recorder.shutdown, name=f"shutdown-{session.session_id}",
+                     daemon=True).start()
+    print(f"{bcolors.OKGREEN}Session {session.session_id} switched to the swapped models{bcolors.ENDC}")
+    return True
+
+
+def run_session(session):
+    """Recorder thread of one session: takes a warm recorder and transcribes its utterances."""
+    acquire_session_recorder(session)
+    session.recorder_ready.set()
+    print(f"{bcolors.OKGREEN}{bcolors.BOLD}RealtimeSTT ready for {session.session_id}{bcolors.ENDC}")
 
     def process_text(full_sentence):
-        global prev_text
-        nonlocal recording_id
-        prev_text = ""
+        session.prev_text = ""
+        session.stuck_detector.reset()
         full_sentence = preprocess_text(full_sentence)
-        
-        # Calculate latency if we have a stop time for this recording
-        latency_ms = 0
-        if recording_id in recording_stop_times:
-            stop_time = recording_stop_times.pop(recording_id)
-            latency_ms = int((time.time() - stop_time) * 1000)
-            recording_id += 1
-        
-        message = json.dumps({
+        trace, session.active_trace = session.active_trace, None
+        if trace is None:
+            trace = session.tracer.begin_transcription()
+        trace.mark('inference_done')
+
+        if transcription_pool is None:
+            # The pool reports its own inference timings
+            audio = session.recorder.audio
+            audio_seconds = len(audio) / 16000 if audio is not None else 0
+            metrics.observe_inference(
+                global_args.model,
+                trace.timestamps['inference_done'] - trace.timestamps['transcription_start'],
+                audio_seconds)
+
+        # latency_ms and the breakdown are added when the message is queued on the event loop
+        session.send({
             'type': 'fullSentence',
             'text': full_sentence,
-            'latency_ms': latency_ms
-        })
-        # Use the passed event loop here
-        asyncio.run_coroutine_threadsafe(audio_queue.put(message), loop)
-
-        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-
-        # Add latency information to the output
-        latency_info = f" (latency: {latency_ms} ms)" if latency_ms > 0 else ""
+            'trace_id': trace.trace_id,
+        }, trace)
 
-        if extended_logging:
-            print(f"  [{timestamp}] Full text: {bcolors.BOLD}Sentence:{bcolors.ENDC} {bcolors.OKGREEN}{full_sentence}{bcolors.ENDC}{latency_info}\n", flush=True, end="")
-        else:
-            print(
-                f"\r[{timestamp}] {bcolors.BOLD}Sentence:{bcolors.ENDC} {bcolors.OKGREEN}{full_sentence}{bcolors.ENDC}{latency_info}\n")
-    
     try:
-        while not stop_recorder:
-            recorder.text(process_text)
-    except KeyboardInterrupt:
-        print(
-            f"{bcolors.WARNING}Exiting application due to keyboard interrupt{bcolors.ENDC}")
-
-
-def decode_and_resample(
-        audio_data,
-        original_sample_rate,
-        target_sample_rate):
-
-    # Decode 16-bit PCM data to numpy array
-    if original_sample_rate == target_sample_rate:
-        return audio_data
-
-    audio_np = np.frombuffer(audio_data, dtype=np.int16)
-
-    # Calculate the number of samples after resampling
-    num_original_samples = len(audio_np)
-    num_target_samples = int(num_original_samples * target_sample_rate /
-                             original_sample_rate)
-
-    # Resample the audio
-    resampled_audio = resample(audio_np, num_target_samples)
-
-    return resampled_audio.astype(np.int16).tobytes()
+        if transcription_pool is not None:
+            if global_args.enable_realtime_transcription:
+                session.realtime_loop = PooledRealtimeLoop(
+                    session.recorder, transcription_pool,
+                    lambda text: text_detected(session, text, check_stuck=False),
+                    on_pass=lambda text: check_stuck_transcript(session, text),
+                    processing_pause=global_args.realtime_processing_pause)
+                session.realtime_loop.start()
+            while session.is_running:
+                # The recorder only detects and buffers the utterance
+                session.recorder.wait_audio()
+                if not session.is_running or session.recorder.is_shut_down:
+                    break
+                on_transcription_start(session)
+                process_text(transcription_pool.transcribe(session.recorder.audio))
+        else:
+            while session.is_running:
+                session.recorder.text(process_text)
+                switch_session_recorder(session)
+    except Exception as e:
+        if session.is_running:
+            print(f"{bcolors.FAIL}Recorder error in {session.session_id}: {e}{bcolors.ENDC}")
 
 
 async def control_handler(websocket):
-    debug_print(f"New control connection from {websocket.remote_address}")
+    debug_print("New control connection from %s", websocket.remote_address)
     print(f"{bcolors.OKGREEN}Control client connected{bcolors.ENDC}")
-    global recorder
     control_connections.add(websocket)
     try:
         async for message in websocket:
-            debug_print(f"Received control message: {message}...")
-            if not recorder_ready.is_set():
-                print(f"{bcolors.WARNING}Recorder not ready{bcolors.ENDC}")
-                continue
+            debug_print("Received control message: %s...", message)
             if isinstance(message, str):
                 # Handle text message (command)
                 try:
                     command_data = json.loads(message)
                     command = command_data.get("command")
-                    if command == "set_parameter":
+                    if command == "list_sessions":
+                        await websocket.send(json.dumps({"status": "success", "sessions": [
+                            session.describe() for session in list(sessions.values())]}))
+                        continue
+                    if command == "swap_model":
+                        response = start_model_swap(websocket, command_data)
+                        if command_data.get("request_id") is not None:
+                            response["request_id"] = command_data["request_id"]
+                        await websocket.send(json.dumps(response))
+                        continue
+                    if command == "get_stats":
+                        response = {"status": "success", "stats": server_stats()}
+                        if command_data.get("request_id") is not None:
+                            response["request_id"] = command_data["request_id"]
+                        await websocket.send(json.dumps(response))
+                        continue
+
+                    # Commands address one session, by default the only one connected
+                    session_id = command_data.get("session_id")
+                    session = resolve_session(session_id)
+                    if session is None or not session.recorder_ready.is_set():
+                        if session_id is not None and session is None:
+                            reason = f"Session {session_id} not found"
+                        elif session_id is None and len(sessions) > 1:
+                            reason = f"{len(sessions)} sessions are connected, the command needs a session_id"
+                        else:
+                            reason = "Recorder not ready"
+                        print(f"{bcolors.WARNING}{reason}{bcolors.ENDC}")
+                        response = {"status": "error", "message": reason}
+                        if command_data.get("request_id") is not None:
+                            response["request_id"] = command_data["request_id"]
+                        await websocket.send(json.dumps(response))
+                        continue
+                    recorder = session.recorder
+
+                    if command == "batch":
+                        response = run_control_batch(session, command_data.get("commands"))
+                        if command_data.get("request_id") is not None:
+                            response["request_id"] = command_data["request_id"]
+                        await websocket.send(json.dumps(response))
+                    elif command == "set_parameter" and command_data.get("parameter") == "realtime_delta":
+                        # Session option rather than a recorder attribute, for clients that can only set parameters
+                        set_realtime_delta(session.websocket, bool(command_data.get("value")))
+                        await websocket.send(json.dumps({"status": "success", "message": f"Parameter realtime_delta set to {bool(command_data.get('value'))}"}))
+                    elif command == "set_parameter":
                         parameter = command_data.get("parameter")
                         value = command_data.get("value")
                         if parameter in allowed_parameters and hasattr(recorder, parameter):
@@ -767,86 +1083,405 @@ async def control_handler(websocket):
         control_connections.remove(websocket)
 
 
+def run_control_batch(session, commands):
+    """Apply a list of set_parameter / get_parameter commands to a session, all or nothing.
+
+    Every command is validated before any is applied, and sets are rolled
+    back if one of them fails, so the recorder never ends up half updated.
+    Runs on the event loop without awaiting, so no other control command
+    can interleave. Gets see the sets earlier in the same batch.
+    """
+    recorder = session.recorder
+    if not isinstance(commands, list) or not commands:
+        return {"status": "error", "message": "Batch needs a non-empty list of commands"}
+
+    errors = []
+    for index, item in enumerate(commands):
+        item = item if isinstance(item, dict) else {}
+        command = item.get("command")
+        parameter = item.get("parameter")
+        if command not in ("set_parameter", "get_parameter"):
+            errors.append({"index": index, "message": f"Command {command} is not allowed in a batch"})
+        elif command == "set_parameter" and parameter == "realtime_delta":
+            continue
+        elif parameter not in allowed_parameters:
+            errors.append({"index": index, "message": f"Parameter {parameter} is not allowed ({command})"})
+        elif not hasattr(recorder, parameter):
+            errors.append({"index": index, "message": f"Parameter {parameter} does not exist ({command})"})
+    if errors:
+        print(f"{bcolors.WARNING}Batch rejected: {errors[0]['message']}{bcolors.ENDC}")
+        return {"status": "error", "message": "Batch rejected, nothing applied", "errors": errors}
+
+    results = []
+    previous = []
+    realtime_delta = None
+    try:
+        for item in commands:
+            parameter = item["parameter"]
+            if item["command"] == "get_parameter":
+                results.append({"command": "get_parameter", "parameter": parameter,
+                                "value": getattr(recorder, parameter)})
+            elif parameter == "realtime_delta":
+                realtime_delta = bool(item.get("value"))
+                results.append({"command": "set_parameter", "parameter": parameter, "value": realtime_delta})
+            else:
+                previous.append((parameter, getattr(recorder, parameter)))
+                setattr(recorder, parameter, item.get("value"))
+                results.append({"command": "set_parameter", "parameter": parameter, "value": item.get("value")})
+    except Exception as e:
+        for parameter, value in reversed(previous):
+            setattr(recorder, parameter, value)
+        print(f"{bcolors.WARNING}Batch rolled back: {e}{bcolors.ENDC}")
+        return {"status": "error", "message": f"Batch rolled back, nothing applied: {e}"}
+
+    if realtime_delta is not None:
+        set_realtime_delta(session.websocket, realtime_delta)
+    if extended_logging:
+        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+        print(f"  [{timestamp}] {bcolors.OKGREEN}Applied batch of {len(commands)} commands to {session.session_id}{bcolors.ENDC}")
+    return {"status": "success", "results": results}
+
+
+SWAP_OPTIONS = {
+    # control command key: (recorder_config key, type)
+    'model': ('model', str),
+    'realtime_model': ('realtime_model_type', str),
+    'beam_size': ('beam_size', int),
+    'beam_size_realtime': ('beam_size_realtime', int),
+    'compute_type': ('compute_type', str),
+}
+
+
+def start_model_swap(websocket, command_data):
+    """Validate a swap_model command and run the swap in the background.
+
+    The immediate reply only says whether the swap started; a second message
+    on the same control connection reports the result.
+    """
+    global model_swap_task
+    options = {}
+    for key, (_, kind) in SWAP_OPTIONS.items():
+        if command_data.get(key) is None:
+            continue
+        try:
+            options[key] = kind(command_data[key])
+        except (TypeError, ValueError):
+            return {"status": "error", "message": f"Invalid value for {key}"}
+        if kind is int and options[key] < 1:
+            return {"status": "error", "message": f"{key} must be at least 1"}
+    if not options:
+        return {"status": "error", "message": f"swap_model needs at least one of {', '.join(SWAP_OPTIONS)}"}
+    if model_swap_task is not None and not model_swap_task.done():
+        return {"status": "error", "message": "A model swap is already in progress"}
+    if transcription_pool is not None:
+        try:
+            transcription_pool.check_swap(**options)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+    async def run():
+        try:
+            models = await swap_models(options)
+            response = {"status": "success", "message": "Model swap complete", "models": models}
+            if transcription_pool is None:
+                # Sessions in an utterance keep their recorder until it ends
+                pending = sum(1 for session in list(sessions.values())
+                              if session.recorder_binding is not None
+                              and session.recorder_generation != recorder_generation)
+                response["sessions_pending"] = pending
+                if pending:
+                    response["message"] = (f"Model swap complete, {pending} connected session(s) "
+                                           f"switch at the end of their current utterance")
+        except Exception as e:
+            print(f"{bcolors.FAIL}Model swap failed: {e}{bcolors.ENDC}")
+            response = {"status": "error", "message": f"Model swap failed: {e}"}
+        if command_data.get("request_id") is not None:
+            response["request_id"] = command_data["request_id"]
+        if websocket in control_connections:
+            await websocket.send(json.dumps(response))
+
+    print(f"{bcolors.OKCYAN}Swapping models: {options}{bcolors.ENDC}")
+    model_swap_task = asyncio.ensure_future(run())
+    return {"status": "success", "message": "Model swap started", "options": options}
+
+
+async def swap_models(options):
+    """Load and warm up a new model configuration, then switch to it without dropping sessions.
+
+    With the shared transcription pool, utterances transcribed after the
+    switch use the new models and running ones finish on the old models,
+    which are freed afterwards. With per-session recorders the models live in
+    the recorders, so a new warm recorder pool is built with the new
+    configuration, its recorders warmed up with the test audio: sessions
+    started after the switch use it, connected sessions between utterances
+    take a new recorder right away and the others once their current
+    utterance is transcribed (see switch_session_recorder()). The old
+    recorders, and with them the old models, are shut down as they are
+    replaced.
+    """
+    global recorder_config, recorder_pool, recorder_generation
+    loop = asyncio.get_running_loop()
+    if transcription_pool is not None:
+        warmup_audio = await loop.run_in_executor(None, load_warmup_audio)
+        return await loop.run_in_executor(None, functools.partial(
+            transcription_pool.swap, warmup_audio=warmup_audio, **options))
+
+    config = dict(recorder_config)
+    for key, value in options.items():
+        config[SWAP_OPTIONS[key][0]] = value
+    warmup_audio = await loop.run_in_executor(None, load_warmup_audio)
+    # At least one recorder, so the new models are loaded and warm before the switch
+    new_pool = WarmRecorderPool(
+        functools.partial(create_session_recorder, config=config, warmup_audio=warmup_audio),
+        size=max(1, global_args.warm_recorders))
+    new_pool.start()
+    await loop.run_in_executor(None, new_pool.wait_ready)
+    old_pool, recorder_pool = recorder_pool, new_pool
+    recorder_config = config
+    recorder_generation += 1
+    if 'model' in options:
+        global_args.model = options['model']
+    await loop.run_in_executor(None, old_pool.shutdown)
+    await asyncio.gather(*(
+        loop.run_in_executor(None, functools.partial(switch_session_recorder, session, idle_only=True))
+        for session in list(sessions.values())))
+    print(f"{bcolors.OKGREEN}Recorders switched to {options}{bcolors.ENDC}")
+    return {key: config[SWAP_OPTIONS[key][0]] for key in SWAP_OPTIONS}
+
+
+def server_stats():
+    """Live counters for the get_stats control command."""
+    stats = metrics.stats()
+    stats['uptime_seconds'] = time.time() - server_started_at if server_started_at else 0.0
+    stats['control_connections'] = len(control_connections)
+    stats['data_connections'] = len(data_connections)
+    stats['sessions'] = [{
+        'session_id': session.session_id,
+        'ready': session.recorder_ready.is_set(),
+        'ingest_depth': session.ingest.depth() if session.ingest else 0,
+        'ingest_dropped': session.ingest.dropped if session.ingest else 0,
+        'outbound_depth': fanout.outboxes[session.websocket].depth() if session.websocket in fanout.outboxes else 0,
+        **session.audio_path(),
+        'timing': session.timing.stats(),
+    } for session in list(sessions.values())]
+    if transcription_pool is not None:
+        stats['transcription_pool'] = {
+            'queue_depth': transcription_pool.queue_depth(),
+            'real_time_factor': transcription_pool.real_time_factor(),
+            'realtime_real_time_factor': transcription_pool.real_time_factor(realtime=True),
+            'models': transcription_pool.models.describe(),
+        }
+    stats['model_swap_running'] = model_swap_task is not None and not model_swap_task.done()
+    if audio_archive is not None:
+        stats['audio_archive'] = {
+            'files_written': audio_archive.files_written,
+            'bytes_written': audio_archive.bytes_written,
+            'dropped': audio_archive.dropped,
+        }
+    return stats
+
+
+def is_subscribe(message):
+    try:
+        request = json.loads(message)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(request, dict) and request.get('type') == 'subscribe'
+
+
+def set_realtime_delta(connection, enabled):
+    """Switch delta-encoded realtime updates on or off for one connection."""
+    outbox = fanout.outboxes.get(connection)
+    if outbox is None:
+        return
+    outbox.set_realtime_delta(enabled, global_args.realtime_delta_sync)
+    fanout.send_to(connection, {
+        'type': 'realtime_mode_ack',
+        'delta': enabled,
+        'fullSyncEvery': global_args.realtime_delta_sync,
+    })
+
+
 async def data_handler(websocket):
-    global writechunks, wav_file
-    print(f"{bcolors.OKGREEN}Data client connected{bcolors.ENDC}")
+    loop = asyncio.get_running_loop()
+    session = SttSession(f"session_{next(session_counter)}", websocket, loop)
+    print(f"{bcolors.OKGREEN}Data client connected as {session.session_id}{bcolors.ENDC}")
     data_connections.add(websocket)
+    sessions[session.session_id] = session
+    fanout.attach(websocket, name=session.session_id)
+    session.send({'type': 'session_start', 'session_id': session.session_id})
+
+    session.thread = threading.Thread(
+        target=run_session, args=(session,), name=session.session_id, daemon=True)
+    session.thread.start()
+
+    def process_chunk(item):
+        # Runs on the ingest thread, off the event loop
+        message, arrival = item
+        try:
+            frame = session.decoder.decode(message)
+        except AudioProtocolError as e:
+            audio_log.warning("Dropping malformed audio frame: %s", e, session=session.session_id)
+            return
+        metrics.observe_frame(*session.timing.observe(frame, arrival))
+        sample_rate = frame.sample_rate
+        chunk = frame.pcm
+        gap = session.gaps.gap(frame)
+        if gap:
+            # The client's silence gate held audio back
+            metrics.client_gated_seconds.inc(gap)
+            audio_log.debug("Filling %.2f s gap in the audio stream", gap, session=session.session_id)
+            if global_args.gap_fill_max > 0:
+                chunk = session.gaps.silence(frame, gap) + chunk
+
+        audio_log.debug("Processing audio chunk with sample rate %d", sample_rate)
+
+        if audio_archive is not None:
+            # Only queues the chunk, the archive thread does the disk I/O
+            audio_archive.write(session.session_id, chunk, sample_rate)
+
+        if session.resampler is None or session.resampler.source_rate != sample_rate:
+            session.resampler = StreamingResampler(sample_rate, 16000)
+            # 16 kHz audio goes to the recorder as received, without a numpy round trip
+            audio_log.info("Receiving %d Hz audio, %s", sample_rate,
+                           "16 kHz fast path" if session.resampler.passthrough else "resampling to 16 kHz",
+                           session=session.session_id)
+        resampled_chunk = session.resampler.process(chunk)
+
+        audio_log.debug("Resampled chunk size: %d bytes", len(resampled_chunk))
+        # Only the first chunks of a session can arrive before its recorder
+        while not session.recorder_ready.wait(0.1):
+            if not session.is_running:
+                return
+        session.tracer.audio(arrival)
+        session.recorder.feed_audio(resampled_chunk)
+        session.timing.fed(frame)
+
+    session.ingest = AudioIngestWorker(
+        process_chunk,
+        maxsize=global_args.ingest_queue_size,
+        overflow=global_args.ingest_overflow,
+        name=f"ingest-{session.session_id}",
+        on_drop=metrics.ingest_dropped.inc)
     try:
         while True:
             message = await websocket.recv()
             if isinstance(message, bytes):
-                if debug_logging:
-                    debug_print(
-                        f"Received audio chunk (size: {len(message)} bytes)")
-                elif log_incoming_chunks:
-                    print(".", end='', flush=True)
-                # Handle binary message (audio data)
-                metadata_length = int.from_bytes(
-                    message[:4], byteorder='little')
-                metadata_json = message[4:4+metadata_length].decode('utf-8')
-                metadata = json.loads(metadata_json)
-                sample_rate = metadata['sampleRate']
-
-                debug_print(
-                    f"Processing audio chunk with sample rate {sample_rate}")
-                chunk = message[4+metadata_length:]
-
-                if writechunks:
-                    if not wav_file:
-                        wav_file = wave.open(writechunks, 'wb')
-                        wav_file.setnchannels(CHANNELS)
-                        wav_file.setsampwidth(pyaudio.get_sample_size(FORMAT))
-                        wav_file.setframerate(sample_rate)
-
-                    wav_file.writeframes(chunk)
-
-                resampled_chunk = decode_and_resample(
-                    chunk, sample_rate, 16000)
-
-                debug_print(
-                    f"Resampled chunk size: {len(resampled_chunk)} bytes")
-                recorder.feed_audio(resampled_chunk)
+                audio_log.debug("Received audio chunk (size: %d bytes)", len(message),
+                                session=session.session_id)
+                metrics.ingress_bytes.inc(len(message), format=session.decoder.sample_format)
+                # Handle binary message (audio data) on the ingest thread, with its arrival time
+                await session.ingest.put((message, time.time()))
+            elif is_handshake(message):
+                # v2 clients negotiate sample rate, format and channels once
+                try:
+                    ack = session.decoder.negotiate(message)
+                except AudioProtocolError as e:
+                    await websocket.send(json.dumps({'type': 'error', 'message': str(e)}))
+                    continue
+                debug_print("Negotiated audio stream: %s", ack)
+                session.timing.restart()
+                await websocket.send(json.dumps(ack))
+            elif parse_realtime_mode(message) is not None:
+                set_realtime_delta(websocket, parse_realtime_mode(message))
+            elif is_subscribe(message):
+                # Also receive another session's transcripts, e.g. for a caption viewer
+                target = sessions.get(str(json.loads(message).get('session_id')))
+                if target is None:
+                    await websocket.send(json.dumps({'type': 'error', 'message': 'Unknown session'}))
+                    continue
+                target.subscribers.add(websocket)
+                session.subscriptions.add(target)
+                await websocket.send(json.dumps({'type': 'subscribed', 'session_id': target.session_id}))
             else:
                 print(
                     f"{bcolors.WARNING}Received non-binary message on data connection{bcolors.ENDC}")
     except websockets.exceptions.ConnectionClosed as e:
-        print(f"{bcolors.WARNING}Data client disconnected: {e}{bcolors.ENDC}")
+        print(f"{bcolors.WARNING}Data client {session.session_id} disconnected: {e}{bcolors.ENDC}")
     finally:
-        data_connections.remove(websocket)
-        recorder.clear_audio_queue()  # Ensure audio queue is cleared if client disconnects
+        if session.ingest.dropped:
+            print(
+                f"{bcolors.WARNING}Dropped {session.ingest.dropped} audio chunks for {session.session_id}{bcolors.ENDC}")
+        sessions.pop(session.session_id, None)
+        data_connections.discard(websocket)
+        for target in session.subscriptions:
+            target.subscribers.discard(websocket)
+        fanout.forget(websocket)
+        # Shutting the recorder down blocks, keep it off the event loop
+        await loop.run_in_executor(None, session.close)
+        print(f"{bcolors.OKGREEN}Session {session.session_id} closed{bcolors.ENDC}")
+
+
+def broadcast_audio_messages(session, message, trace=None):
+    """Queue a session's message for every connection subscribed to it. Runs on the event loop."""
+    if trace is not None:
+        trace.mark('message_sent')
+        message['trace'] = trace.breakdown()
+        message['latency_ms'] = message['trace']['latency_ms']
+        message['mouth_to_text_ms'] = message['trace']['mouth_to_text_ms']
+        metrics.observe_trace(message['trace'])
+        sentence_log.info("%s", message['text'], session=session.session_id,
+                          trace_id=trace.trace_id, latency_ms=message['latency_ms'])
+    message_log.debug("Sending message: %s", message, session=session.session_id)
+    # Serialized once, each subscriber's own writer task sends it
+    fanout.publish(message, session.subscribers)
+
+
+def on_fanout_detach(connection, reason):
+    metrics.detached_clients.inc(reason=reason)
+    if reason == 'timeout':
+        print(
+            f"{bcolors.WARNING}Detached slow client {connection.remote_address}: send took longer than {fanout.timeout}s{bcolors.ENDC}")
+    elif reason == 'overflow':
+        print(
+            f"{bcolors.WARNING}Detached slow client {connection.remote_address}: more than {fanout.max_queue} messages waiting for over {fanout.timeout}s{bcolors.ENDC}")
 
+async def handle_metrics(request):
+    return web.Response(body=metrics.render().encode('utf-8'),
+                        headers={'Content-Type': ServerMetrics.content_type})
 
-async def broadcast_audio_messages():
-    while True:
-        message = await audio_queue.get()
-        for conn in list(data_connections):
-            try:
-                timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
 
-                if extended_logging:
-                    print(
-                        f"  [{timestamp}] Sending message: {bcolors.OKBLUE}{message}{bcolors.ENDC}\n", flush=True, end="")
-                await conn.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                data_connections.remove(conn)
+async def start_metrics_server(port):
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, 'localhost', port)
+    await site.start()
+    return runner
 
-# Helper function to create event loop bound closures for callbacks
+# Helper function to create session bound closures for recorder callbacks
 
 
-def make_callback(loop, callback):
+def make_session_callback(binding, callback):
+    # Recorders are built before their session exists, so look it up on every call
     def inner_callback(*args, **kwargs):
-        callback(*args, **kwargs, loop=loop)
+        session = sessions.get(binding.client_id)
+        if session is not None:
+            callback(session, *args, **kwargs)
     return inner_callback
 
 
 async def main_async():
-    global stop_recorder, recorder_config, global_args
+    global recorder_config, recorder_pool, global_args, transcription_pool, fanout, audio_archive
+    global server_started_at
     args = parse_arguments()
     global_args = args
+    server_started_at = time.time()
+    fanout = FanOut(timeout=args.send_timeout, max_queue=args.send_queue_size,
+                    on_detach=on_fanout_detach,
+                    on_coalesce=lambda outbox: metrics.outbound_coalesced.inc())
 
-    # Get the event loop here and pass it to the recorder thread
     loop = asyncio.get_event_loop()
 
+    if args.write:
+        audio_archive = AudioArchive(
+            args.write,
+            fmt=args.write_format,
+            max_seconds=args.write_max_seconds,
+            max_bytes=int(args.write_max_mb * 1024 * 1024))
+        print(f"{bcolors.OKGREEN}Archiving audio as {audio_archive.fmt} to {bcolors.OKBLUE}{audio_archive.root}_<session_id>_<part>.{audio_archive.fmt}{bcolors.ENDC}")
+
     recorder_config = {
         'model': args.model,
         'download_root': args.root,
@@ -881,16 +1516,6 @@ async def main_async():
         'use_main_model_for_realtime': args.use_main_model_for_realtime,
         'spinner': False,
         'use_microphone': False,
-        'on_realtime_transcription_update': make_callback(loop, text_detected),
-        'on_recording_start': make_callback(loop, on_recording_start),
-        'on_recording_stop': make_callback(loop, on_recording_stop),
-        'on_vad_detect_start': make_callback(loop, on_vad_detect_start),
-        'on_vad_detect_stop': make_callback(loop, on_vad_detect_stop),
-        'on_wakeword_detected': make_callback(loop, on_wakeword_detected),
-        'on_wakeword_detection_start': make_callback(loop, on_wakeword_detection_start),
-        'on_wakeword_detection_end': make_callback(loop, on_wakeword_detection_end),
-        'on_transcription_start': make_callback(loop, on_transcription_start),
-        # 'on_recorded_chunk': make_callback(loop, on_recorded_chunk),
         'no_log_file': True,  # Disable logging to file
         'use_extended_logging': args.use_extended_logging,
         'level': loglevel,
@@ -902,6 +1527,52 @@ async def main_async():
         'allowed_latency_limit': args.allowed_latency_limit,
     }
 
+    if args.backend != 'recorder':
+        # The recorders only run VAD and buffering; they still load a model,
+        # so keep it the smallest on the CPU, without a CUDA context per session
+        recorder_config.update({
+            'model': args.session_model,
+            'realtime_model_type': args.session_model,
+            'device': 'cpu',
+            'compute_type': 'int8',
+            'enable_realtime_transcription': False,
+            'early_transcription_on_silence': 0,
+        })
+        backend = None
+        if args.backend == 'stub':
+            backend = StubBackend(
+                delay=args.stub_delay,
+                delay_per_second=args.stub_delay_per_second,
+                jitter=args.stub_jitter,
+                texts=args.stub_text)
+        realtime_model = None
+        if args.enable_realtime_transcription and not args.use_main_model_for_realtime:
+            realtime_model = args.rt_model
+        # Large models are loaded once and shared by every session
+        transcription_pool = TranscriptionPool(
+            model=args.model,
+            realtime_model=realtime_model,
+            workers=args.pool_workers,
+            realtime_workers=args.realtime_pool_workers,
+            batch_size=args.batch,
+            realtime_batch_size=args.realtime_batch_size,
+            device=args.device,
+            compute_type=args.compute_type,
+            gpu_device_index=args.gpu_device_index,
+            download_root=args.root,
+            language=args.lang,
+            beam_size=args.beam_size,
+            beam_size_realtime=args.beam_size_realtime,
+            initial_prompt=args.initial_prompt,
+            initial_prompt_realtime=args.initial_prompt_realtime,
+            suppress_tokens=args.suppress_tokens,
+            on_batch=metrics.observe_inference,
+            backend=backend)
+        transcription_pool.start()
+
+    # Every data connection gets its own recorder, built ahead of time
+    recorder_pool = WarmRecorderPool(create_session_recorder, size=args.warm_recorders)
+
     try:
         # Attempt to start control and data servers
         listener_control = await ngrok.forward(8011, "http", authtoken_from_env=True,
@@ -918,19 +1589,21 @@ async def main_async():
         print(f"{bcolors.OKGREEN}Control server started on {bcolors.OKBLUE}ws://localhost:{args.control}{bcolors.ENDC}")
         print(f"{bcolors.OKGREEN}Data server started on {bcolors.OKBLUE}ws://localhost:{args.data}{bcolors.ENDC}")
 
-        # Start the broadcast and recorder threads
-        broadcast_task = asyncio.create_task(broadcast_audio_messages())
+        if args.metrics_port:
+            await start_metrics_server(args.metrics_port)
+            print(f"{bcolors.OKGREEN}Metrics server started on {bcolors.OKBLUE}http://localhost:{args.metrics_port}/metrics{bcolors.ENDC}")
+
+        asyncio.create_task(metrics.monitor_event_loop())
 
-        recorder_thread = threading.Thread(
-            target=_recorder_thread, args=(loop,))
-        recorder_thread.start()
-        recorder_ready.wait()
+        recorder_pool.start()
+        await loop.run_in_executor(None, recorder_pool.wait_ready)
+        print(f"{bcolors.OKGREEN}{bcolors.BOLD}RealtimeSTT initialized{bcolors.ENDC}")
 
         print(
             f"{bcolors.OKGREEN}Server started. Press Ctrl+C to stop the server.{bcolors.ENDC}")
 
         # Run server tasks
-        await asyncio.gather(control_server.wait_closed(), data_server.wait_closed(), broadcast_task)
+        await asyncio.gather(control_server.wait_closed(), data_server.wait_closed())
     except OSError as e:
         print(f"{bcolors.FAIL}Error: Could not start server on specified ports. It's possible another instance of the server is already running, or the ports are being used by another application.{bcolors.ENDC}")
     except KeyboardInterrupt:
@@ -943,17 +1616,22 @@ async def main_async():
 
 
 async def shutdown_procedure():
-    global stop_recorder, recorder_thread
-    if recorder:
-        stop_recorder = True
-        recorder.abort()
-        recorder.stop()
-        recorder.shutdown()
-        print(f"{bcolors.OKGREEN}Recorder shut down{bcolors.ENDC}")
-
-        if recorder_thread:
-            recorder_thread.join()
-            print(f"{bcolors.OKGREEN}Recorder thread finished{bcolors.ENDC}")
+    for session in list(sessions.values()):
+        session.close()
+        print(f"{bcolors.OKGREEN}Session {session.session_id} shut down{bcolors.ENDC}")
+    sessions.clear()
+
+    if recorder_pool is not None:
+        recorder_pool.shutdown()
+        print(f"{bcolors.OKGREEN}Recorders shut down{bcolors.ENDC}")
+
+    if transcription_pool is not None:
+        transcription_pool.shutdown()
+
+    if audio_archive is not None:
+        audio_archive.stop()
+        print(f"{bcolors.OKGREEN}Audio archive closed: {audio_archive.files_written} files, "
+              f"{audio_archive.bytes_written / 1024 / 1024:.1f} MB, {audio_archive.dropped} chunks dropped{bcolors.ENDC}")
 
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
     for task in tasks:
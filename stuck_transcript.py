@@ -0,0 +1,92 @@
+"""
+Detection of realtime transcripts stuck on background noise.
+
+When the recorder keeps recording on background noise, the realtime
+transcription repeats (nearly) the same text over and over and the
+utterance never ends. The servers and the CLI client force a stop when at
+least `min_texts` updates arrived within `window` seconds and the oldest
+and newest of them are more than `min_similarity` alike.
+
+That comparison used difflib.SequenceMatcher, which is quadratic in the
+text length and ran on every update. StuckTranscriptDetector fingerprints
+each update once, in linear time, as a multiset of hashed two-token windows
+weighted by the characters they cover, and compares two fingerprints in
+time linear in the number of distinct windows. Identical texts score 1.0,
+an edited word lowers the score by about the share of characters around
+it, like SequenceMatcher's ratio. One detector per session, updated from a
+single thread; reset() may be called from another one.
+"""
+
+import collections
+import time
+
+DEFAULT_WINDOW = 3.0
+DEFAULT_MIN_TEXTS = 3
+DEFAULT_MIN_SIMILARITY = 0.99
+DEFAULT_MIN_CHARS = 15
+
+
+def fingerprint(text):
+    """Return (hashed token window weights, total weight) of `text`."""
+    weights = collections.Counter()
+    previous = ''
+    for token in text.split():
+        # Each token is weighted by its length plus the separating space
+        weights[hash((previous, token))] += len(token) + 1
+        previous = token
+    return weights, sum(weights.values())
+
+
+def similarity(a, b):
+    """Weighted Dice similarity of two fingerprints, between 0.0 and 1.0."""
+    weights_a, total_a = a
+    weights_b, total_b = b
+    if not total_a and not total_b:
+        return 1.0
+    if len(weights_a) > len(weights_b):
+        weights_a, weights_b = weights_b, weights_a
+    shared = sum(min(weight, weights_b[key]) for key, weight in weights_a.items()
+                 if key in weights_b)
+    return 2.0 * shared / (total_a + total_b)
+
+
+class StuckTranscriptDetector:
+    """Tracks one session's realtime updates and reports when they stop changing."""
+
+    def __init__(self, window=DEFAULT_WINDOW, min_texts=DEFAULT_MIN_TEXTS,
+                 min_similarity=DEFAULT_MIN_SIMILARITY, min_chars=DEFAULT_MIN_CHARS):
+        self.window = window
+        self.min_texts = min_texts
+        self.min_similarity = min_similarity
+        self.min_chars = min_chars
+        # (timestamp, text, fingerprint or None until it is needed)
+        self._updates = collections.deque()
+
+    def reset(self):
+        # Swap rather than clear, so an update running concurrently never sees it half-emptied
+        self._updates = collections.deque()
+
+    def update(self, text, now=None):
+        """Record a realtime update. Returns True if the transcript is stuck."""
+        if now is None:
+            now = time.time()
+        updates = self._updates
+        updates.append([now, text, None])
+        while updates and updates[0][0] < now - self.window:
+            updates.popleft()
+        if len(updates) < self.min_texts:
+            return False
+
+        first, last = updates[0], updates[-1]
+        if len(first[1]) <= self.min_chars:
+            return False
+        if first[1] == last[1]:
+            return 1.0 > self.min_similarity
+        # Upper bound from the lengths alone, rules out a growing transcript in O(1)
+        shorter, longer = sorted((len(first[1]), len(last[1])))
+        if 2.0 * shorter / (shorter + longer) <= self.min_similarity:
+            return False
+        for entry in (first, last):
+            if entry[2] is None:
+                entry[2] = fingerprint(entry[1])
+        return similarity(first[2], last[2]) > self.min_similarity
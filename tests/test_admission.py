@@ -0,0 +1,86 @@
+import asyncio
+
+import numpy as np
+
+from admission import AdmissionController
+from transcription_backends import StubBackend
+from transcription_pool import TranscriptionPool
+
+
+class Client:
+    def __init__(self):
+        self.messages = []
+
+    async def notify(self, message):
+        self.messages.append(message)
+
+
+def test_queued_client_is_admitted_on_release():
+    async def run():
+        admission = AdmissionController(max_sessions=1, max_queue=1, queue_timeout=5.0)
+        first, second = Client(), Client()
+        assert await admission.acquire(first.notify)
+        waiting = asyncio.ensure_future(admission.acquire(second.notify))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        assert admission.queue_depth() == 1
+        assert second.messages == [{
+            'type': 'server_busy', 'reason': 'max_sessions', 'queued': True,
+            'active_sessions': 1, 'retry_after': 5.0, 'position': 1,
+        }]
+
+        admission.release()
+        assert await asyncio.wait_for(waiting, 1.0)
+        assert admission.active == 1
+        assert admission.queue_depth() == 0
+        assert first.messages == []
+
+    asyncio.run(run())
+
+
+def test_full_queue_and_queue_timeout_reject_with_retry_after():
+    async def run():
+        admission = AdmissionController(max_sessions=1, max_queue=1, queue_timeout=0.2, retry_after=2.0)
+        queued, turned_away = Client(), Client()
+        assert await admission.acquire(Client().notify)
+        waiting = asyncio.ensure_future(admission.acquire(queued.notify))
+        await asyncio.sleep(0.05)
+
+        # The only queue slot is taken
+        assert not await admission.acquire(turned_away.notify)
+        busy = turned_away.messages[-1]
+        assert busy['type'] == 'server_busy' and not busy['queued']
+        assert busy['retry_after'] == 4.0
+
+        assert not await asyncio.wait_for(waiting, 2.0)
+        busy = queued.messages[-1]
+        assert busy['type'] == 'server_busy' and not busy['queued']
+        assert busy['reason'] == 'max_sessions'
+        assert busy['retry_after'] >= 2.0
+        assert admission.rejected == 2
+        assert admission.active == 1
+        assert admission.queue_depth() == 0
+
+    asyncio.run(run())
+
+
+def test_real_time_factor_above_threshold_rejects():
+    # One second of audio takes the stub about 0.5 s: real-time factor 0.5
+    pool = TranscriptionPool('tiny', workers=1, backend=StubBackend(delay=0, delay_per_second=0.5))
+    pool.start()
+    try:
+        async def run():
+            admission = AdmissionController(max_rtf=0.3, load_probe=pool.real_time_factor)
+            assert await admission.acquire(Client().notify)
+            admission.release()
+
+            await asyncio.to_thread(pool.transcribe, np.ones(16000, dtype=np.float32), timeout=5)
+            assert pool.real_time_factor() > 0.3
+            assert admission.busy_reason() == 'overloaded'
+            client = Client()
+            assert not await admission.acquire(client.notify)
+            assert client.messages[-1]['reason'] == 'overloaded'
+
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
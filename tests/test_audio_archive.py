@@ -0,0 +1,103 @@
+import sys
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+from audio_archive import AudioArchive
+
+
+def pcm(seconds, sample_rate=16000):
+    samples = np.arange(int(seconds * sample_rate)) % 2000 - 1000
+    return samples.astype(np.int16).tobytes()
+
+
+def wav_frames(path):
+    with wave.open(str(path), 'rb') as wav_file:
+        return wav_file.getframerate(), wav_file.readframes(wav_file.getnframes())
+
+
+def test_rotates_on_max_seconds(tmp_path):
+    archive = AudioArchive(str(tmp_path / 'audio.wav'), max_seconds=0.5, buffer_seconds=0)
+    audio = pcm(1.2)
+    for start in range(0, len(audio), 3200):
+        archive.write('s1', audio[start:start + 3200], 16000)
+    archive.stop()
+
+    paths = sorted(tmp_path.glob('audio_s1_*.wav'))
+    assert [path.name for path in paths] == ['audio_s1_001.wav', 'audio_s1_002.wav', 'audio_s1_003.wav']
+    parts = [wav_frames(path)[1] for path in paths]
+    assert [len(part) // 2 for part in parts] == [8000, 8000, 3200]
+    assert b''.join(parts) == audio
+    assert archive.files_written == 3
+    assert archive.bytes_written == len(audio)
+
+
+def test_rotates_on_max_bytes_and_sample_rate_change(tmp_path):
+    archive = AudioArchive(str(tmp_path / 'audio'), max_bytes=10000, buffer_seconds=0)
+    archive.write('s1', pcm(0.5), 16000)
+    archive.write('s1', pcm(0.1, 48000), 48000)
+    archive.close_session('s1')
+    archive.stop()
+
+    rates_and_lengths = [(rate, len(frames))
+                         for rate, frames in map(wav_frames, sorted(tmp_path.glob('audio_s1_*.wav')))]
+    assert rates_and_lengths == [(16000, 10000), (16000, 6000), (48000, 9600)]
+
+
+def test_sessions_get_separate_files(tmp_path):
+    archive = AudioArchive(str(tmp_path / 'audio.wav'))
+    archive.write('s1', pcm(0.1), 16000)
+    archive.write('s2', pcm(0.2), 16000)
+    archive.stop()
+    assert len(wav_frames(tmp_path / 'audio_s1_001.wav')[1]) == 3200
+    assert len(wav_frames(tmp_path / 'audio_s2_001.wav')[1]) == 6400
+
+
+def test_flac(tmp_path):
+    soundfile = pytest.importorskip('soundfile')
+    archive = AudioArchive(str(tmp_path / 'audio.flac'), fmt='flac')
+    audio = pcm(0.3)
+    archive.write('s1', audio, 16000)
+    archive.stop()
+    data, sample_rate = soundfile.read(str(tmp_path / 'audio_s1_001.flac'), dtype='int16')
+    assert sample_rate == 16000
+    assert data.tobytes() == audio
+
+
+def test_flac_without_soundfile_falls_back_to_wav(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'soundfile', None)
+    archive = AudioArchive(str(tmp_path / 'audio.flac'), fmt='flac')
+    archive.write('s1', pcm(0.1), 16000)
+    archive.stop()
+    assert archive.fmt == 'wav'
+    assert len(wav_frames(tmp_path / 'audio_s1_001.wav')[1]) == 3200
+
+
+def test_counts_chunks_dropped_while_the_writer_is_behind(tmp_path):
+    archive = AudioArchive(str(tmp_path / 'audio.wav'), max_pending=2)
+    busy, release = threading.Event(), threading.Event()
+    append = archive._append
+
+    def slow_append(*args):
+        busy.set()
+        release.wait(5)
+        append(*args)
+
+    archive._append = slow_append
+    archive.write('s1', pcm(0.1), 16000)
+    assert busy.wait(2)
+    for _ in range(5):
+        archive.write('s1', pcm(0.1), 16000)
+    assert archive.dropped == 3
+
+    release.set()
+    archive.stop()
+    # The chunk being written and the two queued ones
+    assert len(wav_frames(tmp_path / 'audio_s1_001.wav')[1]) == 3 * 3200
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        AudioArchive(str(tmp_path / 'audio'), fmt='mp3')
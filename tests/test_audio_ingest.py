@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from audio_ingest import AudioIngestWorker
+
+
+class BlockedHandler:
+    """Holds the worker in its first frame until released, so the queue fills up."""
+
+    def __init__(self):
+        self.handled = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, message):
+        self.started.set()
+        self.release.wait(5)
+        self.handled.append(message)
+
+
+def fill(overflow, count, maxsize=3):
+    handler = BlockedHandler()
+    drops = []
+    worker = AudioIngestWorker(handler, maxsize=maxsize, overflow=overflow,
+                               on_drop=lambda: drops.append(1))
+
+    async def run():
+        results = [await worker.put(0)]
+        # Frame 0 is now in the handler, the queue is empty
+        assert handler.started.wait(2)
+        results += [await worker.put(index) for index in range(1, count)]
+        return results
+
+    results = asyncio.run(run())
+    return worker, handler, drops, results
+
+
+def drain(worker, handler, count):
+    # stop() makes room for its sentinel in a full queue, so let the queue empty first
+    handler.release.set()
+    deadline = time.monotonic() + 2
+    while worker.processed < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop(wait=True)
+    return handler.handled
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    worker, handler, drops, results = fill('drop_oldest', 7)
+    assert results == [True] * 7
+    assert worker.depth() == 3
+    assert worker.dropped == 3 and len(drops) == 3
+    assert drain(worker, handler, 4) == [0, 4, 5, 6]
+
+
+def test_drop_newest_keeps_the_oldest_frames():
+    worker, handler, drops, results = fill('drop_newest', 7)
+    assert results == [True] * 4 + [False] * 3
+    assert worker.dropped == 3 and len(drops) == 3
+    assert drain(worker, handler, 4) == [0, 1, 2, 3]
+
+
+def test_block_waits_for_room_without_dropping():
+    handler = BlockedHandler()
+    worker = AudioIngestWorker(handler, maxsize=2, overflow='block')
+
+    async def run():
+        await worker.put(0)
+        assert handler.started.wait(2)
+        await worker.put(1)
+        await worker.put(2)
+        blocked = asyncio.ensure_future(worker.put(3))
+        await asyncio.sleep(0.1)
+        assert not blocked.done()
+        handler.release.set()
+        assert await asyncio.wait_for(blocked, 2)
+
+    asyncio.run(run())
+    worker.stop(wait=True)
+    assert handler.handled == [0, 1, 2, 3]
+    assert worker.dropped == 0
+    assert worker.processed == 4
+
+
+def test_handler_errors_do_not_stop_the_worker():
+    handled = []
+
+    def handler(message):
+        if message == 'bad':
+            raise ValueError(message)
+        handled.append(message)
+
+    worker = AudioIngestWorker(handler)
+    for message in ('a', 'bad', 'b'):
+        asyncio.run(worker.put(message))
+    deadline = time.monotonic() + 2
+    while len(handled) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop(wait=True)
+    assert handled == ['a', 'b']
+    assert worker.processed == 2
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        AudioIngestWorker(lambda message: None, overflow='drop_all')
@@ -0,0 +1,60 @@
+import sys
+
+import numpy as np
+import pytest
+
+from audio_protocol import AudioFrameDecoder, AudioProtocolError
+
+
+def test_opus_handshake_without_opuslib_falls_back_to_pcm(monkeypatch):
+    # A None entry makes `import opuslib` raise ImportError
+    monkeypatch.setitem(sys.modules, 'opuslib', None)
+    decoder = AudioFrameDecoder()
+    with pytest.raises(AudioProtocolError, match='Opus is not supported'):
+        decoder.negotiate({'protocol': 2, 'format': 'opus', 'sampleRate': 48000, 'channels': 1})
+
+    ack = decoder.negotiate({'protocol': 2, 'format': 's16le', 'sampleRate': 16000, 'channels': 1})
+    assert ack['format'] == 's16le'
+    pcm = np.arange(320, dtype=np.int16).tobytes()
+    frame = decoder.decode(pcm)
+    assert bytes(frame.pcm) == pcm
+    assert frame.sample_rate == 16000
+
+
+@pytest.mark.parametrize('handshake', [
+    '{"type": "audio_config", "sampleRate": "abc"}',
+    '{"type": "audio_config", "protocol": null, "sampleRate": 16000}',
+    '{"type": "audio_config", "sampleRate": 16000, "channels": [1]}',
+    '{"type": "audio_config", "sampleRate": 0}',
+    '["audio_config"]',
+    'not json',
+])
+def test_malformed_handshake_raises_protocol_error(handshake):
+    decoder = AudioFrameDecoder()
+    with pytest.raises(AudioProtocolError):
+        decoder.negotiate(handshake)
+    assert decoder.sample_rate is None
+
+
+def legacy_frame(metadata, pcm=b'\x00\x00' * 4):
+    header = metadata.encode('utf-8')
+    return len(header).to_bytes(4, byteorder='little') + header + pcm
+
+
+def test_legacy_frame():
+    frame = AudioFrameDecoder().decode(legacy_frame('{"sampleRate": 48000, "sequence": 7}'))
+    assert frame.sample_rate == 48000
+    assert frame.sequence == 7
+    assert frame.timestamp is None
+    assert len(frame.pcm) == 8
+
+
+@pytest.mark.parametrize('message', [
+    legacy_frame('{"sampleRate": 4'),
+    legacy_frame('{"sequence": 1}'),
+    legacy_frame('[48000]'),
+    b'\x01\x00\x00\x00\xff',
+])
+def test_malformed_legacy_frame_raises_protocol_error(message):
+    with pytest.raises(AudioProtocolError):
+        AudioFrameDecoder().decode(message)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from audio_resampler import StreamingResampler
+
+
+def noise(rate, seconds=1.0, seed=0):
+    # Band-limited well below 8 kHz, so the reference is not dominated by the anti-alias filter
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    signal = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, 2 * np.pi)) for f in (220, 1000, 3100, 5500))
+    return np.rint(signal * 6000).astype(np.int16)
+
+
+def snr_db(reference, signal):
+    length = min(len(reference), len(signal))
+    reference = reference[:length].astype(np.float64)
+    error = reference - signal[:length].astype(np.float64)
+    return 10 * np.log10(np.sum(reference ** 2) / max(np.sum(error ** 2), 1e-9))
+
+
+def stream(resampler, audio, chunk):
+    return np.concatenate([resampler.process_array(audio[i:i + chunk])
+                           for i in range(0, len(audio), chunk)])
+
+
+@pytest.mark.parametrize('rate', [48000, 44100, 24000, 8000])
+def test_matches_resample_poly(rate):
+    audio = noise(rate)
+    resampler = StreamingResampler(rate, 16000)
+    streamed = stream(resampler, audio, 1024)
+    reference = resample_poly(audio.astype(np.float64), 16000, rate)
+    # The streaming filter is causal, line it up with the zero-phase reference
+    delay = 10 * max(resampler.up, resampler.down) // resampler.down
+    assert snr_db(reference, streamed[delay:]) > 60
+
+
+@pytest.mark.parametrize('chunks', [[1024], [1], [7, 333, 1, 2048], [480]])
+def test_output_does_not_depend_on_chunking(chunks):
+    audio = noise(44100)
+    whole = StreamingResampler(44100).process_array(audio)
+    resampler = StreamingResampler(44100)
+    parts, start, index = [], 0, 0
+    while start < len(audio):
+        size = chunks[index % len(chunks)]
+        parts.append(resampler.process_array(audio[start:start + size]))
+        start += size
+        index += 1
+    np.testing.assert_array_equal(np.concatenate(parts), whole)
+
+
+def test_output_length_tracks_input():
+    resampler = StreamingResampler(44100)
+    total = sum(len(resampler.process(b'\0\0' * 441)) // 2 for _ in range(100))
+    assert total == 16000
+
+
+def test_reset_forgets_history():
+    audio = noise(48000, 0.1)
+    resampler = StreamingResampler(48000)
+    first = resampler.process_array(audio)
+    resampler.process_array(noise(48000, 0.1, seed=1))
+    resampler.reset()
+    np.testing.assert_array_equal(resampler.process_array(audio), first)
+
+
+def test_passthrough_at_target_rate():
+    resampler = StreamingResampler(16000)
+    pcm = noise(16000, 0.05).tobytes()
+    assert resampler.passthrough
+    assert resampler.process(pcm) is pcm
+
+
+def test_empty_chunk():
+    assert StreamingResampler(48000).process(b'') == b''
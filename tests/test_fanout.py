@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+from fanout import CLOSE_SLOW_CONSUMER, FanOut
+
+
+class FakeConnection:
+    def __init__(self, name, delay=0.0):
+        self.remote_address = name
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def send(self, payload, text=True):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = code
+
+
+def run(scenario):
+    return asyncio.run(scenario)
+
+
+async def settle():
+    # Let the writer tasks drain their queues
+    await asyncio.sleep(0.05)
+
+
+def test_publish_reaches_every_recipient_in_order():
+    async def scenario():
+        fanout = FanOut()
+        first, second = FakeConnection('a'), FakeConnection('b')
+        fanout.attach(first)
+        fanout.attach(second)
+        recipients = {first, second}
+        for index in range(3):
+            assert fanout.publish({'type': 'fullSentence', 'text': str(index)}, recipients) == 2
+        await settle()
+        return first, second
+
+    first, second = run(scenario())
+    assert [m['text'] for m in first.sent] == ['0', '1', '2']
+    assert second.sent == first.sent
+
+
+def test_realtime_updates_coalesce_but_lifecycle_messages_do_not():
+    async def scenario():
+        coalesced = []
+        fanout = FanOut(on_coalesce=coalesced.append)
+        connection = FakeConnection('a')
+        fanout.attach(connection)
+        recipients = {connection}
+        fanout.publish({'type': 'recording_start'}, recipients)
+        for text in ('a', 'ab', 'abc'):
+            fanout.publish({'type': 'realtime', 'text': text}, recipients)
+        fanout.publish({'type': 'recording_stop'}, recipients)
+        fanout.publish({'type': 'realtime', 'text': 'abcd'}, recipients)
+        await settle()
+        return connection, coalesced
+
+    connection, coalesced = run(scenario())
+    assert [(m['type'], m.get('text')) for m in connection.sent] == [
+        ('recording_start', None), ('realtime', 'abc'), ('recording_stop', None), ('realtime', 'abcd')]
+    assert len(coalesced) == 2
+
+
+def test_burst_over_the_limit_does_not_detach_a_healthy_client():
+    async def scenario():
+        detached = []
+        fanout = FanOut(max_queue=5, on_detach=lambda connection, reason: detached.append(reason))
+        connection = FakeConnection('fast')
+        fanout.attach(connection)
+        for _ in range(10):
+            fanout.publish({'type': 'recording_start'}, {connection})
+        await settle()
+        return connection, detached
+
+    connection, detached = run(scenario())
+    assert detached == []
+    assert len(connection.sent) == 10
+
+
+def test_sustained_backlog_detaches():
+    async def scenario():
+        detached = []
+        fanout = FanOut(timeout=0.05, max_queue=2,
+                        on_detach=lambda connection, reason: detached.append(reason))
+        # Each send stays within the timeout, but the client cannot keep up
+        slow = FakeConnection('slow', delay=0.04)
+        fanout.attach(slow)
+        recipients = {slow}
+        for index in range(20):
+            fanout.publish({'type': 'fullSentence', 'text': str(index)}, recipients)
+            await asyncio.sleep(0.01)
+        await settle()
+        return slow, recipients, detached, fanout
+
+    slow, recipients, detached, fanout = run(scenario())
+    assert detached == ['overflow']
+    assert slow not in recipients
+    assert slow.closed_with == CLOSE_SLOW_CONSUMER
+    assert slow not in fanout.outboxes
+
+
+def test_stalled_client_is_detached_on_timeout():
+    async def scenario():
+        detached = []
+        fanout = FanOut(timeout=0.02, on_detach=lambda connection, reason: detached.append(reason))
+        stalled, healthy = FakeConnection('stalled', delay=1.0), FakeConnection('healthy')
+        fanout.attach(stalled)
+        fanout.attach(healthy)
+        recipients = {stalled, healthy}
+        fanout.publish({'type': 'fullSentence', 'text': 'x'}, recipients)
+        await asyncio.sleep(0.1)
+        return stalled, healthy, recipients, detached
+
+    stalled, healthy, recipients, detached = run(scenario())
+    assert detached == ['timeout']
+    assert recipients == {healthy}
+    assert healthy.sent == [{'type': 'fullSentence', 'text': 'x'}]
+
+
+def test_detached_connection_gets_no_new_outbox():
+    async def scenario():
+        fanout = FanOut()
+        detached, forgotten = FakeConnection('detached'), FakeConnection('forgotten')
+        fanout.attach(detached)
+        fanout.attach(forgotten)
+        fanout.detach(detached, 'overflow')
+        fanout.forget(forgotten)
+        queued = fanout.publish({'type': 'realtime', 'text': 'x'}, {detached, forgotten})
+        sent = fanout.send_to(detached, {'type': 'recording_start'})
+        await settle()
+        return fanout, queued, sent, detached, forgotten
+
+    fanout, queued, sent, detached, forgotten = run(scenario())
+    assert (queued, sent) == (0, False)
+    assert fanout.outboxes == {}
+    assert detached.sent == [] and forgotten.sent == []
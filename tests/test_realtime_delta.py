@@ -0,0 +1,66 @@
+import random
+
+from realtime_delta import RealtimeDeltaDecoder, RealtimeDeltaEncoder, parse_realtime_mode
+
+
+def round_trip(texts, full_sync_every=20):
+    encoder, decoder = RealtimeDeltaEncoder(full_sync_every), RealtimeDeltaDecoder()
+    sent = []
+    for text in texts:
+        message = encoder.encode({'type': 'realtime', 'text': text})
+        sent.append(message)
+        assert decoder.apply(message) == text
+    return sent
+
+
+def test_growing_transcript_is_sent_as_deltas():
+    texts = ["Hello there, this is", "Hello there, this is a long", "Hello there, this is a longer test"]
+    sent = round_trip(texts)
+    assert sent[0]['type'] == 'realtime'
+    assert [m['type'] for m in sent[1:]] == ['realtime_delta', 'realtime_delta']
+    assert sent[2] == {'type': 'realtime_delta', 'keep': len("Hello there, this is a long"), 'text': "er test"}
+
+
+def test_rewritten_prefix_rebases_on_the_common_prefix():
+    sent = round_trip(["The cat sat on the mat today", "The cat sat on a hat today and"])
+    assert sent[1]['keep'] == len("The cat sat on ")
+
+
+def test_full_sync_every_n_updates():
+    texts = ["word " * 10 + "x" * n for n in range(1, 8)]
+    sent = round_trip(texts, full_sync_every=3)
+    assert [m['type'] == 'realtime' for m in sent] == [True, False, False, False, True, False, False]
+
+
+def test_small_texts_and_non_bmp_go_out_in_full():
+    sent = round_trip(["Hi", "Hi there", "Long enough text here 🎤", "Long enough text here 🎤 more"])
+    assert all(m['type'] == 'realtime' for m in sent)
+
+
+def test_full_sentence_resets_both_sides():
+    encoder, decoder = RealtimeDeltaEncoder(), RealtimeDeltaDecoder()
+    decoder.apply(encoder.encode({'type': 'realtime', 'text': "A sentence that is long"}))
+    encoder.reset()
+    assert decoder.apply({'type': 'fullSentence', 'text': "A sentence that is long."}) is None
+    message = encoder.encode({'type': 'realtime', 'text': "A sentence that is long again"})
+    assert message['type'] == 'realtime'
+    assert decoder.apply(message) == "A sentence that is long again"
+
+
+def test_random_edits_round_trip():
+    rng = random.Random(3)
+    words = "alpha beta gamma delta epsilon zeta eta theta".split()
+    text, texts = "", []
+    for _ in range(300):
+        cut = rng.randint(0, len(text))
+        text = text[:cut] + " ".join(rng.choice(words) for _ in range(rng.randint(0, 3)))
+        texts.append(text)
+    round_trip(texts, full_sync_every=7)
+
+
+def test_parse_realtime_mode():
+    assert parse_realtime_mode('{"type": "realtime_mode", "delta": true}') is True
+    assert parse_realtime_mode('{"type": "realtime_mode"}') is False
+    assert parse_realtime_mode('{"type": "audio_config"}') is None
+    assert parse_realtime_mode('not json "realtime_mode"') is None
+    assert parse_realtime_mode(b'\x00binary') is None
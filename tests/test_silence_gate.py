@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from audio_protocol import AudioFrame, FrameGapTracker
+from silence_gate import SilenceGate, frame_level_db
+from stream_timing import StreamTiming
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+SPEECH = (np.sin(np.arange(FRAME_SAMPLES) / 5) * 8000).astype(np.int16).tobytes()
+SILENCE = bytes(FRAME_SAMPLES * 2)
+
+
+def test_frame_level():
+    assert frame_level_db(SILENCE) == -np.inf
+    assert frame_level_db(SPEECH) == pytest.approx(20 * np.log10(8000 / np.sqrt(2) / 32768), abs=0.1)
+
+
+def test_hangover_keeps_sending_after_speech():
+    gate = SilenceGate(hangover=0.1, preroll=0.0)
+    assert gate.process(SPEECH, SAMPLE_RATE, 20) == [(SPEECH, 20)]
+    sent = [gate.process(SILENCE, SAMPLE_RATE, 40 + i * FRAME_MS) for i in range(10)]
+    # 100 ms of hangover is five 20 ms frames
+    assert [len(frames) for frames in sent] == [1] * 5 + [0] * 5
+    assert not gate.is_open
+    assert gate.frames_sent == 6
+    assert gate.frames_gated == 5
+
+
+def test_preroll_is_sent_ahead_of_speech():
+    gate = SilenceGate(hangover=0.0, preroll=0.06)
+    for i in range(10):
+        assert gate.process(SILENCE, SAMPLE_RATE, (i + 1) * FRAME_MS) == []
+    frames = gate.process(SPEECH, SAMPLE_RATE, 11 * FRAME_MS)
+    # The last 60 ms of silence, then the speech frame, with their capture timestamps
+    assert [timestamp for _, timestamp in frames] == [160, 180, 200, 220]
+    assert frames[-1][0] == SPEECH
+    assert gate.frames_sent == 4
+    assert gate.frames_gated == 7
+
+
+def frame(timestamp, pcm=SILENCE, sequence=None):
+    return AudioFrame(pcm, SAMPLE_RATE, sequence, timestamp)
+
+
+def test_gap_tolerance_boundary():
+    tracker = FrameGapTracker(max_fill=1.0, tolerance=0.25)
+    assert tracker.gap(frame(1000)) == 0.0
+    # The next frame ends 20 ms after it started, so 250 ms are missing: still jitter
+    assert tracker.gap(frame(1000 + 250 + FRAME_MS)) == 0.0
+    assert tracker.gap(frame(1270 + 251 + FRAME_MS)) == pytest.approx(0.251)
+    assert tracker.gaps == 1
+    assert tracker.gap(frame(None)) == 0.0
+
+
+def test_gap_fill_is_capped():
+    tracker = FrameGapTracker(max_fill=0.5)
+    assert len(tracker.silence(frame(0), 0.3)) == int(0.3 * SAMPLE_RATE) * 2
+    assert len(tracker.silence(frame(0), 30.0)) == int(0.5 * SAMPLE_RATE) * 2
+
+
+def test_gated_audio_is_a_timestamp_gap_not_a_sequence_gap():
+    # 50 ms of hangover and preroll each cover three 20 ms frames
+    gate = SilenceGate(hangover=0.05, preroll=0.05)
+    tracker = FrameGapTracker(max_fill=1.0)
+    timing = StreamTiming()
+    sequence = 0
+    fills = []
+    # Speech, one second of silence, speech again
+    capture = [SPEECH] * 5 + [SILENCE] * 50 + [SPEECH] * 5
+    for index, pcm in enumerate(capture):
+        for sent_pcm, timestamp in gate.process(pcm, SAMPLE_RATE, (index + 1) * FRAME_MS):
+            # Clients number the frames they send
+            received = frame(timestamp, sent_pcm, sequence)
+            sequence += 1
+            timing.observe(received, timestamp / 1000)
+            gap = tracker.gap(received)
+            if gap:
+                fills.append(gap)
+    assert timing.lost == 0
+    # 50 silent frames minus 3 of hangover and 3 of preroll were held back
+    assert fills == [pytest.approx(44 * FRAME_MS / 1000)]
+
+
+def test_lost_frame_is_a_sequence_gap_within_tolerance():
+    tracker = FrameGapTracker()
+    timing = StreamTiming()
+    for index in (0, 1, 3, 4):
+        received = frame((index + 1) * FRAME_MS, SPEECH, index)
+        timing.observe(received, 0.0)
+        assert tracker.gap(received) == 0.0
+    assert timing.lost == 1
+    assert tracker.gaps == 0
@@ -0,0 +1,96 @@
+import pytest
+
+from audio_protocol import AudioFrame
+from stream_timing import SEQUENCE_MODULO, StreamTiming
+
+FRAME_MS = 20
+
+
+def frame(sequence, timestamp=None):
+    return AudioFrame(b'', 16000, sequence, timestamp)
+
+
+def test_counts_lost_frames():
+    timing = StreamTiming()
+    assert timing.observe(frame(0), 0.0)[0] == 0
+    assert timing.observe(frame(1), 0.0)[0] == 0
+    assert timing.observe(frame(4), 0.0)[:2] == (2, False)
+    assert timing.lost == 2
+    assert timing.frames == 3
+
+
+def test_sequence_wraparound_is_not_a_loss():
+    timing = StreamTiming()
+    timing.observe(frame(SEQUENCE_MODULO - 2), 0.0)
+    timing.observe(frame(SEQUENCE_MODULO - 1), 0.0)
+    assert timing.observe(frame(0), 0.0)[:2] == (0, False)
+    assert timing.observe(frame(1), 0.0)[:2] == (0, False)
+    assert timing.lost == 0
+    assert timing.reordered == 0
+
+
+def test_late_frame_moves_a_loss_to_reordered():
+    timing = StreamTiming()
+    timing.observe(frame(0), 0.0)
+    timing.observe(frame(2), 0.0)
+    assert timing.lost == 1
+    assert timing.observe(frame(1), 0.0)[:2] == (0, True)
+    assert timing.lost == 0
+    assert timing.reordered == 1
+    # The late frame does not move the expected position back
+    assert timing.observe(frame(3), 0.0)[:2] == (0, False)
+    assert timing.lost == 0
+
+
+def test_jitter_grows_with_uneven_arrivals():
+    steady = StreamTiming()
+    uneven = StreamTiming()
+    for i in range(50):
+        capture = i * FRAME_MS
+        steady.observe(frame(i, capture), (capture + 30) / 1000)
+        uneven.observe(frame(i, capture), (capture + 30 + (15 if i % 2 else 0)) / 1000)
+    assert steady.jitter_ms == pytest.approx(0.0)
+    assert uneven.jitter_ms > 10
+
+
+def test_delay_and_minimum_delay():
+    timing = StreamTiming()
+    _, _, delay = timing.observe(frame(0, 1000), 1.050)
+    assert delay == pytest.approx(0.050)
+    timing.observe(frame(1, 1020), 1.060)
+    assert timing.min_delay_ms == pytest.approx(40)
+    assert 40 < timing.delay_ms < 50
+    assert timing.observe(frame(2), 1.1)[2] is None
+
+
+def test_restart_forgets_the_sequence_position():
+    timing = StreamTiming()
+    timing.observe(frame(100, 0), 0.0)
+    timing.restart()
+    assert timing.observe(frame(0, 5000), 0.0)[:2] == (0, False)
+    assert timing.lost == 0
+    assert timing.reordered == 0
+
+
+def test_fed_records_the_capture_time():
+    timing = StreamTiming()
+    timing.fed(frame(0))
+    assert timing.captured_at is None
+    timing.fed(frame(1, 2500))
+    assert timing.captured_at == pytest.approx(2.5)
+
+
+def test_stats():
+    timing = StreamTiming()
+    assert timing.stats() == {
+        'frames': 0, 'lost': 0, 'reordered': 0, 'jitter_ms': 0.0,
+        'transport_delay_ms': None, 'min_transport_delay_ms': None, 'queueing_delay_ms': None,
+    }
+    timing.observe(frame(0, 1000), 1.040)
+    timing.observe(frame(2, 1040), 1.120)
+    stats = timing.stats()
+    assert stats['frames'] == 2
+    assert stats['lost'] == 1
+    assert stats['min_transport_delay_ms'] == 40.0
+    assert stats['queueing_delay_ms'] == pytest.approx(stats['transport_delay_ms'] - 40.0, abs=0.1)
+    assert stats['queueing_delay_ms'] > 0
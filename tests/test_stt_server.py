@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+
+# stt_server imports the recorder and audio stack at module level
+for module in ('RealtimeSTT', 'pyaudio', 'ngrok', 'colorama'):
+    pytest.importorskip(module)
+
+import stt_server  # noqa: E402
+
+NOISE_TEXT = "Thank you for watching, see you next time"
+
+
+class FakeRecorder:
+    def __init__(self):
+        self.post_speech_silence_duration = 0.4
+        self.stops = 0
+
+    def stop(self):
+        self.stops += 1
+
+    def clear_audio_queue(self):
+        pass
+
+
+class FakeLoop:
+    def __init__(self):
+        self.messages = []
+
+    def call_soon_threadsafe(self, callback, session, message, trace=None):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['stt_server.py', '--backend', 'stub'])
+    monkeypatch.setattr(stt_server, 'global_args', stt_server.parse_arguments())
+    session = stt_server.SttSession('session_1', object(), FakeLoop())
+    session.recorder = FakeRecorder()
+    return session
+
+
+def test_silence_timing_flag_is_applied(session):
+    assert stt_server.silence_timing
+
+
+def test_stuck_realtime_text_stops_the_utterance(session):
+    for _ in range(stt_server.hard_break_even_on_background_noise_min_texts):
+        stt_server.text_detected(session, NOISE_TEXT)
+    assert session.recorder.stops == 1
+    assert session.prev_text == stt_server.preprocess_text(NOISE_TEXT)
+    assert [message['type'] for message in session.loop.messages] == ['realtime'] * 3
+
+
+def test_growing_realtime_text_keeps_recording(session):
+    words = NOISE_TEXT.split()
+    for count in range(1, len(words) + 1):
+        stt_server.text_detected(session, " ".join(words[:count]))
+    assert session.recorder.stops == 0
@@ -0,0 +1,86 @@
+import difflib
+import threading
+import time
+
+from stuck_transcript import StuckTranscriptDetector, fingerprint, similarity
+from transcription_pool import PooledRealtimeLoop
+
+NOISE_TEXT = "Thank you for watching, see you next time"
+
+
+def test_repeated_text_is_stuck():
+    detector = StuckTranscriptDetector(window=3.0, min_texts=3)
+    assert not detector.update(NOISE_TEXT, now=0.0)
+    assert not detector.update(NOISE_TEXT, now=0.5)
+    assert detector.update(NOISE_TEXT, now=1.0)
+
+
+def test_growing_transcript_is_not_stuck():
+    detector = StuckTranscriptDetector()
+    words = "this is a sentence that keeps on growing while the speaker talks".split()
+    assert not any(detector.update(" ".join(words[:count]), now=count * 0.2)
+                   for count in range(3, len(words) + 1))
+
+
+def test_short_texts_and_old_updates_are_ignored():
+    detector = StuckTranscriptDetector(window=1.0, min_texts=3, min_chars=15)
+    assert not any(detector.update("Hmm.", now=t * 0.1) for t in range(10))
+    assert not detector.update(NOISE_TEXT, now=10.0)
+    assert not detector.update(NOISE_TEXT, now=11.5)
+    assert not detector.update(NOISE_TEXT, now=13.0)
+
+
+def test_reset_starts_over():
+    detector = StuckTranscriptDetector(min_texts=2)
+    detector.update(NOISE_TEXT, now=0.0)
+    detector.reset()
+    assert not detector.update(NOISE_TEXT, now=0.1)
+
+
+def test_similarity_agrees_with_sequence_matcher_at_the_threshold():
+    a = "the quick brown fox jumps over the lazy dog near the river bank"
+    long_text = " ".join([a] * 8)
+    for x, y in ((a, a), (a, a.replace("lazy", "sleepy")), (a, a + " today"),
+                 (long_text, long_text + " and"), (a, "something else entirely")):
+        expected = difflib.SequenceMatcher(None, x, y).ratio() > 0.99
+        assert (similarity(fingerprint(x), fingerprint(y)) > 0.99) == expected
+
+
+class FakeRecorder:
+    def __init__(self):
+        self.is_recording = True
+        self.frames = [b'\0\0' * 8000]
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.is_recording = False
+        self.stopped.set()
+
+    def clear_audio_queue(self):
+        pass
+
+
+class FakePool:
+    def transcribe(self, audio, realtime=False):
+        return NOISE_TEXT
+
+
+def test_pooled_loop_feeds_repeats_to_the_detector():
+    recorder = FakeRecorder()
+    detector = StuckTranscriptDetector(window=3.0, min_texts=3)
+    texts = []
+
+    def on_pass(text):
+        if detector.update(text):
+            recorder.stop()
+
+    loop = PooledRealtimeLoop(recorder, FakePool(), texts.append, processing_pause=0.02,
+                              on_pass=on_pass)
+    loop.start()
+    try:
+        assert recorder.stopped.wait(2.0), "the hard break never fired"
+    finally:
+        loop.stop()
+    # The client still gets the unchanged text only once
+    time.sleep(0.05)
+    assert texts == [NOISE_TEXT]
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from transcription_backends import SAMPLE_RATE, StubBackend, WhisperEngine, create_backend
+
+
+def utterances(count, seconds=2.0):
+    rng = np.random.default_rng(0)
+    return [(rng.standard_normal(int(16000 * seconds)) * 0.1).astype(np.float32) for _ in range(count)]
+
+
+def test_stub_text_depends_only_on_the_audio():
+    audios = utterances(12)
+    engine = StubBackend(delay=0).load('tiny')
+    expected = [engine.transcribe(audio) for audio in audios]
+    with ThreadPoolExecutor(4) as workers:
+        concurrent = list(workers.map(engine.transcribe, reversed(audios)))
+    assert concurrent[::-1] == expected
+    assert engine.transcribe_batch(audios) == expected
+    assert len(set(expected)) > 1
+
+
+def test_stub_realtime_is_a_prefix_of_the_final_text():
+    audio = utterances(1, seconds=3.0)[0]
+    engine = StubBackend(delay=0, words_per_second=2).load('tiny')
+    final = engine.transcribe(audio)
+    partial = engine.transcribe(audio[:16000], realtime=True)
+    assert partial.split() == final.split()[:2]
+
+
+def test_stub_uses_the_given_texts():
+    engine = create_backend('stub', delay=0, texts=['only this']).load('tiny')
+    assert engine.transcribe(utterances(1)[0]) == 'only this'
+    assert engine.transcribe(np.zeros(0, dtype=np.float32)) == ''
+
+
+class FakeWhisperModel:
+    """Detects French for utterances starting with a positive sample, English otherwise."""
+
+    def detect_language(self, audio):
+        return ('fr' if audio[0] > 0 else 'en'), 1.0, []
+
+
+class FakeBatchedPipeline:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None, clip_timestamps=(), **options):
+        self.calls.append((language, len(clip_timestamps)))
+        return [SimpleNamespace(start=clip['start'] / SAMPLE_RATE, text=f"{language}{index}")
+                for index, clip in enumerate(clip_timestamps)], None
+
+
+def language_utterances(*languages):
+    return [np.full(SAMPLE_RATE, 0.1 if language == 'fr' else -0.1, dtype=np.float32)
+            for language in languages]
+
+
+def test_batch_without_language_groups_utterances_by_detected_language():
+    batched = FakeBatchedPipeline()
+    engine = WhisperEngine(FakeWhisperModel(), batched, language=None)
+    texts = engine.transcribe_batch(language_utterances('en', 'fr', 'en', 'fr', 'en'))
+    assert sorted(batched.calls) == [('en', 3), ('fr', 2)]
+    assert texts == ['en0', 'fr0', 'en1', 'fr1', 'en2']
+
+
+def test_batch_with_language_is_one_call():
+    batched = FakeBatchedPipeline()
+    engine = WhisperEngine(FakeWhisperModel(), batched, language='de')
+    texts = engine.transcribe_batch(language_utterances('en', 'fr', 'en'))
+    assert batched.calls == [('de', 3)]
+    assert texts == ['de0', 'de1', 'de2']
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from transcription_backends import StubBackend, WhisperBackend
+from transcription_pool import TranscriptionPool
+
+
+def stub_pool():
+    pool = TranscriptionPool('tiny', workers=1, backend=StubBackend(delay=0, texts=['hello']))
+    pool.start()
+    return pool
+
+
+def test_swap_changes_the_model_for_new_utterances():
+    pool = stub_pool()
+    try:
+        models = pool.swap(model='base', beam_size=2)
+        assert models['generation'] == 1
+        assert models['model'] == 'base'
+        assert models['beam_size'] == 2
+        assert pool.transcribe(np.ones(16000, dtype=np.float32), timeout=5) == 'hello'
+    finally:
+        pool.shutdown()
+
+
+def test_swap_rejects_a_compute_type_the_backend_lacks():
+    pool = stub_pool()
+    try:
+        with pytest.raises(ValueError, match='compute_type'):
+            pool.check_swap(compute_type='int8')
+        with pytest.raises(ValueError, match='compute_type'):
+            pool.swap(model='base', compute_type='int8')
+        # Nothing was applied
+        assert pool.models.describe()['generation'] == 0
+        assert pool.models.describe()['model'] == 'tiny'
+    finally:
+        pool.shutdown()
+
+
+def test_whisper_backend_accepts_compute_type():
+    pool = TranscriptionPool('tiny', backend=WhisperBackend(device='cpu'))
+    pool.check_swap(compute_type='int8', model='base')
@@ -0,0 +1,96 @@
+from utterance_trace import UtteranceTracer
+
+
+def feed(tracer, start_ms, end_ms, step_ms=20):
+    """Frames arriving every `step_ms` from `start_ms` to `end_ms`."""
+    for when_ms in range(start_ms, end_ms + 1, step_ms):
+        tracer.audio(when_ms / 1000)
+
+
+def test_first_audio_is_the_frame_that_set_off_the_vad():
+    tracer = UtteranceTracer('s')
+    # Two seconds of silence before the speech
+    feed(tracer, 0, 2000)
+    tracer.mark('vad_start', when=2.05)
+    feed(tracer, 2020, 3000)
+    tracer.mark('vad_stop', when=3.0)
+    tracer.close(when=3.1)
+    trace = tracer.begin_transcription(when=3.2)
+
+    assert trace.timestamps['first_audio'] == 2.0
+    assert trace.breakdown()['stages_ms']['vad_start'] == 50.0
+
+
+def test_audio_alone_opens_no_trace():
+    tracer = UtteranceTracer('s')
+    feed(tracer, 0, 5000)
+    tracer.mark('vad_start', when=5.0)
+    tracer.close(when=6.0)
+    assert tracer.begin_transcription().trace_id == 's-1'
+
+
+def test_utterances_keep_their_own_traces():
+    tracer = UtteranceTracer('s')
+    tracer.audio(1.0)
+    tracer.mark('vad_start', when=1.0)
+    tracer.close(when=2.0)
+    tracer.audio(2.5)
+    tracer.mark('vad_start', when=2.5)
+    first = tracer.begin_transcription(when=2.6)
+    tracer.close(when=3.0)
+    second = tracer.begin_transcription(when=3.1)
+    assert (first.trace_id, second.trace_id) == ('s-1', 's-2')
+    assert first.timestamps['recording_stop'] == 2.0
+    assert second.timestamps['first_audio'] == 2.5
+    assert second.timestamps['recording_stop'] == 3.0
+
+
+def test_stop_reported_after_transcription_start():
+    tracer = UtteranceTracer('s')
+    tracer.audio(1.0)
+    tracer.mark('vad_start', when=1.0)
+    trace = tracer.begin_transcription(when=2.0)
+    # The recorder's stop callbacks come in after the transcription started
+    tracer.mark('vad_stop', when=2.01)
+    tracer.close(when=2.02)
+    assert trace.timestamps['vad_stop'] == 2.01
+    assert trace.timestamps['recording_stop'] == 2.02
+
+    # The next utterance starts clean
+    tracer.audio(4.0)
+    tracer.mark('vad_start', when=4.0)
+    tracer.close(when=5.0)
+    following = tracer.begin_transcription(when=5.1)
+    assert following is not trace
+    assert following.timestamps['first_audio'] == 4.0
+    assert following.timestamps['recording_stop'] == 5.0
+    assert following.timestamps['transcription_start'] == 5.1
+    assert tracer.discarded == 0
+
+
+def test_utterance_without_its_late_stop():
+    tracer = UtteranceTracer('s')
+    tracer.mark('vad_start', when=1.0)
+    tracer.begin_transcription(when=2.0)
+    # The next utterance opens before any stop came in for the previous one
+    tracer.mark('vad_start', when=3.0)
+    tracer.close(when=4.0)
+    trace = tracer.begin_transcription(when=4.1)
+    assert trace.trace_id == 's-2'
+    assert trace.timestamps['recording_stop'] == 4.0
+
+
+def test_latency_breakdown():
+    tracer = UtteranceTracer('s')
+    tracer.audio(1.0)
+    tracer.mark('vad_start', when=1.1)
+    tracer.mark('vad_stop', when=2.0, captured_at=1.95)
+    tracer.close(when=2.1)
+    trace = tracer.begin_transcription(when=2.2)
+    trace.mark('inference_done', when=2.5)
+    trace.mark('message_sent', when=2.6)
+    breakdown = trace.breakdown()
+    assert breakdown['latency_ms'] == 600
+    assert breakdown['mouth_to_text_ms'] == 650.0
+    assert breakdown['stages_ms']['vad_start'] == 100.0
+    assert breakdown['total_ms'] == 1600.0
@@ -0,0 +1,264 @@
+"""
+Transcription backends for TranscriptionPool.
+
+A backend turns a model name into an engine that transcribes float32 16 kHz
+audio, one utterance at a time or as a batch. WhisperBackend runs
+faster_whisper. StubBackend stands in for it with configurable delays and
+canned text, so the networking, VAD, scheduling and fan-out paths can be
+benchmarked and regression-tested deterministically on CPU-only machines.
+"""
+
+import bisect
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Whisper decodes at most 30 seconds per window
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+# StubBackend picks an utterance's text from this much of its start
+STUB_KEY_SAMPLES = SAMPLE_RATE // 2
+
+DEFAULT_STUB_TEXTS = (
+    "The quick brown fox jumps over the lazy dog.",
+    "This is a stub transcription used for benchmarking.",
+    "Realtime speech to text without loading a model.",
+)
+
+
+class TranscriptionBackend:
+    """Creates engines for model names.
+
+    An engine provides `transcribe(audio, beam_size, initial_prompt,
+    realtime)` returning text and `transcribe_batch(audios, ..., batch_size,
+    realtime)` returning one text per utterance. Engines must be safe to call
+    from several threads.
+    """
+
+    name = 'base'
+
+    def load(self, model, num_workers=1):
+        raise NotImplementedError
+
+
+class WhisperEngine:
+    """One faster_whisper model, plus its batched pipeline when available."""
+
+    def __init__(self, model, batched, language=None, suppress_tokens=None):
+        self.model = model
+        self.batched = batched
+        self.language = language
+        self.suppress_tokens = suppress_tokens if suppress_tokens is not None else [-1]
+
+    def transcribe(self, audio, beam_size=5, initial_prompt=None, realtime=False):
+        if audio is None or len(audio) == 0:
+            return ""
+        segments, _ = self.model.transcribe(
+            np.asarray(audio, dtype=np.float32),
+            language=self.language,
+            beam_size=beam_size,
+            initial_prompt=initial_prompt,
+            suppress_tokens=self.suppress_tokens,
+            vad_filter=False,
+        )
+        return " ".join(segment.text for segment in segments).strip()
+
+    def detect_language(self, audio):
+        """Language code of one utterance, detected from its first 30 seconds."""
+        language, _, _ = self.model.detect_language(
+            np.asarray(audio[:WINDOW_SAMPLES], dtype=np.float32))
+        return language
+
+    def transcribe_batch(self, audios, beam_size=5, initial_prompt=None, batch_size=16,
+                         realtime=False):
+        """Transcribe several utterances with one batched inference call per language.
+
+        faster_whisper detects the language once per call, across all of its
+        audio. Without a configured language every utterance is therefore
+        detected on its own first (one extra encoder pass each) and only
+        utterances of the same language share a batch; with a faster_whisper
+        too old to detect separately they are transcribed one by one.
+        """
+        if len(audios) == 1 or self.batched is None:
+            return [self.transcribe(audio, beam_size, initial_prompt) for audio in audios]
+        if self.language is not None:
+            return self._transcribe_batch(audios, self.language, beam_size, initial_prompt, batch_size)
+        if not hasattr(self.model, 'detect_language'):
+            return [self.transcribe(audio, beam_size, initial_prompt) for audio in audios]
+
+        groups = {}
+        for index, audio in enumerate(audios):
+            if audio is not None and len(audio) > 0:
+                groups.setdefault(self.detect_language(audio), []).append(index)
+        texts = ["" for _ in audios]
+        for language, indices in groups.items():
+            batch = self._transcribe_batch([audios[index] for index in indices], language,
+                                           beam_size, initial_prompt, batch_size)
+            for index, text in zip(indices, batch):
+                texts[index] = text
+        return texts
+
+    def _transcribe_batch(self, audios, language, beam_size, initial_prompt, batch_size):
+        """One batched pipeline call over utterances that share `language`.
+
+        The utterances are laid end to end and handed to the batched pipeline
+        as explicit clip timestamps, so every utterance (split into 30 second
+        windows if needed) becomes one item of the batch. Segments are mapped
+        back to their utterance by start time.
+        """
+        pieces, clips, owners = [], [], []
+        offset = 0
+        for index, audio in enumerate(audios):
+            if audio is None or len(audio) == 0:
+                continue
+            audio = np.asarray(audio, dtype=np.float32)
+            for start in range(0, len(audio), WINDOW_SAMPLES):
+                piece = audio[start:start + WINDOW_SAMPLES]
+                pieces.append(piece)
+                clips.append({'start': offset, 'end': offset + len(piece)})
+                owners.append(index)
+                offset += len(piece)
+        texts = [[] for _ in audios]
+        if not pieces:
+            return ["" for _ in audios]
+
+        segments, _ = self.batched.transcribe(
+            np.concatenate(pieces),
+            language=language,
+            beam_size=beam_size,
+            initial_prompt=initial_prompt,
+            suppress_tokens=self.suppress_tokens,
+            vad_filter=False,
+            clip_timestamps=clips,
+            batch_size=batch_size,
+            without_timestamps=True,
+        )
+        clip_starts = [clip['start'] / SAMPLE_RATE for clip in clips]
+        for segment in segments:
+            clip_index = max(bisect.bisect_right(clip_starts, segment.start + 1e-3) - 1, 0)
+            texts[owners[clip_index]].append(segment.text)
+        return [" ".join(parts).strip() for parts in texts]
+
+
+class WhisperBackend(TranscriptionBackend):
+    """faster_whisper models. With num_workers=N, N threads share one model copy."""
+
+    name = 'whisper'
+
+    def __init__(self,
+                 device='cuda',
+                 compute_type='default',
+                 gpu_device_index=0,
+                 download_root=None,
+                 language='',
+                 suppress_tokens=None):
+        self.device = device
+        self.compute_type = compute_type
+        self.gpu_device_index = gpu_device_index
+        self.download_root = download_root
+        self.language = language or None
+        self.suppress_tokens = suppress_tokens
+
+    def load(self, model, num_workers=1):
+        from faster_whisper import WhisperModel
+        whisper_model = WhisperModel(
+            model_size_or_path=model,
+            device=self.device,
+            compute_type=self.compute_type,
+            device_index=self.gpu_device_index,
+            download_root=self.download_root,
+            num_workers=num_workers,
+        )
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            batched = BatchedInferencePipeline(model=whisper_model)
+        except ImportError:
+            # Older faster_whisper without batched inference, batches run sequentially
+            batched = None
+        return WhisperEngine(whisper_model, batched, self.language, self.suppress_tokens)
+
+
+class StubEngine:
+    """Sleeps instead of running a model and returns canned text."""
+
+    def __init__(self, backend, model):
+        self.backend = backend
+        self.model = model
+
+    def transcribe(self, audio, beam_size=5, initial_prompt=None, realtime=False):
+        return self.transcribe_batch([audio], beam_size, initial_prompt, realtime=realtime)[0]
+
+    def transcribe_batch(self, audios, beam_size=5, initial_prompt=None, batch_size=16,
+                         realtime=False):
+        audio_seconds = sum(len(audio) for audio in audios if audio is not None) / SAMPLE_RATE
+        self.backend.sleep(audio_seconds)
+        return [self.backend.text_for(audio, realtime) for audio in audios]
+
+
+class StubBackend(TranscriptionBackend):
+    """Deterministic stand-in for a real model.
+
+    Every call takes `delay + delay_per_second * audio_seconds` seconds, plus
+    up to `jitter` seconds of seeded random noise. The text is picked from
+    `texts` by a checksum of the first half second of the audio, so the same
+    utterance gets the same text however many workers transcribe it and in
+    whatever order. Realtime transcriptions see the utterance's audio so far,
+    which starts the same way, and return a prefix of its final text, growing
+    with the audio duration by `words_per_second`.
+    """
+
+    name = 'stub'
+
+    def __init__(self,
+                 delay=0.05,
+                 delay_per_second=0.0,
+                 jitter=0.0,
+                 texts=None,
+                 words_per_second=2.5,
+                 seed=0):
+        self.delay = max(0.0, delay)
+        self.delay_per_second = max(0.0, delay_per_second)
+        self.jitter = max(0.0, jitter)
+        self.texts = tuple(texts) if texts else DEFAULT_STUB_TEXTS
+        self.words_per_second = words_per_second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def load(self, model, num_workers=1):
+        return StubEngine(self, model)
+
+    def sleep(self, audio_seconds):
+        seconds = self.delay + self.delay_per_second * audio_seconds
+        if self.jitter:
+            with self._lock:
+                seconds += self._random.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def text_for(self, audio, realtime=False):
+        if audio is None or len(audio) == 0:
+            return ""
+        key = zlib.crc32(np.ascontiguousarray(audio[:STUB_KEY_SAMPLES]).tobytes())
+        text = self.texts[key % len(self.texts)]
+        if realtime:
+            count = max(1, int(len(audio) / SAMPLE_RATE * self.words_per_second))
+            return " ".join(text.split()[:count])
+        return text
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name, **options):
+    """Instantiate a backend by name, e.g. create_backend('stub', delay=0.1)."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription backend {name}, choose from {', '.join(BACKENDS)}")
+    return backend_class(**options)
@@ -0,0 +1,429 @@
+"""
+Server-wide Whisper model pool shared by all client sessions.
+
+Every session keeps its own lightweight AudioToTextRecorder for VAD and
+buffering, but the large transcription models are loaded exactly once here
+and served by a fixed number of worker threads. faster_whisper releases the
+GIL during inference and supports `num_workers`, so the worker threads share
+a single copy of each model instead of one copy per connected client.
+
+Utterances that finish at about the same time in different sessions are
+collected into micro-batches (bounded by a batch size and a max wait
+deadline) and transcribed with a single batched inference call.
+
+The models come from a transcription backend (see transcription_backends),
+faster_whisper by default or the stub backend for benchmarks without a GPU.
+
+swap() replaces the models while the pool keeps serving: the new model set
+is loaded and warmed up next to the old one, then every batch that starts
+afterwards uses it. Batches already running finish on the old set, which is
+released once the last of them is done.
+"""
+
+import collections
+import copy
+import gc
+import os
+import queue
+import threading
+import time
+import wave
+from concurrent.futures import Future
+
+import numpy as np
+
+from transcription_backends import SAMPLE_RATE, WhisperBackend
+
+WARMUP_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test-audio', 'warmup_audio.wav')
+
+
+def load_warmup_audio(path=WARMUP_AUDIO):
+    """Read a WAV file as float32 16 kHz mono, for warming up freshly loaded models."""
+    with wave.open(path, 'rb') as wav_file:
+        rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        frames = wav_file.readframes(wav_file.getnframes())
+    audio = np.frombuffer(frames, dtype=np.int16)
+    if channels > 1:
+        audio = audio[:len(audio) - len(audio) % channels].reshape(-1, channels)[:, 0]
+    audio = audio.astype(np.float32) / 32768.0
+    if rate != SAMPLE_RATE:
+        from scipy.signal import resample_poly
+        audio = resample_poly(audio, SAMPLE_RATE, rate).astype(np.float32)
+    return audio
+
+
+class ModelSet:
+    """One generation of loaded models and the decoding options used with them."""
+
+    def __init__(self, generation, model_name, realtime_model_name, main, realtime,
+                 beam_size, beam_size_realtime, backend):
+        self.generation = generation
+        self.model_name = model_name
+        self.realtime_model_name = realtime_model_name
+        self.main = main
+        self.realtime = realtime
+        self.beam_size = beam_size
+        self.beam_size_realtime = beam_size_realtime
+        self.backend = backend
+        # Batches currently running on this set; freed when retired and idle
+        self.active = 0
+        self.retired = False
+
+    def describe(self):
+        return {
+            'generation': self.generation,
+            'model': self.model_name,
+            'realtime_model': self.realtime_model_name or self.model_name,
+            'beam_size': self.beam_size,
+            'beam_size_realtime': self.beam_size_realtime,
+            'compute_type': getattr(self.backend, 'compute_type', None),
+            'backend': self.backend.name,
+        }
+
+
+class TranscriptionJob:
+    """A single utterance waiting to be transcribed by the pool."""
+
+    __slots__ = ('audio', 'realtime', 'future', 'submitted_at')
+
+    def __init__(self, audio, realtime=False):
+        self.audio = audio
+        self.realtime = realtime
+        self.future = Future()
+        self.submitted_at = time.time()
+
+
+class TranscriptionPool:
+    """Owns the main and realtime models and the worker threads using them."""
+
+    def __init__(self,
+                 model,
+                 realtime_model=None,
+                 workers=2,
+                 realtime_workers=1,
+                 batch_size=16,
+                 realtime_batch_size=16,
+                 max_batch_wait=0.05,
+                 device='cuda',
+                 compute_type='default',
+                 gpu_device_index=0,
+                 download_root=None,
+                 language='',
+                 beam_size=5,
+                 beam_size_realtime=3,
+                 initial_prompt=None,
+                 initial_prompt_realtime=None,
+                 suppress_tokens=None,
+                 on_batch=None,
+                 backend=None):
+        self.model_name = model
+        self.realtime_model_name = realtime_model
+        self.workers = max(1, workers)
+        self.realtime_workers = max(1, realtime_workers)
+        self.batch_size = max(1, batch_size)
+        self.realtime_batch_size = max(1, realtime_batch_size)
+        self.max_batch_wait = max(0.0, max_batch_wait)
+        self.beam_size = beam_size
+        self.beam_size_realtime = beam_size_realtime
+        self.initial_prompt = initial_prompt or None
+        self.initial_prompt_realtime = initial_prompt_realtime or None
+        # Called as on_batch(model_name, inference_seconds, audio_seconds) after every batch
+        self.on_batch = on_batch
+        if backend is None:
+            backend = WhisperBackend(
+                device=device,
+                compute_type=compute_type,
+                gpu_device_index=gpu_device_index,
+                download_root=download_root,
+                language=language,
+                suppress_tokens=suppress_tokens,
+            )
+        self.backend = backend
+
+        self.models = None
+        self._models_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._main_queue = queue.Queue()
+        self._realtime_queue = queue.Queue()
+        self._threads = []
+        self._running = False
+        # (finished_at, turnaround_seconds, audio_seconds) of recent batches
+        self._load = {False: collections.deque(maxlen=256), True: collections.deque(maxlen=256)}
+
+    @property
+    def main_model(self):
+        return self.models.main if self.models else None
+
+    @property
+    def realtime_model(self):
+        return self.models.realtime if self.models else None
+
+    def _load_models(self, generation, model_name, realtime_model_name, backend,
+                     beam_size, beam_size_realtime, reuse=None):
+        """Load a model set, sharing engines with `reuse` where the name matches."""
+        loaded = {}
+        if reuse is not None:
+            loaded[reuse.model_name] = reuse.main
+            loaded[reuse.realtime_model_name or reuse.model_name] = reuse.realtime
+
+        def load(name, workers):
+            if name not in loaded:
+                print(f"Loading shared {backend.name} model {name} for {workers} workers...")
+                loaded[name] = backend.load(name, workers)
+            return loaded[name]
+
+        main = load(model_name, self.workers)
+        realtime = load(realtime_model_name, self.realtime_workers) if realtime_model_name else main
+        return ModelSet(generation, model_name, realtime_model_name, main, realtime,
+                        beam_size, beam_size_realtime, backend)
+
+    def start(self):
+        """Load the models once and start the worker threads."""
+        if self._running:
+            return
+        self.models = self._load_models(
+            0, self.model_name, self.realtime_model_name, self.backend,
+            self.beam_size, self.beam_size_realtime)
+
+        self._running = True
+        for i in range(self.workers):
+            self._spawn(self._main_queue, False, f"transcribe-{i}")
+        for i in range(self.realtime_workers):
+            self._spawn(self._realtime_queue, True, f"transcribe-rt-{i}")
+        print("Transcription pool ready")
+
+    def _spawn(self, jobs, realtime, name):
+        thread = threading.Thread(
+            target=self._worker, args=(jobs, realtime), name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, audio, realtime=False):
+        """Queue float32 16 kHz audio for transcription and return a Future with the text."""
+        job = TranscriptionJob(audio, realtime)
+        if realtime:
+            self._realtime_queue.put(job)
+        else:
+            self._main_queue.put(job)
+        return job.future
+
+    def transcribe(self, audio, realtime=False, timeout=None):
+        """Blocking helper around submit() for recorder threads."""
+        return self.submit(audio, realtime).result(timeout=timeout)
+
+    def check_swap(self, compute_type=None, **options):
+        """Raise ValueError if the backend cannot apply these swap options."""
+        if compute_type is not None and not hasattr(self.backend, 'compute_type'):
+            raise ValueError(f"The {self.backend.name} backend has no compute_type")
+
+    def swap(self, model=None, realtime_model=None, beam_size=None, beam_size_realtime=None,
+             compute_type=None, warmup_audio=None):
+        """Load and warm up a new model configuration, then switch to it. Blocking.
+
+        Options left at None keep their current value; realtime_model='' makes
+        realtime transcription share the main model. Engines whose model and
+        compute type do not change are reused rather than loaded again.
+        Returns the description of the new model set; raises ValueError for
+        options the backend cannot apply (see check_swap()).
+        """
+        self.check_swap(compute_type=compute_type)
+        if not self._swap_lock.acquire(blocking=False):
+            raise RuntimeError("A model swap is already in progress")
+        try:
+            current = self.models
+            backend = self.backend
+            if compute_type is not None and compute_type != backend.compute_type:
+                backend = copy.copy(backend)
+                backend.compute_type = compute_type
+            new = self._load_models(
+                current.generation + 1,
+                model or current.model_name,
+                current.realtime_model_name if realtime_model is None else realtime_model or None,
+                backend,
+                current.beam_size if beam_size is None else beam_size,
+                current.beam_size_realtime if beam_size_realtime is None else beam_size_realtime,
+                reuse=current if backend is self.backend else None)
+            if warmup_audio is not None:
+                new.main.transcribe(warmup_audio, new.beam_size, self.initial_prompt)
+                if new.realtime is not new.main:
+                    new.realtime.transcribe(warmup_audio, new.beam_size_realtime,
+                                            self.initial_prompt_realtime, realtime=True)
+
+            with self._models_lock:
+                old, self.models = self.models, new
+                old.retired = True
+                idle = old.active == 0
+            self.backend = backend
+            self.model_name = new.model_name
+            self.realtime_model_name = new.realtime_model_name
+            self.beam_size = new.beam_size
+            self.beam_size_realtime = new.beam_size_realtime
+            print(f"Switched to model generation {new.generation}: {new.describe()}")
+            if idle:
+                self._release(old)
+            return new.describe()
+        finally:
+            self._swap_lock.release()
+
+    def _acquire_models(self):
+        with self._models_lock:
+            models = self.models
+            models.active += 1
+        return models
+
+    def _release_models(self, models):
+        with self._models_lock:
+            models.active -= 1
+            drained = models.retired and models.active == 0
+        if drained:
+            self._release(models)
+
+    def _release(self, models):
+        """Drop a retired set's engines; memory of engines not reused by the new set is freed."""
+        models.main = None
+        models.realtime = None
+        gc.collect()
+        print(f"Released model generation {models.generation}")
+
+    def queue_depth(self):
+        return self._main_queue.qsize() + self._realtime_queue.qsize()
+
+    def _collect_batch(self, jobs, first, max_size):
+        """Gather more jobs behind `first` until the batch is full or its deadline passes."""
+        batch = [first]
+        deadline = first.submitted_at + self.max_batch_wait
+        while len(batch) < max_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    job = jobs.get(timeout=remaining)
+                else:
+                    # Past the deadline, only take what is already waiting
+                    job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                jobs.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _worker(self, jobs, realtime):
+        max_size = self.realtime_batch_size if realtime else self.batch_size
+        while self._running:
+            first = jobs.get()
+            if first is None:
+                break
+            batch = [job for job in self._collect_batch(jobs, first, max_size)
+                     if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.time()
+            # Batches that started before a swap finish on the models they started with
+            models = self._acquire_models()
+            try:
+                texts = self._run_batch(models, [job.audio for job in batch], realtime)
+            except Exception as e:
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+            finally:
+                self._release_models(models)
+            finished = time.time()
+            audio_seconds = sum(len(job.audio) for job in batch
+                                if job.audio is not None) / SAMPLE_RATE
+            turnaround = sum(finished - job.submitted_at for job in batch)
+            self._load[realtime].append((finished, turnaround, audio_seconds))
+            if self.on_batch is not None:
+                model_name = models.realtime_model_name if realtime and models.realtime_model_name else models.model_name
+                self.on_batch(model_name, finished - started, audio_seconds)
+            for job, text in zip(batch, texts):
+                job.future.set_result(text)
+
+    def real_time_factor(self, realtime=False, window=30.0):
+        """Real-time factor over the last `window` seconds.
+
+        Measured from submission to result, so time spent queued behind other
+        sessions counts as well and the value rises as the pool saturates.
+        """
+        cutoff = time.time() - window
+        recent = [entry for entry in list(self._load[realtime]) if entry[0] >= cutoff]
+        audio_seconds = sum(entry[2] for entry in recent)
+        if audio_seconds <= 0:
+            return 0.0
+        return sum(entry[1] for entry in recent) / audio_seconds
+
+    def _run_batch(self, models, audios, realtime):
+        if realtime:
+            return models.realtime.transcribe_batch(
+                audios, models.beam_size_realtime, self.initial_prompt_realtime,
+                batch_size=self.realtime_batch_size, realtime=True)
+        return models.main.transcribe_batch(
+            audios, models.beam_size, self.initial_prompt, batch_size=self.batch_size)
+
+    def shutdown(self):
+        self._running = False
+        for _ in range(self.workers):
+            self._main_queue.put(None)
+        for _ in range(self.realtime_workers):
+            self._realtime_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+        self.models = None
+
+
+class PooledRealtimeLoop:
+    """Polls a session recorder's live frames and runs them through the shared realtime model.
+
+    Replaces the recorder's built-in realtime worker so that sessions do not
+    need to load their own realtime model. `on_text` only gets texts that
+    differ from the previous one; `on_pass`, if given, gets the text of every
+    pass, repeats included, e.g. for a StuckTranscriptDetector.
+    """
+
+    def __init__(self, recorder, pool, on_text, processing_pause=0.2, min_audio_seconds=0.3,
+                 on_pass=None):
+        self.recorder = recorder
+        self.pool = pool
+        self.on_text = on_text
+        self.on_pass = on_pass
+        self.processing_pause = max(processing_pause, 0.02)
+        self.min_samples = int(16000 * min_audio_seconds)
+        self.is_running = False
+        self._thread = None
+
+    def start(self):
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+
+    def _run(self):
+        last_text = ""
+        while self.is_running:
+            time.sleep(self.processing_pause)
+            if not getattr(self.recorder, 'is_recording', False):
+                last_text = ""
+                continue
+            frames = list(self.recorder.frames)
+            if not frames:
+                continue
+            audio = np.frombuffer(b''.join(frames), dtype=np.int16)
+            if len(audio) < self.min_samples:
+                continue
+            try:
+                text = self.pool.transcribe(audio.astype(np.float32) / 32768.0, realtime=True)
+            except Exception as e:
+                print(f"Error in pooled realtime transcription: {e}")
+                continue
+            if not text or not getattr(self.recorder, 'is_recording', False):
+                continue
+            if self.on_pass is not None:
+                self.on_pass(text)
+            if text != last_text and getattr(self.recorder, 'is_recording', False):
+                last_text = text
+                self.on_text(text)
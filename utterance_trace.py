@@ -0,0 +1,162 @@
+"""
+Per-utterance latency tracing.
+
+Every utterance of a session gets a trace ID and a timestamp for each stage
+it passes through:
+
+    first_audio          arrival of the newest frame fed to the recorder when
+                         voice activity was detected, the frame that set it off
+    vad_start            voice activity detected
+    vad_stop             end of voice activity detected
+    recording_stop       the recorder closed the utterance
+    transcription_start  the utterance was handed to the model
+    inference_done       the final text came back
+    message_sent         the fullSentence message was queued for the client
+
+A session's UtteranceTracer opens a trace on the utterance's first event
+(normally vad_start), and closes it on recording_stop. Closed traces wait for
+their transcription, so an utterance that is still being transcribed keeps
+its own timestamps while the next one is being recorded. Silence before the
+speech is not counted: the tracer only remembers the arrival time of the
+latest frame fed to the recorder and stamps it as first_audio when a trace
+opens. A stop reported after the transcription already started belongs to
+the utterance being transcribed, not to the next one.
+The breakdown attached to fullSentence lists, for every stage reached, the
+milliseconds spent since the stage before it, and the sentence latency
+`latency_ms`: from the end of speech (vad_stop, or recording_stop when the
+utterance closed without one) to message_sent. Both servers report this one
+definition as the fullSentence `latency_ms`.
+
+Stages can also record the client's capture time of the audio the server
+was receiving at that moment (see stream_timing.py). With it for vad_stop,
+the breakdown adds `mouth_to_text_ms`: from the end of speech on the
+client's clock to the fullSentence being queued for the client.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+STAGES = ('first_audio', 'vad_start', 'vad_stop', 'recording_stop',
+          'transcription_start', 'inference_done', 'message_sent')
+# Stages of the recording that the recorder can report after the transcription started
+LATE_STAGES = ('vad_stop', 'recording_stop')
+
+
+class UtteranceTrace:
+    """Stage timestamps of one utterance."""
+
+    __slots__ = ('trace_id', 'timestamps', 'captured')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.timestamps = {}
+        # Stage -> client capture time of the audio being received then
+        self.captured = {}
+
+    def mark(self, stage, when=None, captured_at=None):
+        """Record a stage. Only its first occurrence counts."""
+        if stage not in self.timestamps:
+            self.timestamps[stage] = time.time() if when is None else when
+            if captured_at is not None:
+                self.captured[stage] = captured_at
+
+    def elapsed_ms(self, start, end):
+        """Milliseconds between two recorded stages, or None if one is missing."""
+        if start not in self.timestamps or end not in self.timestamps:
+            return None
+        return int((self.timestamps[end] - self.timestamps[start]) * 1000)
+
+    def latency_ms(self):
+        """Milliseconds from the end of speech to message_sent, or None."""
+        start = 'vad_stop' if 'vad_stop' in self.timestamps else 'recording_stop'
+        return self.elapsed_ms(start, 'message_sent')
+
+    def mouth_to_text_ms(self):
+        """Milliseconds from the end of speech (client clock) to message_sent, or None."""
+        if 'vad_stop' not in self.captured or 'message_sent' not in self.timestamps:
+            return None
+        return round((self.timestamps['message_sent'] - self.captured['vad_stop']) * 1000, 1)
+
+    def breakdown(self):
+        reached = [(stage, self.timestamps[stage]) for stage in STAGES if stage in self.timestamps]
+        stages_ms = {stage: round((when - previous) * 1000, 1)
+                     for (_, previous), (stage, when) in zip(reached, reached[1:])}
+        return {
+            'trace_id': self.trace_id,
+            'timestamps': dict(reached),
+            'stages_ms': stages_ms,
+            'total_ms': round((reached[-1][1] - reached[0][1]) * 1000, 1) if reached else 0.0,
+            'latency_ms': self.latency_ms(),
+            'mouth_to_text_ms': self.mouth_to_text_ms(),
+        }
+
+
+class UtteranceTracer:
+    """Hands out the traces of one session's utterances. Thread-safe."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.discarded = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._open = None
+        self._closed = collections.deque()
+        # Transcribed before the recorder reported its stop, see begin_transcription()
+        self._early = None
+        self._last_audio = None
+
+    def _new_trace(self):
+        trace = UtteranceTrace(f"{self.prefix}-{next(self._ids)}")
+        if self._last_audio is not None:
+            trace.mark('first_audio', self._last_audio)
+        self._early = None
+        return trace
+
+    def audio(self, when=None):
+        """Note that a frame which arrived at `when` is being fed to the recorder."""
+        self._last_audio = time.time() if when is None else when
+
+    def mark(self, stage, when=None, captured_at=None):
+        """Record a stage of the utterance being recorded."""
+        with self._lock:
+            if self._open is None and self._early is not None and stage in LATE_STAGES:
+                self._early.mark(stage, when, captured_at)
+                return
+            if self._open is None:
+                self._open = self._new_trace()
+            self._open.mark(stage, when, captured_at)
+
+    def close(self, when=None):
+        """The recorder closed the utterance; it now waits for transcription."""
+        with self._lock:
+            if self._open is None and self._early is not None:
+                # Late stop of the utterance already being transcribed
+                self._early.mark('recording_stop', when)
+                self._early = None
+                return
+            trace = self._open or self._new_trace()
+            self._open = None
+            trace.mark('recording_stop', when)
+            self._closed.append(trace)
+
+    def begin_transcription(self, when=None):
+        """Return the trace of the utterance being transcribed and mark its transcription start.
+
+        That is the most recently closed one; older ones that never got
+        transcribed (e.g. too short) are discarded.
+        """
+        with self._lock:
+            if self._closed:
+                trace = self._closed.pop()
+                self.discarded += len(self._closed)
+                self._closed.clear()
+                self._early = None
+            else:
+                # Transcribed before the recorder reported the stop
+                trace = self._open or self._new_trace()
+                self._open = None
+                self._early = trace
+        trace.mark('transcription_start', when)
+        return trace